@@ -0,0 +1,159 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+import traceback
+from multiprocessing import Pool
+from typing import Dict, List, Tuple, Union
+
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+import archival_structures.ead_start_end_year as ead_start_end_year
+import archival_structures.instrumentation as instrumentation
+import archival_structures.sources as sources
+
+
+TASKS = {'inventory', 'dates'}
+
+
+def get_archive_id(ead_file: str) -> str:
+    # Nationaal Archief finding aids are stored as e.g. 'ead-1.01.02.xml' or '1.04.02.xml'
+    basename = os.path.basename(ead_file)
+    match = re.search(r"\d+(?:\.\d+)+[A-Z]?", basename)
+    if match:
+        return match.group(0)
+    return basename.split('.')[0]
+
+
+def find_ead_files(source: str) -> List[str]:
+    if os.path.isdir(source):
+        # compressed EAD files are read directly, see sources.open_source
+        ead_files = [os.path.join(source, fname) for fname in os.listdir(source)
+                     if any(fname.endswith(suffix) for suffix in sources.EAD_SUFFIXES)]
+    else:
+        ead_files = glob.glob(source)
+    return sorted(ead_files)
+
+
+def parse_ead_file(ead_file: str, task: str = 'inventory', max_subseries_depth: int = 2) -> pd.DataFrame:
+    if task == 'inventory':
+        return ead_parser.get_inventory_info(ead_file, max_subseries_depth=max_subseries_depth, streaming=True)
+    elif task == 'dates':
+        return ead_start_end_year.get_dates_info(ead_file)
+    else:
+        raise ValueError(f"unknown task '{task}', must be one of {TASKS}")
+
+
+def process_ead_file(ead_file: str, task: str = 'inventory', max_subseries_depth: int = 2,
+                     collect_metrics: bool = False) -> Tuple[str, str, Union[pd.DataFrame, None], Union[str, None],
+                                                             Union[Dict[str, any], None]]:
+    archive_id = get_archive_id(ead_file)
+    metrics = None
+    try:
+        if collect_metrics:
+            with instrumentation.collect(archive_id=archive_id, ead_file=ead_file, task=task) as parser_metrics:
+                start = time.perf_counter()
+                df = parse_ead_file(ead_file, task=task, max_subseries_depth=max_subseries_depth)
+                parser_metrics.labels['seconds'] = time.perf_counter() - start
+            metrics = parser_metrics.to_dict()
+        else:
+            df = parse_ead_file(ead_file, task=task, max_subseries_depth=max_subseries_depth)
+    except Exception:
+        # a malformed EAD only fails its own archive, the error travels back to the parent
+        return ead_file, archive_id, None, traceback.format_exc(), metrics
+    df.insert(0, 'archive_id', archive_id)
+    return ead_file, archive_id, df, None, metrics
+
+
+def process_ead_file_task(args):
+    return process_ead_file(*args)
+
+
+def get_task_columns(task: str, max_subseries_depth: int = 2) -> List[str]:
+    if task == 'inventory':
+        return ['archive_id'] + ead_parser.get_inventory_columns(max_subseries_depth)
+    elif task == 'dates':
+        return ['archive_id'] + ead_start_end_year.DATE_COLUMNS
+    else:
+        raise ValueError(f"unknown task '{task}', must be one of {TASKS}")
+
+
+def append_frame(df: pd.DataFrame, output_file: str, write_header: bool, columns: List[str] = None):
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    df.to_csv(output_file, sep='\t', index=False, header=write_header, mode='w' if write_header else 'a')
+
+
+def process_corpus(source: Union[str, List[str]], output_file: str, task: str = 'inventory',
+                   processes: int = None, max_subseries_depth: int = 2,
+                   progress: bool = True, metrics_file: str = None) -> Dict[str, any]:
+    if task not in TASKS:
+        raise ValueError(f"unknown task '{task}', must be one of {TASKS}")
+    ead_files = find_ead_files(source) if isinstance(source, str) else list(source)
+    # with a metrics_file, the parser metrics of every archive are written to it as a JSON line
+    tasks = [(ead_file, task, max_subseries_depth, metrics_file is not None) for ead_file in ead_files]
+    summary = {
+        'archives': len(ead_files),
+        'processed': [],
+        'failed': [],
+        'rows': 0
+    }
+    start = time.time()
+    # the header does not depend on which archive happens to finish first
+    columns = get_task_columns(task, max_subseries_depth)
+    write_header = True
+    with Pool(processes=processes) as pool:
+        # results are written as soon as an archive is done, so the parent
+        # holds at most one archive frame at a time
+        results = pool.imap_unordered(process_ead_file_task, tasks)
+        for done, (ead_file, archive_id, df, error, metrics) in enumerate(results, 1):
+            if metrics is not None:
+                with open(metrics_file, 'at') as fh:
+                    fh.write(json.dumps(metrics) + '\n')
+            if error is not None:
+                summary['failed'].append({'ead_file': ead_file, 'archive_id': archive_id, 'error': error})
+                status = f"FAILED - {error.strip().splitlines()[-1]}"
+            else:
+                # an archive without rows adds nothing, so it does not write the header either
+                if len(df) > 0:
+                    append_frame(df, output_file, write_header, columns=columns)
+                    write_header = False
+                summary['processed'].append(archive_id)
+                summary['rows'] += len(df)
+                status = f"{len(df)} rows"
+            if progress:
+                print(f"[{done}/{len(tasks)}] {time.time() - start:.1f}s {archive_id}: {status}", file=sys.stderr)
+    if write_header:
+        append_frame(pd.DataFrame(columns=columns), output_file, write_header)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse a directory or glob of EAD files in parallel')
+    parser.add_argument('source', help='directory containing EAD XML files, or a glob pattern')
+    parser.add_argument('output_file', help='combined tab-separated output file')
+    parser.add_argument('--task', choices=sorted(TASKS), default='inventory')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes (default: number of cores)')
+    parser.add_argument('--max-subseries-depth', type=int, default=2)
+    parser.add_argument('--quiet', action='store_true', help='do not report progress')
+    parser.add_argument('--metrics-file', default=None,
+                        help='JSON lines file for the parser metrics (call counts, timings) of every archive')
+    args = parser.parse_args()
+
+    summary = process_corpus(args.source, args.output_file, task=args.task, processes=args.processes,
+                             max_subseries_depth=args.max_subseries_depth, progress=not args.quiet,
+                             metrics_file=args.metrics_file)
+    print(f"processed {len(summary['processed'])} of {summary['archives']} archives, "
+          f"{summary['rows']} rows written to {args.output_file}", file=sys.stderr)
+    for failed in summary['failed']:
+        print(f"failed: {failed['ead_file']}\n{failed['error']}", file=sys.stderr)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
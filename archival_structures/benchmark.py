@@ -0,0 +1,321 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List
+
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+import archival_structures.ead_start_end_year as ead_start_end_year
+
+
+DEFAULT_SCALES = [1000, 10000, 100000, 1000000]
+DEFAULT_GENERATOR_CONFIG = {
+    'num_series': 10,
+    'subseries_depth': 2,
+    'subseries_fanout': 3,
+    'filegroup_depth': 1,
+    'files_per_level': 10,
+    'handle_ratio': 0.8,
+    'obsolete_ratio': 0.05,
+    'dao_ratio': 0.5,
+    'unitdate_ratio': 0.9,
+    'seed': 0
+}
+# unitdate normal attribute values in the forms used by the Nationaal Archief
+NORMAL_DATE_FORMS = ['{y}', '{y}-{m:02d}', '{y}-{m:02d}-{d:02d}', '{y}/{y2}', '{y}-{m:02d}/{y2}-{m:02d}']
+
+
+class SyntheticEADWriter:
+    # Writes an EAD with a fixed shape: series hold files, filegroups and a tree of subseries of
+    # the given depth and fan-out, every component holds files_per_level files. Components are
+    # added until num_files file components have been written. The XML is written as it is
+    # generated, so the largest scales do not have to fit in memory.
+
+    def __init__(self, fh, num_files: int, num_series: int = 10, subseries_depth: int = 2,
+                 subseries_fanout: int = 3, filegroup_depth: int = 1, files_per_level: int = 10,
+                 handle_ratio: float = 0.8, obsolete_ratio: float = 0.05, dao_ratio: float = 0.5,
+                 unitdate_ratio: float = 0.9, seed: int = 0):
+        # every component has to write at least one file, otherwise the budget never runs out
+        if files_per_level < 1:
+            raise ValueError(f"files_per_level must be at least 1, got {files_per_level}")
+        self.fh = fh
+        self.num_files = num_files
+        self.num_series = num_series
+        self.subseries_depth = subseries_depth
+        self.subseries_fanout = subseries_fanout
+        self.filegroup_depth = filegroup_depth
+        self.files_per_level = files_per_level
+        self.handle_ratio = handle_ratio
+        self.obsolete_ratio = obsolete_ratio
+        self.dao_ratio = dao_ratio
+        self.unitdate_ratio = unitdate_ratio
+        self.random = random.Random(seed)
+        self.budget = 0
+        self.inventory_num = 0
+
+    def write(self):
+        self.fh.write('<?xml version="1.0" encoding="UTF-8"?>\n<ead><eadheader><eadid>0.00.00</eadid></eadheader>'
+                      '<archdesc level="fonds"><did><unittitle>Synthetisch archief</unittitle></did><dsc>')
+        for series_index in range(self.num_series):
+            # the files are spread evenly over the series
+            self.budget = self.num_files // self.num_series + (series_index < self.num_files % self.num_series)
+            self.write_series(series_index + 1)
+        self.fh.write('</dsc></archdesc></ead>\n')
+
+    def write_did(self, unitids: List[str], title: str, date: str = None, dao: str = None):
+        self.fh.write('<did>')
+        for unitid in unitids:
+            self.fh.write(unitid)
+        self.fh.write(f'<unittitle>{title}</unittitle>')
+        if date is not None:
+            self.fh.write(f'<unitdate normal="{date}" calendar="gregorian">{date}</unitdate>')
+        if dao is not None:
+            self.fh.write(f'<dao role="METS" href="{dao}"/>')
+        self.fh.write('</did>')
+
+    def get_normal_date(self) -> str:
+        year = self.random.randint(1500, 1950)
+        date_form = self.random.choice(NORMAL_DATE_FORMS)
+        return date_form.format(y=year, y2=year + self.random.randint(0, 20),
+                                m=self.random.randint(1, 12), d=self.random.randint(1, 28))
+
+    def write_file(self):
+        self.budget -= 1
+        self.inventory_num += 1
+        num = self.inventory_num
+        unitids = [f'<unitid type="ABS" identifier="id{num}">{num}</unitid>']
+        if self.random.random() < self.handle_ratio:
+            unitids.append(f'<unitid type="handle">http://hdl.handle.net/10648/{num:08d}</unitid>')
+        if self.random.random() < self.obsolete_ratio:
+            unitids.insert(0, f'<unitid type="obsolete">{num}a</unitid>')
+        date = self.get_normal_date() if self.random.random() < self.unitdate_ratio else None
+        dao = f'https://service.archief.nl/mets/{num}' if self.random.random() < self.dao_ratio else None
+        self.fh.write('<c level="file">')
+        self.write_did(unitids, f'Stukken betreffende zaak {num}', date=date, dao=dao)
+        self.fh.write('</c>')
+
+    def write_files(self):
+        for _ in range(min(self.files_per_level, self.budget)):
+            self.write_file()
+
+    def write_filegroup(self, depth: int):
+        first = self.inventory_num + 1
+        self.fh.write('<c level="otherlevel" otherlevel="filegrp">')
+        self.write_did([f'<unitid>{first}-{first + self.files_per_level - 1}</unitid>'], f'Groep {first}')
+        self.write_files()
+        if depth < self.filegroup_depth and self.budget > 0:
+            self.write_filegroup(depth + 1)
+        self.fh.write('</c>')
+
+    def write_subseries(self, depth: int, index: int):
+        self.fh.write('<c level="subseries">')
+        self.write_did([f'<unitid>{index}</unitid>'], f'Subreeks {depth}.{index}')
+        self.write_files()
+        if self.filegroup_depth > 0 and self.budget > 0:
+            self.write_filegroup(1)
+        if depth < self.subseries_depth:
+            for child_index in range(self.subseries_fanout):
+                if self.budget == 0:
+                    break
+                self.write_subseries(depth + 1, child_index + 1)
+        self.fh.write('</c>')
+
+    def write_series(self, series_index: int):
+        self.fh.write('<c level="series">')
+        self.write_did([f'<unitid>{series_index}</unitid>'], f'Reeks {series_index}')
+        self.fh.write('<scopecontent><p>Beschrijving</p></scopecontent>')
+        self.write_files()
+        subseries_index = 0
+        while self.budget > 0:
+            subseries_index += 1
+            if self.subseries_depth > 0:
+                self.write_subseries(1, subseries_index)
+            elif self.filegroup_depth > 0:
+                self.write_filegroup(1)
+            else:
+                self.write_files()
+        self.fh.write('</c>')
+
+
+def generate_ead(output_file: str, num_files: int, **config) -> str:
+    with open(output_file, 'wt', encoding='utf-8') as fh:
+        SyntheticEADWriter(fh, num_files, **config).write()
+    return output_file
+
+
+def get_series_files(ead_file: str):
+    dsc = ead_parser.get_desc(ead_parser.read_ead_file(ead_file))
+    return ead_parser.get_series_files(dsc)
+
+
+def get_files_info(ead_file: str):
+    dsc = ead_parser.get_desc(ead_parser.read_ead_file(ead_file))
+    return ead_parser.get_files_info(dsc)
+
+
+def extract_dates(ead_file: str, output_dir: str):
+    return ead_start_end_year.extract_dates(ead_file, os.path.join(output_dir, 'dates'))
+
+
+# every benchmark takes the EAD file and a scratch directory for its output
+BENCHMARKS: Dict[str, Callable[[str, str], any]] = {
+    'read_ead_file': lambda ead_file, output_dir: ead_parser.read_ead_file(ead_file),
+    'get_files_info': lambda ead_file, output_dir: get_files_info(ead_file),
+    'get_series_files': lambda ead_file, output_dir: get_series_files(ead_file),
+    'get_inventory_info': lambda ead_file, output_dir: ead_parser.get_inventory_info(ead_file),
+    'extract_dates': lambda ead_file, output_dir: extract_dates(ead_file, output_dir)
+}
+
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def time_benchmark(benchmark: Callable, ead_file: str, output_dir: str, repeat: int = 3) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = benchmark(ead_file, output_dir)
+        times.append(time.perf_counter() - start)
+        del result
+    return times
+
+
+def measure_peak_memory(benchmark: Callable, ead_file: str, output_dir: str) -> int:
+    # a separate run, tracemalloc slows down allocation heavy code too much to time it as well
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = benchmark(ead_file, output_dir)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+def run_benchmarks(scales: Iterable[int] = None, benchmarks: Iterable[str] = None, repeat: int = 3,
+                   memory: bool = True, data_dir: str = None, generator_config: Dict[str, any] = None,
+                   output_file: str = None, progress: bool = True) -> List[Dict[str, any]]:
+    # Run every benchmark on a synthetic EAD per scale (number of file components) and return one
+    # result record per benchmark and scale. With output_file the records are also appended as
+    # JSON lines, so the results of different runs and commits can be compared.
+    scales = DEFAULT_SCALES if scales is None else list(scales)
+    benchmarks = list(BENCHMARKS) if benchmarks is None else list(benchmarks)
+    for name in benchmarks:
+        if name not in BENCHMARKS:
+            raise ValueError(f"unknown benchmark '{name}', must be one of {list(BENCHMARKS)}")
+    config = {**DEFAULT_GENERATOR_CONFIG, **(generator_config or {})}
+    keep_data = data_dir is not None
+    data_dir = data_dir if keep_data else tempfile.mkdtemp(prefix='ead-benchmark-')
+    os.makedirs(data_dir, exist_ok=True)
+    run_info = {
+        'run_timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': get_git_commit(),
+        'parser_version': ead_parser.PARSER_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform()
+    }
+    results = []
+    try:
+        for scale in scales:
+            # generated files are reused between runs when a data_dir is given
+            config_key = '-'.join(f"{value}" for value in config.values())
+            ead_file = os.path.join(data_dir, f"synthetic-{scale}-{config_key}.xml")
+            if not os.path.exists(ead_file):
+                generate_ead(ead_file, scale, **config)
+            for name in benchmarks:
+                output_dir = tempfile.mkdtemp(dir=data_dir)
+                try:
+                    times = time_benchmark(BENCHMARKS[name], ead_file, output_dir, repeat=repeat)
+                    peak = measure_peak_memory(BENCHMARKS[name], ead_file, output_dir) if memory else None
+                finally:
+                    shutil.rmtree(output_dir)
+                result = {
+                    **run_info,
+                    'benchmark': name,
+                    'num_files': scale,
+                    'file_bytes': os.path.getsize(ead_file),
+                    'generator_config': config,
+                    'times': times,
+                    'min_time': min(times),
+                    'median_time': statistics.median(times),
+                    'peak_memory_bytes': peak
+                }
+                results.append(result)
+                if output_file is not None:
+                    with open(output_file, 'at') as fh:
+                        fh.write(json.dumps(result) + '\n')
+                if progress:
+                    peak_string = f"{peak / 1024 ** 2:.1f} MiB" if peak is not None else '-'
+                    print(f"{name:<20} {scale:>9} files  {min(times):8.3f}s  {peak_string}", file=sys.stderr)
+    finally:
+        if keep_data is False:
+            shutil.rmtree(data_dir)
+    return results
+
+
+def read_results(results_file: str) -> pd.DataFrame:
+    with open(results_file, 'rt') as fh:
+        return pd.DataFrame([json.loads(line) for line in fh if line.strip() != ''])
+
+
+def compare_results(baseline_file: str, results_file: str) -> pd.DataFrame:
+    # ratio of the latest run in results_file to the latest run in baseline_file per benchmark
+    # and scale, values above 1 are slower or use more memory than the baseline
+    frames = []
+    for results in [read_results(baseline_file), read_results(results_file)]:
+        latest = results[results['run_timestamp'] == results['run_timestamp'].max()]
+        frames.append(latest.set_index(['benchmark', 'num_files'])[['min_time', 'peak_memory_bytes']])
+    baseline, current = frames
+    comparison = baseline.join(current, lsuffix='_baseline', rsuffix='_current', how='inner')
+    comparison['time_ratio'] = comparison['min_time_current'] / comparison['min_time_baseline']
+    comparison['memory_ratio'] = comparison['peak_memory_bytes_current'] / comparison['peak_memory_bytes_baseline']
+    return comparison
+
+
+def parse_generator_args(args: argparse.Namespace) -> Dict[str, any]:
+    return {field: getattr(args, field) for field in DEFAULT_GENERATOR_CONFIG}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the EAD parser on synthetic finding aids')
+    parser.add_argument('output_file', help='JSON lines file the results are appended to')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='numbers of file components to benchmark')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurement')
+    parser.add_argument('--data-dir', default=None, help='keep the generated EAD files in this directory')
+    parser.add_argument('--compare', default=None, help='baseline results file to compare the new results with')
+    for field, default in DEFAULT_GENERATOR_CONFIG.items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args()
+
+    run_benchmarks(scales=args.scales, benchmarks=args.benchmarks, repeat=args.repeat,
+                   memory=not args.no_memory, data_dir=args.data_dir,
+                   generator_config=parse_generator_args(args), output_file=args.output_file)
+    if args.compare is not None:
+        print(compare_results(args.compare, args.output_file).to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
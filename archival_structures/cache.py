@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Union
+
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'archival-structures')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+def has_parquet_support() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def hash_file(path: str, chunk_size: int = 1024 ** 2) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class EADCache:
+    # Parsed EAD frames stored on disk under the content hash of the EAD file, the parser
+    # version and the parse parameters. Entries are parquet files when pyarrow is available
+    # (pickles otherwise), so dtypes such as the categorical hierarchy columns survive.
+    # The file modification time of an entry doubles as its last access time for LRU eviction.
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.extension = '.parquet' if has_parquet_support() else '.pkl'
+        self.hashes_file = os.path.join(cache_dir, 'content_hashes.json')
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_content_hash(self, ead_file: str) -> str:
+        # hashing a large EAD costs more than reading a cached frame, so the hash
+        # is remembered per path, size and modification time
+        stat = os.stat(ead_file)
+        stat_key = f"{os.path.realpath(ead_file)}|{stat.st_size}|{stat.st_mtime_ns}"
+        hashes = self.read_content_hashes()
+        if stat_key not in hashes:
+            hashes[stat_key] = hash_file(ead_file)
+            self.write_content_hashes(hashes)
+        return hashes[stat_key]
+
+    def read_content_hashes(self) -> Dict[str, str]:
+        if not os.path.exists(self.hashes_file):
+            return {}
+        with open(self.hashes_file, 'rt') as fh:
+            return json.load(fh)
+
+    def write_content_hashes(self, hashes: Dict[str, str]):
+        tmp_file = f"{self.hashes_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wt') as fh:
+            json.dump(hashes, fh)
+        os.replace(tmp_file, self.hashes_file)
+
+    def get_key(self, ead_file: str, **params) -> str:
+        content_hash = self.get_content_hash(ead_file)
+        param_string = json.dumps(params, sort_keys=True, default=str)
+        param_hash = hashlib.sha256(f"{ead_parser.PARSER_VERSION}|{param_string}".encode('utf-8')).hexdigest()
+        return f"{content_hash}-{param_hash[:16]}"
+
+    def get_entry_file(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.extension}")
+
+    def list_entry_files(self) -> List[str]:
+        return [os.path.join(self.cache_dir, fname) for fname in os.listdir(self.cache_dir)
+                if fname.endswith('.parquet') or fname.endswith('.pkl')]
+
+    def get(self, key: str) -> Union[pd.DataFrame, None]:
+        entry_file = self.get_entry_file(key)
+        if not os.path.exists(entry_file):
+            return None
+        if self.extension == '.parquet':
+            df = pd.read_parquet(entry_file)
+        else:
+            df = pd.read_pickle(entry_file)
+        os.utime(entry_file)
+        return df
+
+    def put(self, key: str, df: pd.DataFrame):
+        entry_file = self.get_entry_file(key)
+        tmp_file = f"{entry_file}.{os.getpid()}.tmp"
+        if self.extension == '.parquet':
+            df.to_parquet(tmp_file, index=False)
+        else:
+            df.to_pickle(tmp_file)
+        os.replace(tmp_file, entry_file)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry_file in self.list_entry_files():
+            stat = os.stat(entry_file)
+            entries.append((stat.st_mtime, stat.st_size, entry_file))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_file in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(entry_file)
+            total_bytes -= size
+
+    def invalidate(self, ead_file: str = None):
+        # without an EAD file the whole cache is cleared, otherwise every entry
+        # of that file's content, whatever the parameters
+        prefix = None if ead_file is None else self.get_content_hash(ead_file)
+        for entry_file in self.list_entry_files():
+            if prefix is None or os.path.basename(entry_file).startswith(f"{prefix}-"):
+                os.remove(entry_file)
+        if prefix is None and os.path.exists(self.hashes_file):
+            os.remove(self.hashes_file)
+
+
+def get_inventory_info_cached(ead_file: str, max_subseries_depth: int = 2,
+                              cache: EADCache = None, **kwargs) -> pd.DataFrame:
+    if cache is None:
+        cache = EADCache()
+    key = cache.get_key(ead_file, function='get_inventory_info', max_subseries_depth=max_subseries_depth, **kwargs)
+    df = cache.get(key)
+    if df is None:
+        df = ead_parser.get_inventory_info(ead_file, max_subseries_depth=max_subseries_depth, **kwargs)
+        cache.put(key, df)
+    return df
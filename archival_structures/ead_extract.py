@@ -0,0 +1,35 @@
+from typing import Dict, Iterable
+
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+import archival_structures.ead_start_end_year as ead_start_end_year
+
+
+OUTPUTS = {'inventory', 'dates'}
+
+
+def get_output_sink(output: str, max_subseries_depth: int = 2, categorical: bool = True):
+    if output == 'inventory':
+        return ead_parser.InventoryColumns(max_subseries_depth=max_subseries_depth, categorical=categorical)
+    elif output == 'dates':
+        return ead_start_end_year.DateRecords()
+    raise ValueError(f"unknown output '{output}', must be one of {OUTPUTS}")
+
+
+def run_sinks(ead_file, sinks: Dict[str, any], structure: bool = True) -> Dict[str, any]:
+    # every sink receives each c level="file" element and its FileRecord (or None)
+    # from a single pass over the EAD
+    for component, file_record in ead_parser.iter_file_components(ead_file, structure=structure):
+        for sink in sinks.values():
+            sink.add_file_component(component, file_record)
+    return sinks
+
+
+def extract(ead_file, outputs: Iterable[str] = ('inventory', 'dates'), max_subseries_depth: int = 2,
+            categorical: bool = True) -> Dict[str, pd.DataFrame]:
+    sinks = {output: get_output_sink(output, max_subseries_depth=max_subseries_depth, categorical=categorical)
+             for output in outputs}
+    # the structural context is only needed for the inventory rows
+    run_sinks(ead_file, sinks, structure='inventory' in sinks)
+    return {output: sink.to_frame() for output, sink in sinks.items()}
@@ -1,11 +1,94 @@
+import logging
 import re
+import time
 import xml.etree.ElementTree as ET
 import copy
-from collections import defaultdict
-from typing import Dict, Generator, List, Union
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Generator, Iterable, List, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
+import archival_structures.instrumentation as instrumentation
+import archival_structures.sources as sources
+
+
+# bump when a change to the parser changes its output, this invalidates cached results
+PARSER_VERSION = '2'
+
+logger = logging.getLogger(__name__)
+
+# Unexpected elements counted per (parent, tag) while parsing in tolerant mode, None when
+# the parser is strict and raises an EADParseError for them. Set with tolerant().
+unexpected_elements = None
+
+
+class EADParseError(ValueError):
+    # An unexpected element. get_file_records and iter_file_components add the path from the
+    # dsc down to the element, the element itself is not kept when the error is pickled.
+
+    def __init__(self, message: str, element: ET.Element = None, path: str = None):
+        super().__init__(message)
+        self.message = message
+        self.element = element
+        self.path = path
+
+    def __str__(self):
+        return self.message if self.path is None else f"{self.message} at {self.path}"
+
+    def __reduce__(self):
+        return EADParseError, (self.message, None, self.path)
+
+
+class tolerant:
+    # with tolerant() as unexpected: ...
+    # parses without raising on unexpected elements, which are skipped and counted per
+    # (parent, tag) in unexpected
+
+    def __init__(self):
+        self.unexpected = Counter()
+        self.previous = None
+
+    def __enter__(self) -> Counter:
+        global unexpected_elements
+        self.previous = unexpected_elements
+        unexpected_elements = self.unexpected
+        return self.unexpected
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        global unexpected_elements
+        unexpected_elements = self.previous
+        return False
+
+
+def report_unexpected(parent: str, child: ET.Element, message: str):
+    if unexpected_elements is None:
+        raise EADParseError(message, element=child)
+    unexpected_elements[(parent, child.tag)] += 1
+
+
+def get_element_label(elem: ET.Element) -> str:
+    label = elem.tag
+    for name in ('level', 'id'):
+        if name in elem.attrib:
+            label += f"[@{name}='{elem.attrib[name]}']"
+    return label
+
+
+def get_element_path(ancestors: List[ET.Element], top: ET.Element, element: ET.Element) -> str:
+    # the parent map is only built for the subtree of top, and only when an error is reported
+    parents = {child: parent for parent in top.iter() for child in parent}
+    path = [element]
+    while path[-1] is not top and path[-1] in parents:
+        path.append(parents[path[-1]])
+    return '/'.join(get_element_label(elem) for elem in ancestors + path[::-1])
+
+
+def locate_parse_error(err: EADParseError, ancestors: List[ET.Element], top: ET.Element):
+    if err.path is None and err.element is not None:
+        err.path = get_element_path(ancestors, top, err.element)
+
 
 def unit_has_inv_num_unitid(unit: dict):
     return re.match(r"\d+", unit['unitid'])
@@ -70,8 +153,8 @@ def extract_file_info(inv_num_file: dict):
                 else:
                     file_ids.append(get_inv_num_unit(file))
             except (KeyError, TypeError):
-                print(file)
-                print(inv_num_file)
+                logger.error(f"extract_file_info - cannot parse file: {file}")
+                logger.error(f"\tinv_num_file: {inv_num_file}")
                 raise
 
             if 'unitdate' in file and file['unitdate'] is not None:
@@ -97,7 +180,8 @@ def extract_file_info(inv_num_file: dict):
 
 def extract_inv_num_file_info(inv_num_file, max_subseries_depth: int = None):
     unit = get_inv_num_unit(inv_num_file['file'])
-    series = [inv_num_file['series']['title']]
+    # a plan that skips the series did leaves the series without a title
+    series = [inv_num_file['series'].get('title')]
     subseries = extract_subseries_info(inv_num_file)
     filegroups, filegroup_ids = extract_filegroup_info(inv_num_file)
     files, file_ids, file_dates, mets_file = extract_file_info(inv_num_file)
@@ -127,20 +211,7 @@ def get_inventory_files_info(files_info):
     return [fi for fi in unit_files if file_has_inv_num_unitid(fi['file'])]
 
 
-def get_inventory_info(ead_file, max_subseries_depth: int = 2):
-    rep_ead = read_ead_file(ead_file)
-    rep_dsc = get_desc(rep_ead)
-    files_info = get_files_info(rep_dsc)
-    inv_files_info = get_inventory_files_info(files_info)
-
-    rows = []
-
-    for inv_file_info in inv_files_info:
-        if 'file' not in inv_file_info:
-            continue
-        row = extract_inv_num_file_info(inv_file_info, max_subseries_depth=max_subseries_depth)
-        rows.append(row)
-
+def get_inventory_columns(max_subseries_depth: int = 2) -> List[str]:
     subseries_cols = [f"subseries_{i + 1}" for i in range(max_subseries_depth)]
     columns = ['series'] + subseries_cols
     columns += [
@@ -151,8 +222,203 @@ def get_inventory_info(ead_file, max_subseries_depth: int = 2):
         'inventory_num',
         'mets_file'
     ]
+    return columns
+
+
+def is_inventory_file_record(file_record: Union['FileRecord', Dict[str, any]]) -> bool:
+    if isinstance(file_record, FileRecord) is False:
+        return False
+    return 'unitid' in file_record.file and bool(file_has_inv_num_unitid(file_record.file))
+
+
+def iter_inventory_file_rows(file_records, max_subseries_depth: int = 2) -> Generator[list, None, None]:
+    for file_record in file_records:
+        if is_inventory_file_record(file_record):
+            # the row only reads the context, so a shallow view of the shared chain suffices
+            file_info = file_record.to_dict(deep=False)
+            yield extract_inv_num_file_info(file_info, max_subseries_depth=max_subseries_depth)
+
+
+def iter_inventory_rows(ead_file, max_subseries_depth: int = 2) -> Generator[list, None, None]:
+    file_records = iter_file_records(ead_file)
+    return iter_inventory_file_rows(file_records, max_subseries_depth=max_subseries_depth)
+
+
+# Projection pushdown: the fields each child element of a file did, a file and a
+# series/subseries/filegroup component contributes. A FieldPlan compiled from the requested
+# fields lets the parse functions skip the children (and their subtrees) that contribute none.
+FILE_DID_FIELDS = {
+    'unittitle': {'title', 'unitdate'},
+    'unitid': {'unitid', 'id', 'handle', 'identifier', 'identifier_text', 'extra_id'},
+    'unitdate': {'unitdate'},
+    'physdesc': {'physdesc'},
+    'dao': {'dao'}
+}
+FILE_CHILD_FIELDS = {
+    'did': set.union(*FILE_DID_FIELDS.values()),
+    'controlaccess': {'access'},
+    'c': {'level'}
+}
+COMPONENT_CHILD_FIELDS = {
+    'series': {'did': 'series', 'odd': 'odd'},
+    'subseries': {'did': 'subseries', 'odd': 'odd', 'otherfindaid': 'otherfindaid'},
+    'filegroup': {'did': 'filegroup', 'odd': 'other', 'otherfindaid': 'other', 'scopecontent': 'other',
+                  'phystech': 'other', 'altformavail': 'other', 'separatedmaterial': 'separatedmaterial',
+                  'bioghist': 'bioghist', 'bibliography': 'bibliography', 'custodhist': 'custodhist'}
+}
+FILE_FIELDS = FILE_CHILD_FIELDS['did'] | FILE_CHILD_FIELDS['controlaccess'] | FILE_CHILD_FIELDS['c']
+CONTEXT_FIELDS = {field for child_fields in COMPONENT_CHILD_FIELDS.values() for field in child_fields.values()}
+# fields needed for each inventory column, unitid is always needed to select the inventory files
+INVENTORY_COLUMN_FIELDS = {
+    'series': {'series'},
+    'subseries': {'subseries'},
+    'filegroup': {'filegroup'},
+    'inventory_range': {'filegroup'},
+    'file': {'title', 'identifier_text'},
+    'unitdate': {'unitdate'},
+    'inventory_num': set(),
+    'mets_file': {'dao'}
+}
+
+
+class FieldPlan:
+    __slots__ = ('fields', 'skipped_did_tags', 'skipped_file_tags', 'skipped_component_tags')
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = set(fields)
+        unknown_fields = self.fields - FILE_FIELDS - CONTEXT_FIELDS
+        if len(unknown_fields) > 0:
+            raise ValueError(f"unknown fields {sorted(unknown_fields)}, must be one of "
+                             f"{sorted(FILE_FIELDS | CONTEXT_FIELDS)}")
+        self.skipped_did_tags = {tag for tag, tag_fields in FILE_DID_FIELDS.items()
+                                 if len(tag_fields & self.fields) == 0}
+        # a c child of a file is always checked, unexpected ones raise as without a plan
+        self.skipped_file_tags = {tag for tag in ('did', 'controlaccess')
+                                  if len(FILE_CHILD_FIELDS[tag] & self.fields) == 0}
+        self.skipped_component_tags = {kind: {tag for tag, field in child_fields.items() if field not in self.fields}
+                                       for kind, child_fields in COMPONENT_CHILD_FIELDS.items()}
+
+    def skips_component_child(self, kind: str, tag: str) -> bool:
+        return tag in self.skipped_component_tags[kind]
+
+
+def compile_field_plan(fields: Union[Iterable[str], None]) -> Union[FieldPlan, None]:
+    return FieldPlan(fields) if fields is not None else None
+
+
+def get_inventory_fields(columns: Iterable[str], max_subseries_depth: int = 2) -> List[str]:
+    inventory_columns = get_inventory_columns(max_subseries_depth)
+    fields = {'unitid'}
+    for column in columns:
+        if column not in inventory_columns:
+            raise ValueError(f"unknown inventory column '{column}', must be one of {inventory_columns}")
+        fields.update(INVENTORY_COLUMN_FIELDS['subseries' if column.startswith('subseries_') else column])
+    return sorted(fields)
+
+
+def project_file_info(file_info: Dict[str, any], plan: FieldPlan) -> Dict[str, any]:
+    if 'file' not in file_info:
+        return file_info
+    projected_info = {'file': {field: value for field, value in file_info['file'].items() if field in plan.fields}}
+    for field, value in file_info.items():
+        if field in plan.fields:
+            projected_info[field] = value
+    return projected_info
+
+
+class InventoryColumns:
+    # Column buffers for the inventory frame. The hierarchy columns repeat the same few titles
+    # for thousands of rows, so they are dictionary-encoded as int32 codes while parsing and
+    # turned into categoricals when the frame is built.
+
+    def __init__(self, max_subseries_depth: int = 2, categorical: bool = True):
+        self.max_subseries_depth = max_subseries_depth
+        self.categorical = categorical
+        self.columns = get_inventory_columns(max_subseries_depth)
+        self.encoded_columns = self.columns[:max_subseries_depth + 3]
+        self.codes = {column: array('i') for column in self.encoded_columns}
+        self.categories = {column: {} for column in self.encoded_columns}
+        self.values = {column: [] for column in self.columns[max_subseries_depth + 3:]}
+
+    def __len__(self):
+        return len(self.codes['series'])
+
+    def append_row(self, row: list):
+        for column, value in zip(self.columns, row):
+            if column in self.values:
+                self.values[column].append(value)
+            elif value is None:
+                self.codes[column].append(-1)
+            else:
+                categories = self.categories[column]
+                if value not in categories:
+                    categories[value] = len(categories)
+                self.codes[column].append(categories[value])
+
+    def append_file_records(self, file_records: Iterable[Union['FileRecord', Dict[str, any]]]):
+        for row in iter_inventory_file_rows(file_records, max_subseries_depth=self.max_subseries_depth):
+            self.append_row(row)
+
+    def add_file_component(self, component: ET.Element, file_record: Union['FileRecord', None]):
+        if is_inventory_file_record(file_record):
+            file_info = file_record.to_dict(deep=False)
+            self.append_row(extract_inv_num_file_info(file_info, max_subseries_depth=self.max_subseries_depth))
+
+    def get_codes(self, column: str) -> np.ndarray:
+        if len(self) == 0:
+            return np.array([], dtype=np.int32)
+        return np.frombuffer(self.codes[column], dtype=np.int32)
+
+    def get_column(self, column: str):
+        if column in self.values:
+            return self.values[column]
+        codes = self.get_codes(column)
+        categories = list(self.categories[column])
+        if self.categorical:
+            return pd.Categorical.from_codes(codes, categories=categories)
+        # code -1 picks the trailing None
+        return np.array(categories + [None], dtype=object)[codes]
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({column: self.get_column(column) for column in self.columns}, columns=self.columns)
+
+    def to_arrow(self):
+        import pyarrow as pa
+
+        arrays = []
+        for column in self.columns:
+            if column in self.values:
+                arrays.append(pa.array(self.values[column], type=pa.string()))
+                continue
+            codes = self.get_codes(column)
+            indices = pa.array(codes, mask=codes < 0)
+            dictionary = pa.array(list(self.categories[column]), type=pa.string())
+            arrays.append(pa.DictionaryArray.from_arrays(indices, dictionary))
+        return pa.Table.from_arrays(arrays, names=self.columns)
+
+
+def get_inventory_columns_info(ead_file, max_subseries_depth: int = 2, streaming: bool = False,
+                               categorical: bool = True, fields: List[str] = None) -> InventoryColumns:
+    # fields selects inventory columns, the others are left empty
+    plan = compile_field_plan(get_inventory_fields(fields, max_subseries_depth) if fields is not None else None)
+    if streaming:
+        file_records = iter_file_records(ead_file, plan=plan)
+    else:
+        rep_ead = read_ead_file(ead_file)
+        rep_dsc = get_desc(rep_ead)
+        file_records = get_file_records(rep_dsc, plan=plan)
+
+    inventory_columns = InventoryColumns(max_subseries_depth=max_subseries_depth, categorical=categorical)
+    inventory_columns.append_file_records(file_records)
+    return inventory_columns
 
-    return pd.DataFrame(rows, columns=columns)
+
+def get_inventory_info(ead_file, max_subseries_depth: int = 2, streaming: bool = False,
+                       categorical: bool = True, fields: List[str] = None):
+    inventory_columns = get_inventory_columns_info(ead_file, max_subseries_depth=max_subseries_depth,
+                                                   streaming=streaming, categorical=categorical, fields=fields)
+    df = inventory_columns.to_frame()
+    return df if fields is None else df[list(fields)]
 
 
 def parse_other(other: ET.Element, tree_level: int = 0):
@@ -163,7 +429,7 @@ def parse_other(other: ET.Element, tree_level: int = 0):
         elif child.tag in {'list'}:
             pass
         else:
-            raise ValueError(f'unexpected {other.tag} child {child.tag}')
+            report_unexpected(other.tag, child, f'unexpected {other.tag} child {child.tag}')
     return other_info
 
 
@@ -175,9 +441,10 @@ def parse_odd(odd: ET.Element, tree_level: int = 0) -> Dict[str, any]:
         elif child.tag in {'list'}:
             pass
         else:
-            print(f"child.text: {child.text}")
-            print(f"child.attrib: {child.attrib}")
-            raise ValueError(f'unexpected odd child {child.tag}')
+            if unexpected_elements is None:
+                logger.error(f"child.text: {child.text}")
+                logger.error(f"child.attrib: {child.attrib}")
+            report_unexpected('odd', child, f'unexpected odd child {child.tag}')
     return odd_info
 
 
@@ -187,7 +454,7 @@ def parse_otherfindaid(otherfindaid: ET.Element, tree_level: int = 0) -> Dict[st
         if child.tag == 'p':
             otherfindaid_info[child.tag] = child.text
         else:
-            raise ValueError(f'unexpected otherfindaid child {child.tag}')
+            report_unexpected('otherfindaid', child, f'unexpected otherfindaid child {child.tag}')
     return otherfindaid_info
 
 
@@ -200,7 +467,7 @@ def parse_access(access: ET.Element, tree_level: int = 0) -> Dict[str, any]:
             }
             access_info.update(child.attrib)
         else:
-            raise ValueError(f'unexpected controlaccess child {child.tag}')
+            report_unexpected('controlaccess', child, f'unexpected controlaccess child {child.tag}')
     return access_info
 
 
@@ -213,12 +480,14 @@ def parse_physdesc(physdesc: ET.Element, tree_level: int = 0) -> Dict[str, any]:
         if child.tag in {'extent', 'physfacet'}:
             physical_info[child.tag] = child.text
         else:
-            raise ValueError(f'unexpected physdesc child {child.tag}')
+            report_unexpected('physdesc', child, f'unexpected physdesc child {child.tag}')
+            continue
         physical_info.update(child.attrib)
     return physical_info
 
 
-def parse_did(did: ET.Element, tree_level: int = 0) -> Dict[str, any]:
+@instrumentation.instrument
+def parse_did(did: ET.Element, tree_level: int = 0, plan: FieldPlan = None) -> Dict[str, any]:
     did_info = {
         'unitid': [],
         'unitdate': None,
@@ -229,6 +498,8 @@ def parse_did(did: ET.Element, tree_level: int = 0) -> Dict[str, any]:
     }
     for child in did:
         # print('CHILD.TAG:', child.tag)
+        if plan is not None and child.tag in plan.skipped_did_tags:
+            continue
         if child.tag == 'dao':
             did_info['dao'] = {attr: child.attrib[attr] for attr in child.attrib}
             if child.text is not None and len(child.text.strip()) > 0:
@@ -262,290 +533,505 @@ def get_series(dsc: ET.Element) -> Generator[ET.Element, None, None]:
             yield child
 
 
+def get_component_kind(parent_kind: str, component: ET.Element) -> Union[str, None]:
+    if component.tag != 'c':
+        return None
+    level = component.attrib.get('level')
+    if parent_kind == 'dsc':
+        return 'series' if level == 'series' else None
+    if level == 'file' and parent_kind in {'series', 'subseries', 'filegroup'}:
+        return 'file'
+    if level == 'otherlevel' and component.attrib.get('otherlevel') == 'filegrp' \
+            and parent_kind in {'series', 'subseries', 'filegroup'}:
+        return 'filegroup'
+    if level == 'series' and parent_kind == 'series':
+        return 'series'
+    if level == 'subseries' and parent_kind in {'series', 'subseries'}:
+        return 'subseries'
+    return None
+
+
 def get_subseries_titles(file_info: Dict[str, any]) -> List[str]:
     if isinstance(file_info, list):
-        print(f"get_subseries_titles- file_info is of type list:\n", file_info)
+        logger.warning(f"get_subseries_titles- file_info is of type list:\n{file_info}")
     return [sub['title'] for sub in file_info['subseries']] if 'subseries' in file_info else []
 
 
 def get_subsubseries_titles(file_info: Dict[str, any]) -> List[str]:
     if isinstance(file_info, list):
-        print(f"get_subsubseries_titles- file_info is of type list:\n", file_info)
+        logger.warning(f"get_subsubseries_titles- file_info is of type list:\n{file_info}")
     if 'subseries' in file_info:
         return [sub['title'] for sub in file_info['subseries'] if 'subsubseries' in sub]
     else:
         return []
 
 
-def parse_series(series: ET.Element, tree_level: int = 0, debug: int = 0):
-    series_info = {
-        'series': {}
-    }
+class ContextNode:
+    # One step in the immutable ancestor context of a file. Each node sets (or appends to)
+    # a single context field, so all files of a component share the chain of their ancestors
+    # instead of each holding a deep copy of it.
+    __slots__ = ('parent', 'field', 'value', 'append')
+
+    def __init__(self, parent: Union['ContextNode', None], field: str, value: any, append: bool = False):
+        self.parent = parent
+        self.field = field
+        self.value = value
+        self.append = append
+
+    def chain(self) -> List['ContextNode']:
+        nodes = []
+        node = self
+        while node is not None:
+            nodes.append(node)
+            node = node.parent
+        return nodes[::-1]
+
+    def to_dict(self, deep: bool = True) -> Dict[str, any]:
+        context_info = {}
+        for node in self.chain():
+            value = copy.deepcopy(node.value) if deep else node.value
+            if node.append is False:
+                context_info[node.field] = value
+                continue
+            if node.field not in context_info:
+                context_info[node.field] = []
+            if value is not None:
+                context_info[node.field].append(value)
+        return context_info
+
+
+class FileRecord:
+    __slots__ = ('context', 'file')
+
+    def __init__(self, context: Union[ContextNode, None], file: Dict[str, any]):
+        self.context = context
+        self.file = file
+
+    def to_dict(self, deep: bool = True) -> Dict[str, any]:
+        file_info = {'file': self.file}
+        if self.context is not None:
+            file_info.update(self.context.to_dict(deep=deep))
+        return file_info
+
+
+def materialize_files_info(files_info: List[Union[FileRecord, Dict[str, any]]], deep: bool = True):
+    return [fi.to_dict(deep=deep) if isinstance(fi, FileRecord) else fi for fi in files_info]
+
+
+@instrumentation.instrument
+def parse_series_child(series_context: ContextNode, child: ET.Element, tree_level: int = 0, debug: int = 0,
+                       plan: FieldPlan = None):
+    other_info = None
+    if plan is not None and plan.skips_component_child('series', child.tag):
+        return series_context, other_info
+    if child.tag == 'did':
+        did_info = parse_did(child)
+        series_context = ContextNode(series_context, 'series', {
+            'title': did_info['unittitle'],
+            'id': did_info['unitid']
+        })
+        if tree_level <= 1 and debug > 0:
+            logger.debug(f"parse_series - tree_level {tree_level} - series title: {did_info['unittitle']}")
+        elif tree_level <= 4 and debug > 0:
+            logger.debug(f"{'  ' * tree_level}parse_series - tree_level {tree_level} - series title: {did_info['unittitle']}")
+    elif child.tag == 'odd':
+        other_info = parse_odd(child, tree_level=tree_level+1)
+    elif child.tag in {'scopecontent', 'userestrict'}:
+        # TODO figure out what to do with these
+        pass
+    else:
+        if unexpected_elements is None:
+            logger.error(f"parse_series - series_info: {series_context.to_dict()}")
+            logger.error(f'\tchild.tag: {child.tag}\tattrib: {child.attrib}')
+        report_unexpected('series', child, f'unexpected series child {child.tag}')
+    return series_context, other_info
+
+
+@instrumentation.instrument
+def parse_series(series: ET.Element, tree_level: int = 0, debug: int = 0, plan: FieldPlan = None):
+    series_context = new_component_context('series', None)
     files_info = []
     for child in series:
-        if child.tag == 'did':
-            did_info = parse_did(child)
-            series_info['series'] = {
-                'title': did_info['unittitle'],
-                'id': did_info['unitid']
-            }
-            if tree_level <= 1 and debug > 0:
-                print(f"\nparse_series - tree_level {tree_level} - series title: {did_info['unittitle']}")
-            elif tree_level <= 4 and debug > 0:
-                print(f"{'  ' * tree_level}parse_series - tree_level {tree_level} - series title: {did_info['unittitle']}")
-        elif child.tag == 'c' and child.attrib['level'] == 'series':
-            series_files_info = parse_series(child, tree_level=tree_level + 1)
-            for s in series_files_info:
-                if isinstance(s, str):
-                    print('parse_series - series - files_info is string')
-                    print(f'\tchild.tag: {child.tag}\ttext: {child.text}')
-            # print(f"ead_parser.parse_series - child 'c' with level 'series':")
-            # print(series_files_info)
+        kind = get_component_kind('series', child)
+        if kind == 'series':
+            series_files_info = parse_series(child, tree_level=tree_level + 1, plan=plan)
             files_info.extend(series_files_info)
-        elif child.tag == 'c' and child.attrib['level'] == 'subseries':
-            subseries_files_info = parse_subseries(child, series_info, tree_level=tree_level+1)
-            for s in subseries_files_info:
-                if isinstance(s, str):
-                    print('parse_series - subseries - files_info is string')
-                    print(f'\tchild.tag: {child.tag}\ttext: {child.text}')
+        elif kind == 'subseries':
+            subseries_files_info = parse_subseries(child, series_context, tree_level=tree_level+1, plan=plan)
             files_info.extend(subseries_files_info)
-        elif child.tag == 'c' and child.attrib['level'] == 'file':
-            file_info = parse_file(child, series_info, tree_level=tree_level+1)
+        elif kind == 'file':
+            file_info = parse_file(child, series_context, tree_level=tree_level+1, plan=plan)
             files_info.append(file_info)
-        elif child.tag == 'c' and child.attrib['level'] == 'otherlevel' and child.attrib['otherlevel'] == 'filegrp':
-            filegroup_info = parse_filegroup(child, series_info, tree_level=tree_level+1)
+        elif kind == 'filegroup':
+            filegroup_info = parse_filegroup(child, series_context, tree_level=tree_level+1, plan=plan)
             files_info.extend(filegroup_info)
-        elif child.tag == 'odd':
-            odd_info = parse_odd(child, tree_level=tree_level+1)
-            files_info.append(odd_info)
-        elif child.tag in {'scopecontent', 'userestrict'}:
-            # TODO figure out what to do with these
-            pass
         else:
-            print("parse_series - series_info:", series_info)
-            print(f'\tchild.tag: {child.tag}\tattrib: {child.attrib}')
-            raise ValueError(f'unexpected series child {child.tag}')
-    #print(f'parse_series - len(files_info): {len(files_info)}')
-    # print(files_info[0])
-    file_files = [fi for fi in files_info if 'file' in fi]
-    unit_files = [fi for fi in file_files if 'unitid' in fi['file']]
-    # and re.match(r"\d+", fi['file']['unitid'])
-    # if len(unit_files) > 0:
-        #print(unit_files[0]['file']['unitid'])
-        #print(unit_files[-1]['file']['unitid'])
-        #print(unit_files[0]['file']['unitid'], unit_files[0]['file']['subseries'])
-        #print(unit_files[-1]['file']['unitid'], unit_files[-1]['file']['subseries'])
+            series_context, other_info = parse_series_child(series_context, child, tree_level=tree_level, debug=debug,
+                                                            plan=plan)
+            if other_info is not None:
+                files_info.append(other_info)
     return files_info
 
 
-def parse_subseries(subseries, series_info, tree_level: int = 0, debug: int = 0):
-    subseries_info = copy.deepcopy(series_info)
-    if 'subseries' not in subseries_info:
-        subseries_info['subseries'] = []
-    #     try:
-    #         subseries_info = {
-    #             'series': {
-    #                 'title': series_info['title'],
-    #                 'id': series_info['id'][0]['unitid']
-    #             }
-    #         }
-    #     except KeyError:
-    #         print(series_info)
-    #         raise
+@instrumentation.instrument
+def parse_subseries_child(subseries_context: ContextNode, child: ET.Element, tree_level: int = 0, debug: int = 0,
+                          plan: FieldPlan = None):
+    other_info = None
+    if plan is not None and plan.skips_component_child('subseries', child.tag):
+        return subseries_context, other_info
+    if child.tag == 'did':
+        did_info = parse_did(child, tree_level=tree_level+1)
+        if len(did_info['unitid']) == 0:
+            subseries_context = ContextNode(subseries_context, 'subseries', {'title': did_info['unittitle']},
+                                            append=True)
+            if debug > 0:
+                logger.debug(f'parse_subseries - empty unitid list in in did_info: {did_info}')
+            # raise IndexError("empty 'unitid' list in did_info")
+        else:
+            subseries_context = ContextNode(subseries_context, 'subseries', {
+                'title': did_info['unittitle'],
+                'id': did_info['unitid'][0]['unitid']
+            }, append=True)
+        if tree_level <= 3 and debug > 0:
+            logger.debug(f"{'  ' * tree_level}parse_subseries - tree_level {tree_level} - subseries title: {did_info['unittitle']}")
+    elif child.tag == 'odd':
+        subseries_context = ContextNode(subseries_context, 'odd', parse_odd(child, tree_level=tree_level+1))
+    elif child.tag in {'otherfindaid'}:
+        other_info = parse_other(child, tree_level=tree_level+1)
+    elif child.tag in {'bioghist', 'custodhist', 'head', 'p', 'note', 'list', 'item',
+                       'processinfo', 'lb', 'arrangement', 'scopecontent', 'separatedmaterial',
+                       'relatedmaterial'}:
+        pass
+        # subsubseries_info = parse_subseries(child, subseries_info)
+        # files_info.extend(subsubseries_info)
+    elif child.tag == 'c' and 'level' in child.attrib:
+        if debug > 0:
+            logger.debug(f"parse_subseries - skipping child with tag 'c' and attributes {child.attrib}")
+        pass
+    else:
+        if unexpected_elements is None:
+            logger.error(f'parse_subseries - subseries_info: {subseries_context.to_dict()}')
+            logger.error(f'unexpected subseries child {child.tag}')
+            logger.error(f'\tchild.tag: {child.tag}\tattrib: {child.attrib}')
+        report_unexpected('subseries', child, f'unexpected subseries child {child.tag}')
+    return subseries_context, other_info
+
+
+@instrumentation.instrument
+def parse_subseries(subseries, series_context: ContextNode, tree_level: int = 0, debug: int = 0,
+                    plan: FieldPlan = None):
+    subseries_context = new_component_context('subseries', series_context)
     files_info = []
     for child in subseries:
-        if child.tag == 'did':
-            did_info = parse_did(child, tree_level=tree_level+1)
-            if 'unitid' not in did_info:
-                subseries_info['subseries'].append({'title': did_info['unittitle']})
-                print('parse_subseries - no unitid in did_info:', did_info)
-                # raise KeyError("no 'unitid' in did_info")
-            elif len(did_info['unitid']) == 0:
-                subseries_info['subseries'].append({'title': did_info['unittitle']})
-                if debug > 0:
-                    print('parse_subseries - empty unitid list in in did_info:', did_info)
-                # raise IndexError("empty 'unitid' list in did_info")
-            else:
-                subseries_info['subseries'].append({
-                    'title': did_info['unittitle'],
-                    'id': did_info['unitid'][0]['unitid']
-                })
-            if tree_level <= 3 and debug > 0:
-                print(f"{'  ' * tree_level}parse_subseries - tree_level {tree_level} - subseries title: {did_info['unittitle']}")
-        elif child.tag == 'c' and child.attrib['level'] == 'file':
-            file_info = parse_file(child, subseries_info, tree_level=tree_level+1)
-            if isinstance(file_info, str):
-                print('parse_subseries - file - file_info is string:', file_info)
-                print('\tchild.tag:', child.tag)
+        kind = get_component_kind('subseries', child)
+        if kind == 'file':
+            file_info = parse_file(child, subseries_context, tree_level=tree_level+1, plan=plan)
             files_info.append(file_info)
-        elif child.tag == 'c' and child.attrib['level'] == 'otherlevel' and child.attrib['otherlevel'] == 'filegrp':
-            filegrp_info = parse_filegroup(child, subseries_info, tree_level=tree_level+1)
-            for file_info in filegrp_info:
-                if isinstance(file_info, str):
-                    print('parse_subseries - filegrp - file_info is string:', file_info)
-                    print('\tchild.tag:', child.tag)
+        elif kind == 'filegroup':
+            filegrp_info = parse_filegroup(child, subseries_context, tree_level=tree_level+1, plan=plan)
             files_info.extend(filegrp_info)
-        elif child.tag == 'odd':
-            subseries_info['odd'] = parse_odd(child, tree_level=tree_level+1)
-        elif child.tag == 'c' and child.attrib['level'] == 'subseries':
-            subsubseries_info = parse_subseries(child, subseries_info, tree_level=tree_level+1)
-            for s in subsubseries_info:
-                if isinstance(s, str):
-                    print('parse_subseries - subseries - subseries_info is string:', s)
-                    print('\tchild.tag:', child.tag)
+        elif kind == 'subseries':
+            subsubseries_info = parse_subseries(child, subseries_context, tree_level=tree_level+1, plan=plan)
             files_info.extend(subsubseries_info)
-        elif child.tag in {'otherfindaid'}:
-            otherfindaid_info = parse_other(child, tree_level=tree_level+1)
-            if isinstance(otherfindaid_info, str):
-                print('parse_subseries - otherfindaid - otherfindaid is string:', otherfindaid_info)
-                print('\tchild.tag:', child.tag)
-            files_info.append(otherfindaid_info)
-        elif child.tag in {'bioghist', 'custodhist', 'head', 'p', 'note', 'list', 'item',
-                           'processinfo', 'lb', 'arrangement', 'scopecontent', 'separatedmaterial',
-                           'relatedmaterial'}:
-            pass
-            # subsubseries_info = parse_subseries(child, subseries_info)
-            # files_info.extend(subsubseries_info)
-        elif child.tag == 'c' and 'level' in child.attrib:
-            if debug > 0:
-                print(f"parse_subseries - skipping child with tag 'c' and attributes {child.attrib}")
-            pass
         else:
-            print('parse_subseries - subseries_info:', subseries_info)
-            print(f'unexpected subseries child {child.tag}')
-            print(f'\tchild.tag: {child.tag}\tattrib: {child.attrib}')
-            raise ValueError(f'unexpected subseries child {child.tag}')
+            subseries_context, other_info = parse_subseries_child(subseries_context, child,
+                                                                  tree_level=tree_level, debug=debug, plan=plan)
+            if other_info is not None:
+                files_info.append(other_info)
     # print(f'parse_subseries - len(files_info): {len(files_info)}')
     return files_info
 
 
-def parse_filegroup(filegroup, subseries_info, tree_level: int = 0, debug: int = 0):
-    filegroup_info = copy.deepcopy(subseries_info)
+@instrumentation.instrument
+def parse_filegroup_child(filegroup_context: ContextNode, child: ET.Element, tree_level: int = 0, debug: int = 0,
+                          plan: FieldPlan = None):
+    if plan is not None and plan.skips_component_child('filegroup', child.tag):
+        return filegroup_context, None
+    if child.tag == 'did':
+        did_info = parse_did(child, tree_level=tree_level+1)
+        filegroup_context = ContextNode(filegroup_context, 'filegroup', {
+            'title': did_info['unittitle'],
+            'id': did_info['unitid'][0]['unitid']
+        })
+        if tree_level <= 4 and debug > 0:
+            logger.debug(f"{'  ' * tree_level}parse_filegrp - tree_level {tree_level} "
+                  f"- filegrp title: {did_info['unittitle']}")
+    elif child.tag in {'odd', 'otherfindaid', 'scopecontent', 'phystech', 'altformavail'}:
+        filegroup_context = ContextNode(filegroup_context, 'other', parse_other(child, tree_level=tree_level+1))
+    elif child.tag == 'otherfindaid':
+        filegroup_context = ContextNode(filegroup_context, 'otherfindaid',
+                                        parse_otherfindaid(child, tree_level=tree_level+1))
+    elif child.tag in {'separatedmaterial', 'bioghist', 'bibliography', 'custodhist'}:
+        filegroup_context = ContextNode(filegroup_context, child.tag, child.text)
+    else:
+        if unexpected_elements is None:
+            logger.error(f'parse_filegroup - filegroup_info: {filegroup_context.to_dict()}')
+            logger.error(f'unexpected filegroup child {child.tag}')
+            logger.error(f'\tchild.tag: {child.tag}\tattrib: {child.attrib}')
+        report_unexpected('filegroup', child, f'unexpected filegroup child {child.tag}')
+    return filegroup_context, None
+
+
+@instrumentation.instrument
+def parse_filegroup(filegroup, subseries_context: ContextNode, tree_level: int = 0, debug: int = 0,
+                    plan: FieldPlan = None):
+    filegroup_context = new_component_context('filegroup', subseries_context)
     files_info = []
     for child in filegroup:
-        if child.tag == 'did':
-            did_info = parse_did(child, tree_level=tree_level+1)
-            filegroup_info['filegroup'] = {
-                'title': did_info['unittitle'],
-                'id': did_info['unitid'][0]['unitid']
-            }
-            if tree_level <= 4 and debug > 0:
-                print(f"{'  ' * tree_level}parse_filegrp - tree_level {tree_level} "
-                      f"- filegrp title: {did_info['unittitle']}")
-        elif child.tag == 'c' and child.attrib['level'] == 'file':
-            file_info = parse_file(child, filegroup_info, tree_level=tree_level+1)
+        kind = get_component_kind('filegroup', child)
+        if kind == 'file':
+            file_info = parse_file(child, filegroup_context, tree_level=tree_level+1, plan=plan)
             files_info.append(file_info)
-        elif child.tag == 'c' and child.attrib['level'] == 'otherlevel' and child.attrib['otherlevel'] == 'filegrp':
-            subfilegroup_info = parse_filegroup(child, filegroup_info, tree_level=tree_level+1)
+        elif kind == 'filegroup':
+            subfilegroup_info = parse_filegroup(child, filegroup_context, tree_level=tree_level+1, plan=plan)
             files_info.extend(subfilegroup_info)
             # raise ValueError(f'unexpected extra level of filegroup')
-        elif child.tag in {'odd', 'otherfindaid', 'scopecontent', 'phystech', 'altformavail'}:
-            filegroup_info['other'] = parse_other(child, tree_level=tree_level+1)
-        elif child.tag == 'otherfindaid':
-            filegroup_info['otherfindaid'] = parse_otherfindaid(child, tree_level=tree_level+1)
-        elif child.tag in {'separatedmaterial', 'bioghist', 'bibliography', 'custodhist'}:
-            filegroup_info[child.tag] = child.text
         else:
-            print('parse_filegroup - subseries_info:', subseries_info)
-            print('parse_filegroup - filegroup_info:', filegroup_info)
-            print(f'unexpected filegroup child {child.tag}')
-            print(f'\tchild.tag: {child.tag}\tattrib: {child.attrib}')
-            raise ValueError(f'unexpected filegroup child {child.tag}')
+            filegroup_context, _ = parse_filegroup_child(filegroup_context, child, tree_level=tree_level, debug=debug,
+                                                         plan=plan)
     return files_info
 
 
-def parse_file(file, subseries_info, tree_level: int = 0, debug: int = 0):
-    # print('file.attrib:', file.attrib)
-    file_info = {'file': {}}
-    # print('subseries_info:', subseries_info)
-    for field in subseries_info:
-        # print('field:', field)
-        if isinstance(field, dict):
-            print('parse_file - subseries_info is of type dict:', subseries_info)
-        if field in {'series', 'subseries', 'filegroup'}:
-            file_info[field] = copy.deepcopy(subseries_info[field])
-        #             file_info[field] = {
-        #                 'id': subseries_info[field]['id'],
-        #                 'title': subseries_info[field]['title']
-        #             }
-        else:
-            file_info[field] = copy.deepcopy(subseries_info[field])
+@instrumentation.instrument
+def parse_file(file, subseries_context: ContextNode, tree_level: int = 0, debug: int = 0,
+               plan: FieldPlan = None) -> FileRecord:
+    file_info = {}
     for child in file:
+        if plan is not None and child.tag in plan.skipped_file_tags:
+            continue
         if child.tag == 'did':
-            did_info = parse_did(child, tree_level=tree_level+1)
-            file_info['file']['title'] = did_info['unittitle']
+            did_info = parse_did(child, tree_level=tree_level+1, plan=plan)
+            file_info['title'] = did_info['unittitle']
             if tree_level <= 4 and debug > 0:
-                print(f"{'  ' * tree_level}parse_file - tree_level {tree_level} "
+                logger.debug(f"{'  ' * tree_level}parse_file - tree_level {tree_level} "
                       f"- file title: {did_info['unittitle']}")
-            file_info['file']['unitid'] = []
+            file_info['unitid'] = []
             # print('\tdid:', did_info)
             for unitid in did_info['unitid']:
-                file_info['file']['unitid'].append(unitid)
+                file_info['unitid'].append(unitid)
                 if 'type' in unitid and unitid['type'] == 'ABS':
-                    file_info['file']['id'] = unitid['unitid']
+                    file_info['id'] = unitid['unitid']
                 elif 'type' in unitid and unitid['type'] == 'handle':
-                    file_info['file']['handle'] = unitid['unitid']
+                    file_info['handle'] = unitid['unitid']
                 elif 'type' not in unitid and 'identifier' in unitid:
-                    file_info['file']['identifier'] = unitid['identifier']
-                    file_info['file']['identifier_text'] = unitid['unitid']
+                    file_info['identifier'] = unitid['identifier']
+                    file_info['identifier_text'] = unitid['unitid']
                 elif 'type' in unitid and unitid['type'] in {'handle', 'blank', 'obsolete'}:
                     continue
                 elif 'type' not in unitid:
-                    file_info['file']['extra_id'] = unitid['unitid']
+                    file_info['extra_id'] = unitid['unitid']
                 else:
-                    print('parse_file - cannot parse type of unitid dict')
-                    print('subseries_info:', subseries_info)
-                    print('file_info:', file_info)
-                    print('did_info:', did_info)
-                    print('unitid:', unitid)
+                    logger.error('parse_file - cannot parse type of unitid dict')
+                    logger.error(f'file_info: {file_info}')
+                    logger.error(f'did_info: {did_info}')
+                    logger.error(f'unitid: {unitid}')
                     raise KeyError('missing "type" in unitid')
             for field in did_info:
                 if field in {'unitid', 'unittitle'}:
                     continue
-                file_info['file'][field] = did_info[field]
+                file_info[field] = did_info[field]
         elif child.tag == 'c' and 'level' in child.attrib:
-            file_info['file']['level'] = child.attrib['level']
+            file_info['level'] = child.attrib['level']
         elif child.tag == 'c':
-            print('parse_file - unexpected child of file with tag "c"')
-            print('\tfile_info:', file_info)
-            print('\tfile child c:', child.attrib)
-            raise ValueError('unexpected child c of file')
+            if unexpected_elements is None:
+                logger.error('parse_file - unexpected child of file with tag "c"')
+                logger.error(f'\tfile_info: {file_info}')
+                logger.error(f'\tfile child c: {child.attrib}')
+            report_unexpected('file', child, 'unexpected child c of file')
         elif child.tag == 'controlaccess':
-            file_info['file']['access'] = parse_access(child, tree_level=tree_level+1)
+            file_info['access'] = parse_access(child, tree_level=tree_level+1)
     # print('file_info:', file_info)
-    return file_info
+    return FileRecord(subseries_context, file_info)
+
 
+# series_info as stored in the context of a series, where id is the list of parsed unitids
+def add_series_metrics(parser_metrics: instrumentation.ParserMetrics, series_info: Dict[str, any],
+                       seconds: float, num_files: int):
+    unitids = series_info.get('id') or []
+    unitid = unitids[0]['unitid'] if len(unitids) > 0 else None
+    parser_metrics.add_series(series_info.get('title'), unitid, seconds, num_files)
 
-def get_files_info(dsc: ET.Element):
+
+def get_file_records(dsc: ET.Element, plan: FieldPlan = None) -> List[Union[FileRecord, Dict[str, any]]]:
     files_info = []
     for series in get_series(dsc):
-        series_files_info = parse_series(series)
-        for series_file_info in series_files_info:
-            if isinstance(series_file_info, dict) is False:
-                print(f"get_files_info - series_file_info is not of type dict:", series_file_info)
-                print(f'\tseries.tag: {series.tag}\tattrib: {series.attrib}')
+        parser_metrics = instrumentation.metrics
+        if parser_metrics is None:
+            try:
+                files_info.extend(parse_series(series, plan=plan))
+            except EADParseError as err:
+                locate_parse_error(err, [dsc], series)
+                raise
+            continue
+        start = time.perf_counter()
+        try:
+            series_files_info = parse_series(series, plan=plan)
+        except EADParseError as err:
+            locate_parse_error(err, [dsc], series)
+            raise
+        seconds = time.perf_counter() - start
         files_info.extend(series_files_info)
+        num_files = 0
+        for elem in series.iter():
+            parser_metrics.add_element(elem.tag, elem.attrib.get('level'))
+            num_files += is_file_component(elem)
+        parser_metrics.add_series(series.findtext('did/unittitle'), series.findtext('did/unitid'), seconds, num_files)
     return files_info
 
 
+def get_files_info(dsc: ET.Element, fields: List[str] = None):
+    # with fields, only the children that contribute to the selected file and context fields are parsed
+    plan = compile_field_plan(fields)
+    files_info = materialize_files_info(get_file_records(dsc, plan=plan))
+    if plan is None:
+        return files_info
+    return [project_file_info(file_info, plan) for file_info in files_info]
+
+
+def new_component_context(kind: str, parent_context: Union[ContextNode, None]) -> Union[ContextNode, None]:
+    if kind == 'series':
+        return ContextNode(None, 'series', {})
+    elif kind == 'subseries':
+        return ContextNode(parent_context, 'subseries', None, append=True)
+    elif kind == 'filegroup':
+        return parent_context
+    return None
+
+
+def parse_component_child(kind: str, component_context: ContextNode, child: ET.Element,
+                          tree_level: int = 0, debug: int = 0, plan: FieldPlan = None):
+    if kind == 'series':
+        return parse_series_child(component_context, child, tree_level=tree_level, debug=debug, plan=plan)
+    elif kind == 'subseries':
+        return parse_subseries_child(component_context, child, tree_level=tree_level, debug=debug, plan=plan)
+    elif kind == 'filegroup':
+        return parse_filegroup_child(component_context, child, tree_level=tree_level, debug=debug, plan=plan)
+    return component_context, None
+
+
+def iter_parse_events(ead_file: sources.Source) -> Generator[Tuple[str, ET.Element], None, None]:
+    with sources.open_source(ead_file) as fh:
+        yield from ET.iterparse(fh, events=('start', 'end'))
+
+
+def is_file_component(component: ET.Element) -> bool:
+    return component.tag == 'c' and component.attrib.get('level') == 'file'
+
+
+def get_stack_path(stack: List[list]) -> List[ET.Element]:
+    # the open elements from the dsc down, as in the paths of get_file_records
+    elements = [entry[0] for entry in stack]
+    kinds = [entry[1] for entry in stack]
+    return elements[kinds.index('dsc'):] if 'dsc' in kinds else elements
+
+
+def iter_file_components(ead_file, structure: bool = True, debug: int = 0,
+                         plan: FieldPlan = None) -> Generator[Tuple[ET.Element, Union[FileRecord, None]], None, None]:
+    # Single incremental pass over the EAD that yields every c level="file" element in
+    # document order, paired with its FileRecord when it is one of the files that
+    # get_file_records(get_desc(read_ead_file(ead_file))) returns, and None otherwise
+    # (e.g. a file nested in a file, or in a skipped component). With structure=False the
+    # series/subseries/filegroup context is not parsed at all.
+    # Each open element is kept on a stack together with its component kind and context, and
+    # finished children of dsc and of series/subseries/filegroup components are removed from
+    # their parent, so only the current path stays in memory.
+    stack = []
+    dsc_seen = False
+    num_file_components = 0
+    open_file_components = 0
+    # instrumentation is checked once, the metrics only cost time when enabled
+    parser_metrics = instrumentation.metrics
+    series_start = None
+    # files nested in an open file are emitted after it, to keep document order
+    pending = []
+    for event, elem in iter_parse_events(ead_file):
+        if event == 'start':
+            kind, context, tree_level, file_index = None, None, 0, None
+            if len(stack) > 0:
+                parent, parent_kind, parent_context, parent_level, _ = stack[-1]
+                if parent_kind in {'dsc', 'series', 'subseries', 'filegroup'}:
+                    kind = get_component_kind(parent_kind, elem)
+                    tree_level = 0 if parent_kind == 'dsc' else parent_level + 1
+                    if structure:
+                        context = new_component_context(kind, parent_context)
+                elif dsc_seen is False and len(stack) == 2 and parent.tag == 'archdesc' and elem.tag == 'dsc':
+                    kind = 'dsc'
+                    dsc_seen = True
+            if is_file_component(elem):
+                file_index = num_file_components
+                num_file_components += 1
+                open_file_components += 1
+            if parser_metrics is not None and kind == 'series' and tree_level == 0:
+                series_start = (time.perf_counter(), num_file_components)
+            stack.append([elem, kind, context, tree_level, file_index])
+            continue
+        _, kind, context, tree_level, file_index = stack.pop()
+        if len(stack) == 0:
+            break
+        parent, parent_kind, parent_context, parent_level, _ = stack[-1]
+        if parser_metrics is not None and series_start is not None:
+            parser_metrics.add_element(elem.tag, elem.attrib.get('level'))
+            if kind == 'series' and parent_kind == 'dsc':
+                # without structure the series title and id are not parsed
+                series_info = context.to_dict(deep=False)['series'] if context is not None else {}
+                add_series_metrics(parser_metrics, series_info, time.perf_counter() - series_start[0],
+                                   num_file_components - series_start[1])
+                series_start = None
+        if file_index is not None:
+            file_record = None
+            if kind == 'file' and structure:
+                try:
+                    file_record = parse_file(elem, parent_context, tree_level=tree_level, plan=plan)
+                except EADParseError as err:
+                    locate_parse_error(err, get_stack_path(stack), elem)
+                    raise
+            pending.append((file_index, elem, file_record))
+            open_file_components -= 1
+            if open_file_components == 0:
+                pending.sort(key=lambda p: p[0])
+                for _, file_elem, pending_record in pending:
+                    yield file_elem, pending_record
+                pending = []
+        if parent_kind in {'series', 'subseries', 'filegroup'}:
+            if kind is None and structure:
+                try:
+                    stack[-1][2], _ = parse_component_child(parent_kind, parent_context, elem,
+                                                            tree_level=parent_level, debug=debug, plan=plan)
+                except EADParseError as err:
+                    locate_parse_error(err, get_stack_path(stack), elem)
+                    raise
+            parent.remove(elem)
+        elif parent_kind == 'dsc' or len(stack) <= 2:
+            parent.remove(elem)
+
+
+def iter_file_records(ead_file, debug: int = 0, plan: FieldPlan = None) -> Generator[FileRecord, None, None]:
+    for _, file_record in iter_file_components(ead_file, debug=debug, plan=plan):
+        if file_record is not None:
+            yield file_record
+
+
+def iter_files_info(ead_file, debug: int = 0, fields: List[str] = None) -> Generator[Dict[str, any], None, None]:
+    plan = compile_field_plan(fields)
+    for file_record in iter_file_records(ead_file, debug=debug, plan=plan):
+        yield file_record.to_dict() if plan is None else project_file_info(file_record.to_dict(), plan)
+
+
 def get_series_files(dsc: ET.Element):
-    files_info = get_files_info(dsc)
-    print(f"get_series_files -  number of files_info elements:", len(files_info))
+    files_info = get_file_records(dsc)
+    logger.debug(f"get_series_files -  number of files_info elements: {len(files_info)}")
     series_files = defaultdict(list)
     subseries_files = defaultdict(list)
     subsubseries_files = defaultdict(list)
 
-    for fi, file_info in enumerate(files_info):
-        try:
-            subseries_titles = get_subseries_titles(file_info)
-            #print(f"len(subseries_titles): {len(subseries_titles)}")
-            subsubseries_titles = get_subsubseries_titles(file_info)
-        except TypeError:
-            print('NO SUBSERIES TITLE:', fi, files_info[fi - 1])
-            raise
-        if 'file' not in file_info:
+    for fi, file_record in enumerate(files_info):
+        if isinstance(file_record, FileRecord) is False:
             continue
-        
+        # shallow view of the shared context, only the titles and ids are read
+        file_info = file_record.to_dict(deep=False)
+        subseries_titles = get_subseries_titles(file_info)
+        subsubseries_titles = get_subsubseries_titles(file_info)
+
         if 'id' in file_info['file']:
             if len(subseries_titles) > 0:
                 subseries_files[subseries_titles[0]].append(file_info['file']['id'])
@@ -554,8 +1040,8 @@ def get_series_files(dsc: ET.Element):
             try:
                 series_files[file_info['series']['title']].append(file_info['file']['id'])
             except TypeError:
-                print(f"get_series_files - fail to parse series in file_info")
-                print("\tfile_info['series']:", file_info['series'])
+                logger.error("get_series_files - fail to parse series in file_info")
+                logger.error(f"\tfile_info['series']: {file_info['series']}")
                 raise
         else:
             # print(file_info)
@@ -573,7 +1059,9 @@ def get_desc(root: ET.Element) -> Union[ET.Element, None]:
     return None
 
 
-def read_ead_file(ead_file: str) -> ET:
-    tree = ET.parse(ead_file)
+def read_ead_file(ead_file: sources.Source) -> ET:
+    # ead_file can be a path, a buffer or a binary file object, and may be compressed
+    with sources.open_source(ead_file) as fh:
+        tree = ET.parse(fh)
     root = tree.getroot()
     return root
@@ -1,58 +1,96 @@
-import json
-
-from lxml import etree
+import numpy as np
 import pandas as pd
 
+import archival_structures.ead_parser as ead_parser
+import archival_structures.sources as sources
+import archival_structures.writers as writers
+
+
+DATE_COLUMNS = ['inventory_number', 'title', 'handle', 'date_text', 'date_iso', 'year_begin', 'year_end']
+
+def get_date_record(c):
+    name = c.find("did/unitid[@type='ABS']")
+    title = c.find("did/unittitle")
+    handle = c.find("did/unitid[@type='handle']")
+    date = c.find("did/unitdate")
+    date_alt = c.find("did/unittitle/unitdate")
+
+    if date is not None:
+        date_text = date.text
+        date_iso = date.attrib.get("normal", "")
+    elif date_alt is not None:
+        date_text = date_alt.text
+        date_iso = date_alt.attrib.get("normal", "")
+    else:
+        date_text = ""
+        date_iso = ""
+
+    if name is None or handle is None:
+        return None
+
+    year_begin, year_end = get_begin_end_year(date_iso)
+
+    return {
+        "inventory_number": name.text,
+        "title": title.text.strip(),
+        "handle": handle.text,
+        "date_text": date_text,
+        "date_iso": date_iso,
+        "year_begin": year_begin,
+        "year_end": year_end,
+    }
 
-def extract_dates(input_file: str, output_base_name: str):
-    data = []
-    data_json = dict()
 
-    tree = etree.parse(input_file)
+class DateRecords:
 
+    def __init__(self):
+        self.records = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def add_file_component(self, c, file_record=None):
+        d = get_date_record(c)
+        if d is not None:
+            self.records.append(d)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.records, columns=DATE_COLUMNS)
+
+
+def iter_date_records(input_file: sources.Source):
     # Find all inventory numbers in the EAD
     # <c level="file">
-    inventory_elements = tree.xpath("//c[@level='file']")
-
-    for c in inventory_elements:
-        name = c.find("did/unitid[@type='ABS']")
-        title = c.find("did/unittitle")
-        handle = c.find("did/unitid[@type='handle']")
-        date = c.find("did/unitdate")
-        date_alt = c.find("did/unittitle/unitdate")
-
-        if date is not None:
-            date_text = date.text
-            date_iso = date.attrib.get("normal", "")
-        elif date_alt is not None:
-            date_text = date_alt.text
-            date_iso = date_alt.attrib.get("normal", "")
-        else:
-            date_text = ""
-            date_iso = ""
-
-        if name is not None and handle is not None:
-            # print(name.text, handle.text, date_text, date_iso)
-
-            year_begin, year_end = get_begin_end_year(date_iso)
-
-            d = {
-                "inventory_number": name.text,
-                "title": title.text.strip(),
-                "handle": handle.text,
-                "date_text": date_text,
-                "date_iso": date_iso,
-                "year_begin": year_begin,
-                "year_end": year_end,
-            }
-
-            data.append(d)
-            data_json[name.text] = d
-
-    df = pd.DataFrame(data)
-    df.to_csv(f"{output_base_name}.csv", sep="\t", header=True, index=False)
-    with open(f"{output_base_name}.json", "w") as f:
-        json.dump(data_json, f, indent=4)
+    for c, _ in ead_parser.iter_file_components(input_file, structure=False):
+        d = get_date_record(c)
+        if d is not None:
+            yield d
+
+
+def get_dates_info(input_file: sources.Source) -> pd.DataFrame:
+    # an EAD without date records still gives a frame with all columns
+    return pd.DataFrame(list(iter_date_records(input_file)), columns=DATE_COLUMNS)
+
+
+def extract_dates(input_file: sources.Source, output_base_name: str, json_format: str = 'json',
+                  compression: str = None, background: bool = False):
+    # Records are written while the EAD is parsed, so memory use does not grow with the number
+    # of files. json_format 'jsonl' writes one record per line instead of a single object
+    # keyed by inventory number, compression is a suffix such as '.gz'.
+    suffix = compression or ''
+    tsv_writer = writers.TSVWriter(f"{output_base_name}.csv{suffix}", background=background)
+    if json_format == 'json':
+        json_writer = writers.JSONObjectWriter(f"{output_base_name}.json{suffix}", "inventory_number",
+                                               background=background)
+    elif json_format == 'jsonl':
+        json_writer = writers.JSONLinesWriter(f"{output_base_name}.jsonl{suffix}", background=background)
+    else:
+        raise ValueError(f"unknown json_format '{json_format}', must be 'json' or 'jsonl'")
+
+    with tsv_writer, json_writer:
+        for d in iter_date_records(input_file):
+            tsv_writer.write_record(d)
+            json_writer.write_record(d)
 
 
 def get_begin_end_year(date):
@@ -70,6 +108,138 @@ def get_begin_end_year(date):
         return "", ""
 
 
+# ISO 8601 style normal attributes: a date (YYYY, YYYY-MM, YYYY-MM-DD, or without dashes) or
+# an interval of two such dates separated by a slash, where '..' or an empty side is open
+NORMAL_DATE_PATTERN = (r"^\s*(?:(?P<begin_year>\d{4})(?:-?(?P<begin_month>\d{2})(?:-?(?P<begin_day>\d{2}))?)?"
+                       r"|(?P<begin_open>\.\.))?\s*"
+                       r"(?:(?P<slash>/)\s*(?:(?P<end_year>\d{4})(?:-?(?P<end_month>\d{2})(?:-?(?P<end_day>\d{2}))?)?"
+                       r"|(?P<end_open>\.\.))?)?\s*$")
+TEXT_YEAR_PATTERN = r"(?<!\d)(\d{4})(?!\d)"
+
+
+def days_from_civil(year: np.ndarray, month: np.ndarray, day: np.ndarray) -> np.ndarray:
+    # days since 1970-01-01 in the proleptic Gregorian calendar, for integer arrays
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def days_in_month(year: np.ndarray, month: np.ndarray) -> np.ndarray:
+    leap = ((year % 4 == 0) & (year % 100 != 0)) | (year % 400 == 0)
+    month_days = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    return month_days[np.clip(month, 1, 12) - 1] + ((month == 2) & leap)
+
+
+def get_date_bounds(year: pd.Series, month: pd.Series, day: pd.Series, end: bool) -> pd.arrays.IntegerArray:
+    # first (or with end=True last) day of a possibly partial date, null when the date is
+    # missing or does not exist
+    year_known = year.notna().to_numpy()
+    year = year.fillna(1970).to_numpy(dtype=np.int64)
+    month = month.fillna(12 if end else 1).to_numpy(dtype=np.int64)
+    max_day = days_in_month(year, month)
+    day_known = day.notna().to_numpy()
+    day = np.where(day_known, day.fillna(1).to_numpy(dtype=np.int64), max_day if end else 1)
+    valid = year_known & (month >= 1) & (month <= 12) & (day >= 1) & (day <= max_day)
+    days = days_from_civil(year, month, day)
+    return pd.arrays.IntegerArray(np.where(valid, days, 0), ~valid)
+
+
+def take_unique_rows(unique_rows: pd.DataFrame, codes: np.ndarray) -> pd.DataFrame:
+    # broadcast rows computed per unique value back to the original rows, code -1
+    # (a missing value) gives null dates that are not open
+    rows = pd.DataFrame(index=pd.RangeIndex(len(codes)))
+    for column in unique_rows.columns:
+        fill_value = False if column in {'open_begin', 'open_end'} else None
+        rows[column] = pd.api.extensions.take(unique_rows[column].array, codes, allow_fill=True,
+                                              fill_value=fill_value)
+    return rows
+
+
+def normalize_normal_values(normal: pd.Series) -> pd.DataFrame:
+    parts = normal.astype(object).str.extract(NORMAL_DATE_PATTERN)
+    matched = parts['begin_year'].notna() | parts['end_year'].notna()
+    has_slash = parts['slash'].notna()
+    for field in ['year', 'month', 'day']:
+        parts[f'begin_{field}'] = pd.to_numeric(parts[f'begin_{field}']).astype('Int64')
+        # a single date ends where it begins, at the same precision
+        end_field = pd.to_numeric(parts[f'end_{field}']).astype('Int64')
+        parts[f'end_{field}'] = end_field.where(has_slash, parts[f'begin_{field}'])
+
+    dates = pd.DataFrame(index=normal.index)
+    dates['year_begin'] = parts['begin_year']
+    dates['year_end'] = parts['end_year']
+    dates['day_begin'] = get_date_bounds(parts['begin_year'], parts['begin_month'], parts['begin_day'], end=False)
+    dates['day_end'] = get_date_bounds(parts['end_year'], parts['end_month'], parts['end_day'], end=True)
+    dates['open_begin'] = (matched & has_slash & parts['begin_year'].isna()).astype(bool)
+    dates['open_end'] = (matched & has_slash & parts['end_year'].isna()).astype(bool)
+    return dates
+
+
+def normalize_text_values(text: pd.Series) -> pd.DataFrame:
+    text_years = text.astype(object).str.extractall(TEXT_YEAR_PATTERN)[0].astype(np.int64)
+    text_years = text_years.groupby(level=0).agg(['min', 'max']).reindex(text.index)
+    no_month = pd.Series(pd.NA, index=text.index, dtype='Int64')
+    dates = pd.DataFrame(index=text.index)
+    dates['year_begin'] = text_years['min'].astype('Int64')
+    dates['year_end'] = text_years['max'].astype('Int64')
+    dates['day_begin'] = get_date_bounds(dates['year_begin'], no_month, no_month, end=False)
+    dates['day_end'] = get_date_bounds(dates['year_end'], no_month, no_month, end=True)
+    dates['open_begin'] = False
+    dates['open_end'] = False
+    return dates
+
+
+def normalize_dates(normal: pd.Series, text: pd.Series = None) -> pd.DataFrame:
+    # Vectorized parse of unitdate normal attributes into integer year and day columns
+    # (days since 1970-01-01, so they can be viewed as datetime64[D]). When a normal value
+    # is missing or unparseable and the unitdate text is given, the first and last
+    # four-digit years in the text are used instead.
+    # Date values repeat a lot within an archive, so each distinct value is parsed once.
+    normal = pd.Series(normal, dtype=object).reset_index(drop=True)
+    codes, uniques = pd.factorize(normal)
+    dates = take_unique_rows(normalize_normal_values(pd.Series(uniques, dtype=object)), codes)
+
+    if text is not None:
+        text = pd.Series(text, dtype=object).reset_index(drop=True)
+        unmatched = (dates['year_begin'].isna() & dates['year_end'].isna()).to_numpy()
+        codes, uniques = pd.factorize(text.where(unmatched))
+        text_dates = take_unique_rows(normalize_text_values(pd.Series(uniques, dtype=object)), codes)
+        for column in dates.columns:
+            dates[column] = dates[column].where(~unmatched, text_dates[column])
+    return dates
+
+
+def overlaps_year_range(dates: pd.DataFrame, year_begin: int = None, year_end: int = None) -> pd.Series:
+    # open interval sides overlap everything in their direction, missing dates never match
+    begin = np.where(dates['open_begin'], -np.inf, dates['year_begin'].to_numpy(dtype=float, na_value=np.nan))
+    end = np.where(dates['open_end'], np.inf, dates['year_end'].to_numpy(dtype=float, na_value=np.nan))
+    mask = ~np.isnan(begin) & ~np.isnan(end)
+    if year_end is not None:
+        mask &= begin <= year_end
+    if year_begin is not None:
+        mask &= end >= year_begin
+    return pd.Series(mask, index=dates.index)
+
+
+def count_per_year(dates: pd.DataFrame) -> pd.Series:
+    # number of rows whose (closed) year range covers each year, via a difference array
+    closed = dates['year_begin'].notna() & dates['year_end'].notna()
+    begin = dates.loc[closed, 'year_begin'].to_numpy(dtype=np.int64)
+    end = dates.loc[closed, 'year_end'].to_numpy(dtype=np.int64)
+    begin, end = np.minimum(begin, end), np.maximum(begin, end)
+    if len(begin) == 0:
+        return pd.Series([], dtype=np.int64, name='count')
+    first_year = begin.min()
+    diff = np.zeros(end.max() - first_year + 2, dtype=np.int64)
+    np.add.at(diff, begin - first_year, 1)
+    np.add.at(diff, end - first_year + 1, -1)
+    counts = np.cumsum(diff)[:-1]
+    return pd.Series(counts, index=pd.RangeIndex(first_year, end.max() + 1, name='year'), name='count')
+
+
 if __name__ == "__main__":
     ead_file = "../metadata/EAD/1.04.02.xml"
     ead_output_base = '../metadata/inv_dates-1.04.02'
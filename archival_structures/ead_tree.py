@@ -0,0 +1,228 @@
+import xml.etree.ElementTree as ET
+from typing import Dict, Generator, List, Union
+
+import archival_structures.ead_parser as ead_parser
+
+
+class EADNode:
+    # Lazy view of a component of the dsc. The did is only parsed when one of its
+    # fields is accessed, and children are only enumerated when they are iterated,
+    # so exploring a few series of a large archive does not parse the rest of it.
+    kind = None
+    __slots__ = ('element', 'parent', 'did_info', 'child_contexts')
+
+    def __init__(self, element: ET.Element, parent: Union['EADNode', None] = None):
+        self.element = element
+        self.parent = parent
+        self.did_info = None
+        self.child_contexts = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(unitid={self.unitid!r}, title={self.title!r})"
+
+    @property
+    def did(self) -> Dict[str, any]:
+        if self.did_info is None:
+            did = self.element.find('did')
+            self.did_info = ead_parser.parse_did(did) if did is not None else {}
+        return self.did_info
+
+    @property
+    def title(self) -> Union[str, None]:
+        return self.did.get('unittitle')
+
+    @property
+    def unitid(self) -> Union[str, None]:
+        unitids = self.did.get('unitid') or []
+        return unitids[0]['unitid'] if len(unitids) > 0 else None
+
+    @property
+    def unitdate(self) -> Union[str, None]:
+        unitdate = self.did.get('unitdate')
+        return unitdate['date'] if unitdate is not None else None
+
+    @property
+    def depth(self) -> int:
+        return 0 if self.parent is None else self.parent.depth + 1
+
+    @property
+    def ancestors(self) -> List['EADNode']:
+        nodes = []
+        node = self.parent
+        while node is not None and node.kind != 'dsc':
+            nodes.append(node)
+            node = node.parent
+        return nodes[::-1]
+
+    @property
+    def path(self) -> List[str]:
+        return [node.title for node in self.ancestors + [self]]
+
+    def __iter__(self) -> Generator['EADNode', None, None]:
+        for child in self.element:
+            kind = ead_parser.get_component_kind(self.kind, child)
+            if kind is not None:
+                yield NODE_CLASSES[kind](child, parent=self)
+
+    @property
+    def children(self) -> List['EADNode']:
+        return list(self)
+
+    def iter_children(self, kind: str) -> Generator['EADNode', None, None]:
+        return (child for child in self if child.kind == kind)
+
+    @property
+    def series(self) -> List['Series']:
+        return list(self.iter_children('series'))
+
+    @property
+    def subseries(self) -> List['Subseries']:
+        return list(self.iter_children('subseries'))
+
+    @property
+    def filegroups(self) -> List['FileGroup']:
+        return list(self.iter_children('filegroup'))
+
+    @property
+    def files(self) -> List['File']:
+        return list(self.iter_children('file'))
+
+    def walk(self) -> Generator['EADNode', None, None]:
+        # all descendants in document order
+        for child in self:
+            yield child
+            yield from child.walk()
+
+    def iter_files(self) -> Generator['File', None, None]:
+        for node in self.walk():
+            if node.kind == 'file':
+                yield node
+
+    def find(self, title: str = None, unitid: str = None, kind: str = None) -> Union['EADNode', None]:
+        for node in self.find_all(title=title, unitid=unitid, kind=kind):
+            return node
+        return None
+
+    def find_all(self, title: str = None, unitid: str = None, kind: str = None) -> Generator['EADNode', None, None]:
+        for node in self.walk():
+            if kind is not None and node.kind != kind:
+                continue
+            if title is not None and node.title != title:
+                continue
+            if unitid is not None and node.unitid != unitid:
+                continue
+            yield node
+
+    def get_child_context(self, child: ET.Element) -> Union[ead_parser.ContextNode, None]:
+        # the parser context a child component starts from: the context of this node
+        # updated with the did, odd, etc. elements that precede the child. The contexts
+        # of all children are computed together the first time one is needed.
+        if self.child_contexts is None:
+            if self.kind == 'series':
+                context = ead_parser.new_component_context(self.kind, None)
+            else:
+                context = ead_parser.new_component_context(self.kind, self.parent.get_child_context(self.element))
+            self.child_contexts = {}
+            for elem in self.element:
+                if ead_parser.get_component_kind(self.kind, elem) is None:
+                    context, _ = ead_parser.parse_component_child(self.kind, context, elem)
+                else:
+                    self.child_contexts[elem] = context
+        return self.child_contexts[child]
+
+
+class Archive(EADNode):
+    kind = 'dsc'
+    __slots__ = ('root',)
+
+    def __init__(self, root: ET.Element):
+        self.root = root
+        dsc = ead_parser.get_desc(root)
+        if dsc is None:
+            raise ValueError('EAD has no archdesc/dsc element')
+        super().__init__(dsc)
+
+    @property
+    def did(self) -> Dict[str, any]:
+        if self.did_info is None:
+            did = self.root.find('archdesc/did')
+            self.did_info = ead_parser.parse_did(did) if did is not None else {}
+        return self.did_info
+
+    @property
+    def path(self) -> List[str]:
+        return []
+
+
+class Series(EADNode):
+    kind = 'series'
+    __slots__ = ()
+
+
+class Subseries(EADNode):
+    kind = 'subseries'
+    __slots__ = ()
+
+
+class FileGroup(EADNode):
+    kind = 'filegroup'
+    __slots__ = ()
+
+
+class File(EADNode):
+    kind = 'file'
+    __slots__ = ('file_record',)
+
+    def __init__(self, element: ET.Element, parent: Union[EADNode, None] = None):
+        super().__init__(element, parent=parent)
+        self.file_record = None
+
+    def __iter__(self):
+        # items and other components within a file are not part of the hierarchy
+        return iter(())
+
+    @property
+    def record(self) -> ead_parser.FileRecord:
+        # the same FileRecord that get_file_records returns for this file,
+        # only the ancestors of the file are parsed to build its context
+        if self.file_record is None:
+            context = self.parent.get_child_context(self.element)
+            self.file_record = ead_parser.parse_file(self.element, context)
+        return self.file_record
+
+    @property
+    def info(self) -> Dict[str, any]:
+        return self.record.file
+
+    @property
+    def inventory_num(self) -> Union[str, None]:
+        # the first numeric unitid, as in the inventory frame, which need not be the ABS one
+        unit = ead_parser.get_inv_num_unit(self.info) if 'unitid' in self.info else None
+        return unit['unitid'] if unit is not None else None
+
+    @property
+    def handle(self) -> Union[str, None]:
+        return self.info.get('handle')
+
+    @property
+    def mets_file(self) -> Union[str, None]:
+        dao = self.info.get('dao')
+        if dao is not None and dao.get('role') == 'METS':
+            return dao.get('href')
+        return None
+
+    def to_dict(self, deep: bool = True) -> Dict[str, any]:
+        return self.record.to_dict(deep=deep)
+
+
+NODE_CLASSES = {
+    'series': Series,
+    'subseries': Subseries,
+    'filegroup': FileGroup,
+    'file': File
+}
+
+
+def open_archive(ead_file: Union[str, ET.Element]) -> Archive:
+    root = ead_file if isinstance(ead_file, ET.Element) else ead_parser.read_ead_file(ead_file)
+    return Archive(root)
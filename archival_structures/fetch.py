@@ -0,0 +1,225 @@
+import argparse
+import http.client
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Generator, Iterable, List, Tuple, Union
+
+
+EAD_URL_TEMPLATE = 'https://www.nationaalarchief.nl/onderzoeken/archief/{archive_id}/download/xml'
+EAD_FILE_TEMPLATE = 'ead-{archive_id}.xml'
+USER_AGENT = 'archival-structures'
+CHUNK_SIZE = 1024 ** 2
+# server errors and rate limiting are retried, other HTTP errors are final
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def get_meta_file(output_file: str) -> str:
+    return f"{output_file}.meta.json"
+
+
+def get_part_file(output_file: str) -> str:
+    return f"{output_file}.part"
+
+
+def read_meta(meta_file: str) -> Dict[str, any]:
+    if not os.path.exists(meta_file):
+        return {}
+    with open(meta_file, 'rt') as fh:
+        return json.load(fh)
+
+
+def write_meta(meta: Dict[str, any], meta_file: str):
+    tmp_file = f"{meta_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wt') as fh:
+        json.dump(meta, fh)
+    os.replace(tmp_file, meta_file)
+
+
+def get_validators(headers) -> Dict[str, str]:
+    return {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+
+
+def get_expected_size(response) -> Union[int, None]:
+    # size of the complete file, from Content-Range (bytes start-end/size) or Content-Length
+    content_range = response.headers.get('Content-Range')
+    if content_range is not None and '/' in content_range and content_range.split('/')[1].isdigit():
+        return int(content_range.split('/')[1])
+    content_length = response.headers.get('Content-Length')
+    if response.status == 200 and content_length is not None and content_length.isdigit():
+        return int(content_length)
+    return None
+
+
+def get_request_headers(output_file: str) -> Dict[str, str]:
+    # a complete earlier download makes the request conditional, a partial one makes it a
+    # range request that only succeeds if the remote file did not change in the meantime
+    headers = {'User-Agent': USER_AGENT}
+    part_file = get_part_file(output_file)
+    part_meta = read_meta(get_meta_file(part_file))
+    if os.path.exists(part_file) and os.path.getsize(part_file) > 0 and \
+            (part_meta.get('etag') or part_meta.get('last_modified')):
+        headers['Range'] = f"bytes={os.path.getsize(part_file)}-"
+        headers['If-Range'] = part_meta.get('etag') or part_meta.get('last_modified')
+    elif os.path.exists(output_file):
+        meta = read_meta(get_meta_file(output_file))
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    return headers
+
+
+def download(url: str, output_file: str, timeout: float = 60, chunk_size: int = CHUNK_SIZE,
+             on_chunk: Callable[[int], None] = None) -> Tuple[str, int]:
+    # on_chunk is called with the size of every chunk as it is written, also when the attempt fails later
+    part_file = get_part_file(output_file)
+    request = urllib.request.Request(url, headers=get_request_headers(output_file))
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as err:
+        if err.code == 304:
+            return 'not_modified', 0
+        if err.code == 416:
+            # the partial download is no longer valid, start over on the next attempt
+            remove_files([part_file, get_meta_file(part_file)])
+        raise
+    with response:
+        validators = get_validators(response.headers)
+        # a 200 response to a range request means the server sends the whole file again
+        mode = 'ab' if response.status == 206 else 'wb'
+        if mode == 'wb':
+            write_meta({'url': url, **validators}, get_meta_file(part_file))
+        num_bytes = 0
+        with open(part_file, mode) as fh:
+            for chunk in iter(lambda: response.read(chunk_size), b''):
+                fh.write(chunk)
+                num_bytes += len(chunk)
+                if on_chunk is not None:
+                    on_chunk(len(chunk))
+        # reading in chunks does not raise on a connection that closes early
+        expected_size = get_expected_size(response)
+        if expected_size is not None and os.path.getsize(part_file) < expected_size:
+            raise http.client.IncompleteRead(b'', expected_size - os.path.getsize(part_file))
+    part_meta = read_meta(get_meta_file(part_file))
+    os.replace(part_file, output_file)
+    write_meta({**part_meta, 'url': url, 'size': os.path.getsize(output_file),
+                'fetched': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}, get_meta_file(output_file))
+    remove_files([get_meta_file(part_file)])
+    return 'downloaded', num_bytes
+
+
+def remove_files(files: List[str]):
+    for file in files:
+        if os.path.exists(file):
+            os.remove(file)
+
+
+def fetch_url(url: str, output_file: str, retries: int = 3, backoff: float = 1.0, timeout: float = 60,
+              chunk_size: int = CHUNK_SIZE) -> Dict[str, any]:
+    # Download url to output_file, unless the local copy is still current. Failed attempts
+    # keep the data received so far in a .part file, which the next attempt resumes. The
+    # bytes of the result are those received over all attempts.
+    output_dir = os.path.dirname(output_file)
+    if output_dir != '':
+        os.makedirs(output_dir, exist_ok=True)
+    result = {'url': url, 'output_file': output_file, 'status': None, 'bytes': 0, 'attempts': 0, 'error': None}
+
+    def add_bytes(num_bytes: int):
+        result['bytes'] += num_bytes
+
+    for attempt in range(retries + 1):
+        result['attempts'] = attempt + 1
+        try:
+            result['status'], _ = download(url, output_file, timeout=timeout, chunk_size=chunk_size,
+                                           on_chunk=add_bytes)
+            result['error'] = None
+            return result
+        except urllib.error.HTTPError as err:
+            result['error'] = f"HTTP {err.code}: {err.reason}"
+            if err.code not in RETRY_STATUS_CODES and err.code != 416:
+                break
+        except (urllib.error.URLError, http.client.HTTPException, OSError) as err:
+            result['error'] = f"{type(err).__name__}: {err}"
+        if attempt < retries:
+            time.sleep(backoff * 2 ** attempt)
+    result['status'] = 'failed'
+    return result
+
+
+def iter_fetch(downloads: Iterable[Tuple[str, str]], max_workers: int = 4,
+               **kwargs) -> Generator[Dict[str, any], None, None]:
+    # Fetches (url, output_file) pairs with at most max_workers concurrent downloads and yields
+    # the result of each as soon as it is done, so it can be parsed while the rest downloads.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fetch_url, url, output_file, **kwargs) for url, output_file in downloads]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def fetch_all(downloads: Iterable[Tuple[str, str]], max_workers: int = 4,
+              on_complete: Callable[[Dict[str, any]], None] = None, **kwargs) -> List[Dict[str, any]]:
+    results = []
+    for result in iter_fetch(downloads, max_workers=max_workers, **kwargs):
+        if on_complete is not None:
+            on_complete(result)
+        results.append(result)
+    return results
+
+
+def get_ead_downloads(archive_ids: Iterable[str], output_dir: str, url_template: str = EAD_URL_TEMPLATE,
+                      file_template: str = EAD_FILE_TEMPLATE) -> List[Tuple[str, str]]:
+    return [(url_template.format(archive_id=archive_id),
+             os.path.join(output_dir, file_template.format(archive_id=archive_id)))
+            for archive_id in archive_ids]
+
+
+def fetch_ead_files(archive_ids: Iterable[str], output_dir: str, url_template: str = EAD_URL_TEMPLATE,
+                    max_workers: int = 4, on_complete: Callable[[Dict[str, any]], None] = None,
+                    **kwargs) -> List[Dict[str, any]]:
+    downloads = get_ead_downloads(archive_ids, output_dir, url_template=url_template)
+    return fetch_all(downloads, max_workers=max_workers, on_complete=on_complete, **kwargs)
+
+
+def main():
+    # the parser modules are only needed to parse what was fetched
+    import archival_structures.batch as batch
+
+    parser = argparse.ArgumentParser(description='Download EAD files of the Nationaal Archief concurrently')
+    parser.add_argument('archive_ids', nargs='+', help='archive ids, e.g. 1.04.02')
+    parser.add_argument('--output-dir', default='.', help='directory for the EAD files')
+    parser.add_argument('--url-template', default=EAD_URL_TEMPLATE,
+                        help='download URL with an {archive_id} placeholder')
+    parser.add_argument('--workers', type=int, default=4, help='maximum number of concurrent downloads')
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--inventory-file', default=None,
+                        help='parse every downloaded EAD and write the inventories to this tab-separated file')
+    args = parser.parse_args()
+
+    state = {'write_header': True, 'failed': 0}
+
+    def on_complete(result: Dict[str, any]):
+        print(f"{result['status']:<13} {result['url']} {result['error'] or ''}", file=sys.stderr)
+        if result['status'] == 'failed':
+            state['failed'] += 1
+            return
+        if args.inventory_file is not None:
+            ead_file, archive_id, df, error, _ = batch.process_ead_file(result['output_file'])
+            if error is not None:
+                print(f"failed to parse {ead_file}:\n{error}", file=sys.stderr)
+                state['failed'] += 1
+                return
+            batch.append_frame(df, args.inventory_file, state['write_header'])
+            state['write_header'] = False
+
+    fetch_ead_files(args.archive_ids, args.output_dir, url_template=args.url_template, max_workers=args.workers,
+                    on_complete=on_complete, retries=args.retries)
+    return 1 if state['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
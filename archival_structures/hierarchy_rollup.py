@@ -0,0 +1,102 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+COUNT_COLUMN = 'count'
+
+
+def get_hierarchy_path(values: Tuple) -> Tuple:
+    # the path ends at the first missing level, e.g. a file directly under a series
+    # has no subseries_1 and is counted under the series itself
+    path = []
+    for value in values:
+        if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NA:
+            break
+        path.append(value)
+    return tuple(path)
+
+
+class HierarchyRollup:
+    # Counts and sums for every node of the series/subseries hierarchy. Leaf aggregates are
+    # computed once per update and added to every ancestor, so the totals of any node are
+    # a dictionary lookup. A node is identified by its path of titles from the series down.
+
+    def __init__(self, path_cols: List[str], value_cols: List[str] = None):
+        self.path_cols = list(path_cols)
+        self.value_cols = list(value_cols) if value_cols is not None else []
+        self.columns = [COUNT_COLUMN] + self.value_cols
+        self.totals: Dict[Tuple, np.ndarray] = {}
+        self.children: Dict[Tuple, set] = defaultdict(set)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, path_cols: List[str], value_cols: List[str] = None,
+                   count_col: str = None) -> 'HierarchyRollup':
+        rollup = cls(path_cols, value_cols=value_cols)
+        rollup.update(df, count_col=count_col)
+        return rollup
+
+    def add(self, path: Tuple, values: np.ndarray):
+        path = tuple(path)
+        for depth in range(len(path) + 1):
+            prefix = path[:depth]
+            if prefix in self.totals:
+                self.totals[prefix] += values
+            else:
+                self.totals[prefix] = values.astype(float)
+            if depth > 0:
+                self.children[path[:depth - 1]].add(prefix)
+
+    def update(self, df: pd.DataFrame, count_col: str = None):
+        # rows are counted one each, unless count_col holds pre-aggregated counts
+        # (e.g. the scans column of scan_stats.join_scan_stats)
+        if any(col in df.index.names for col in self.path_cols):
+            df = df.reset_index()
+        counts = df[count_col] if count_col is not None else pd.Series(1, index=df.index)
+        leaves = df[self.path_cols + self.value_cols].assign(**{COUNT_COLUMN: counts})
+        leaves = leaves.groupby(self.path_cols, dropna=False, sort=False, observed=True)[self.columns].sum()
+        for key, values in zip(leaves.index, leaves.to_numpy(dtype=float)):
+            key = key if isinstance(key, tuple) else (key,)
+            self.add(get_hierarchy_path(key), values)
+
+    def get_totals(self, path: Tuple = ()) -> Dict[str, float]:
+        values = self.totals.get(tuple(path))
+        if values is None:
+            return {column: 0 for column in self.columns}
+        return dict(zip(self.columns, values.tolist()))
+
+    def get_mean(self, path: Tuple, value_col: str) -> Union[float, None]:
+        totals = self.get_totals(path)
+        if totals[COUNT_COLUMN] == 0:
+            return None
+        return totals[value_col] / totals[COUNT_COLUMN]
+
+    def get_children(self, path: Tuple = ()) -> List[Tuple]:
+        return sorted(self.children.get(tuple(path), []), key=str)
+
+    def get_subtree(self, path: Tuple = ()) -> pd.DataFrame:
+        nodes = []
+        stack = [tuple(path)]
+        while stack:
+            node = stack.pop()
+            if node not in self.totals:
+                continue
+            nodes.append(node)
+            stack.extend(self.children.get(node, []))
+        return self.to_frame(nodes)
+
+    def get_level(self, depth: int) -> pd.DataFrame:
+        return self.to_frame([node for node in self.totals if len(node) == depth])
+
+    def to_frame(self, nodes: List[Tuple] = None) -> pd.DataFrame:
+        # one row per node with its path padded to the path columns, ready for
+        # sunburst/treemap plots
+        if nodes is None:
+            nodes = list(self.totals)
+        nodes = [node for node in nodes if len(node) > 0]
+        rows = [list(node) + [None] * (len(self.path_cols) - len(node)) + list(self.totals[node]) for node in nodes]
+        df = pd.DataFrame(rows, columns=self.path_cols + self.columns)
+        df.insert(len(self.path_cols), 'depth', [len(node) for node in nodes])
+        return df
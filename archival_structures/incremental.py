@@ -0,0 +1,244 @@
+import hashlib
+import os
+import pickle
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from typing import Dict, List, Tuple, Union
+
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+
+
+STATE_VERSION = 1
+CONTAINER_KINDS = {'series', 'subseries', 'filegroup'}
+NODE_COLUMN = 'node'
+
+
+def hash_element(elem: ET.Element) -> bytes:
+    element_hash = hashlib.blake2b(digest_size=16)
+    update_element_hash(element_hash, elem)
+    return element_hash.digest()
+
+
+def update_element_hash(element_hash, elem: ET.Element):
+    element_hash.update(elem.tag.encode('utf-8'))
+    for name, value in sorted(elem.attrib.items()):
+        element_hash.update(f"\x00{name}={value}".encode('utf-8'))
+    element_hash.update(f"\x01{elem.text or ''}".encode('utf-8'))
+    for child in elem:
+        element_hash.update(b'\x02')
+        update_element_hash(element_hash, child)
+        element_hash.update(f"\x03{child.tail or ''}".encode('utf-8'))
+
+
+def fingerprint_component(component: ET.Element, kind: str,
+                          fingerprints: Dict[ET.Element, Tuple[str, str]]) -> bytes:
+    # Merkle hash of a series/subseries/filegroup subtree, plus a hash of its 'head': the
+    # non-component children (did, odd, ...) that determine the context of its descendants,
+    # together with the number of components that precede each of them.
+    subtree_hash = hashlib.blake2b(digest_size=16)
+    head_hash = hashlib.blake2b(digest_size=16)
+    subtree_hash.update(component.tag.encode('utf-8'))
+    for name, value in sorted(component.attrib.items()):
+        subtree_hash.update(f"\x00{name}={value}".encode('utf-8'))
+    num_components = 0
+    for child in component:
+        child_kind = ead_parser.get_component_kind(kind, child)
+        if child_kind in CONTAINER_KINDS:
+            digest = fingerprint_component(child, child_kind, fingerprints)
+            num_components += 1
+        else:
+            digest = hash_element(child)
+            if child_kind == 'file':
+                num_components += 1
+            else:
+                head_hash.update(num_components.to_bytes(4, 'little') + digest)
+        subtree_hash.update(digest + f"\x03{child.tail or ''}".encode('utf-8'))
+    fingerprints[component] = (subtree_hash.hexdigest(), head_hash.hexdigest())
+    return subtree_hash.digest()
+
+
+def get_component_label(component: ET.Element, kind: str) -> str:
+    did = component.find('did')
+    if did is not None:
+        for tag in ['unitid', 'unittitle']:
+            elem = did.find(tag)
+            if elem is not None and elem.text is not None and elem.text.strip() != '':
+                return f"{kind}:{elem.text.strip()}"
+    return kind
+
+
+def get_child_keys(component: ET.Element, kind: str, key: Tuple) -> Dict[ET.Element, Tuple]:
+    # component keys are paths of labels, numbered when siblings share a label, so they
+    # survive the insertion or removal of other components
+    child_keys = {}
+    label_count = defaultdict(int)
+    for child in component:
+        child_kind = ead_parser.get_component_kind(kind, child)
+        if child_kind in CONTAINER_KINDS:
+            label = get_component_label(child, child_kind)
+            label_count[label] += 1
+            if label_count[label] > 1:
+                label = f"{label}#{label_count[label]}"
+            child_keys[child] = key + (label,)
+    return child_keys
+
+
+class IncrementalInventoryParser:
+    # Walks the dsc the way get_file_records does, but reuses the rows of a previous run for
+    # every series/subseries/filegroup subtree whose fingerprint is unchanged and whose
+    # ancestors' context did not change, and only parses the rest.
+
+    def __init__(self, state: Dict[str, any], max_subseries_depth: int = 2):
+        self.max_subseries_depth = max_subseries_depth
+        self.columns = ead_parser.get_inventory_columns(max_subseries_depth)
+        self.old_fingerprints = {}
+        self.old_rows = pd.DataFrame(columns=self.columns + [NODE_COLUMN])
+        if state is not None and state['max_subseries_depth'] == max_subseries_depth:
+            self.old_fingerprints = state['fingerprints']
+            self.old_rows = state['rows']
+        # rows and component keys of the previous run per ancestor key, to reuse whole subtrees
+        self.old_rows_by_prefix = defaultdict(list)
+        for row_index, node in enumerate(self.old_rows[NODE_COLUMN]):
+            for depth in range(1, len(node) + 1):
+                self.old_rows_by_prefix[node[:depth]].append(row_index)
+        self.old_keys_by_prefix = defaultdict(list)
+        for old_key in self.old_fingerprints:
+            for depth in range(1, len(old_key)):
+                self.old_keys_by_prefix[old_key[:depth]].append(old_key)
+        self.fingerprints = {}
+        self.element_fingerprints = {}
+        self.reused_rows = []
+        self.parsed_rows = []
+        self.rows = []
+        self.num_reused = 0
+        self.num_parsed = 0
+
+    def parse(self, dsc: ET.Element):
+        top_keys = get_child_keys(dsc, 'dsc', ())
+        for series in ead_parser.get_series(dsc):
+            fingerprint_component(series, 'series', self.element_fingerprints)
+        for series in ead_parser.get_series(dsc):
+            self.parse_component(series, 'series', None, top_keys[series], context_changed=False)
+
+    def parse_component(self, component: ET.Element, kind: str, parent_context: ead_parser.ContextNode,
+                        key: Tuple, context_changed: bool):
+        fingerprint = self.element_fingerprints[component]
+        self.fingerprints[key] = fingerprint
+        old_fingerprint = self.old_fingerprints.get(key)
+        if context_changed is False and old_fingerprint == fingerprint:
+            self.num_reused += 1
+            row_indices = self.old_rows_by_prefix.get(key, [])
+            self.reused_rows.extend(row_indices)
+            self.rows.extend(('old', row_index) for row_index in row_indices)
+            for old_key in self.old_keys_by_prefix.get(key, []):
+                self.fingerprints[old_key] = self.old_fingerprints[old_key]
+            return
+        self.num_parsed += 1
+        # when the head changed, the context of every descendant may have changed too
+        context_changed = context_changed or old_fingerprint is None or old_fingerprint[1] != fingerprint[1]
+        child_keys = get_child_keys(component, kind, key)
+        context = ead_parser.new_component_context(kind, parent_context)
+        for child in component:
+            child_kind = ead_parser.get_component_kind(kind, child)
+            if child_kind in CONTAINER_KINDS:
+                # nested series start from a fresh context, like parse_series
+                self.parse_component(child, child_kind, context, child_keys[child],
+                                     context_changed=context_changed)
+            elif child_kind == 'file':
+                file_record = ead_parser.parse_file(child, context)
+                if ead_parser.is_inventory_file_record(file_record):
+                    file_info = file_record.to_dict(deep=False)
+                    row = ead_parser.extract_inv_num_file_info(file_info, max_subseries_depth=self.max_subseries_depth)
+                    self.parsed_rows.append(row + [key])
+                    self.rows.append(('new', len(self.parsed_rows) - 1))
+            else:
+                context, _ = ead_parser.parse_component_child(kind, context, child)
+
+    def get_inventory(self) -> pd.DataFrame:
+        parsed = pd.DataFrame(self.parsed_rows, columns=self.columns + [NODE_COLUMN])
+        old = self.old_rows.reset_index(drop=True)
+        if len(self.rows) == 0:
+            return pd.DataFrame(columns=self.columns + [NODE_COLUMN])
+        # assemble in document order from contiguous blocks of each source
+        blocks = []
+        current_source, current_indices = None, []
+        for source, index in self.rows:
+            if source != current_source and current_indices:
+                blocks.append((old if current_source == 'old' else parsed).iloc[current_indices])
+                current_indices = []
+            current_source = source
+            current_indices.append(index)
+        blocks.append((old if current_source == 'old' else parsed).iloc[current_indices])
+        return pd.concat(blocks, ignore_index=True)
+
+    def get_delta(self) -> Dict[str, pd.DataFrame]:
+        old_changed = self.old_rows.reset_index(drop=True)
+        old_changed = old_changed[~old_changed.index.isin(self.reused_rows)]
+        new_changed = pd.DataFrame(self.parsed_rows, columns=self.columns + [NODE_COLUMN])
+        return get_row_delta(old_changed, new_changed, self.columns)
+
+
+def get_row_delta(old_rows: pd.DataFrame, new_rows: pd.DataFrame, columns: List[str]) -> Dict[str, pd.DataFrame]:
+    # rows are matched on inventory number (and occurrence, for repeated numbers)
+    old_rows = old_rows[columns].astype(object).assign(occurrence=old_rows.groupby('inventory_num').cumcount())
+    new_rows = new_rows[columns].astype(object).assign(occurrence=new_rows.groupby('inventory_num').cumcount())
+    merged = old_rows.merge(new_rows, on=['inventory_num', 'occurrence'], how='outer',
+                            suffixes=('_old', ''), indicator=True)
+    value_cols = [col for col in columns if col != 'inventory_num']
+    added = merged[merged['_merge'] == 'right_only']
+    removed = merged[merged['_merge'] == 'left_only']
+    both = merged[merged['_merge'] == 'both']
+    changed = pd.Series(False, index=both.index)
+    for col in value_cols:
+        old_values, new_values = both[f"{col}_old"], both[col]
+        changed |= ~((old_values == new_values) | (old_values.isna() & new_values.isna()))
+    modified = both[changed]
+    # the new side of a removed row is all empty, only its old values are kept
+    removed = removed[['inventory_num'] + [f"{col}_old" for col in value_cols]]
+    removed = removed.rename(columns={f"{col}_old": col for col in value_cols})
+    return {
+        'added': added[columns].reset_index(drop=True),
+        'removed': removed[columns].reset_index(drop=True),
+        'modified': modified[columns].reset_index(drop=True)
+    }
+
+
+def read_state(state_file: str) -> Union[Dict[str, any], None]:
+    if state_file is None or not os.path.exists(state_file):
+        return None
+    with open(state_file, 'rb') as fh:
+        state = pickle.load(fh)
+    if state.get('version') != STATE_VERSION or state.get('parser_version') != ead_parser.PARSER_VERSION:
+        return None
+    return state
+
+
+def write_state(state: Dict[str, any], state_file: str):
+    tmp_file = f"{state_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wb') as fh:
+        pickle.dump(state, fh)
+    os.replace(tmp_file, state_file)
+
+
+def update_inventory_info(ead_file, state_file: str, max_subseries_depth: int = 2) -> Dict[str, any]:
+    # Re-parse an updated EAD against the state stored by the previous run and return the
+    # added, removed and modified inventory rows, next to the full new inventory.
+    # Without a usable previous state every row counts as added.
+    state = read_state(state_file)
+    parser = IncrementalInventoryParser(state, max_subseries_depth=max_subseries_depth)
+    parser.parse(ead_parser.get_desc(ead_parser.read_ead_file(ead_file)))
+    inventory = parser.get_inventory()
+    write_state({
+        'version': STATE_VERSION,
+        'parser_version': ead_parser.PARSER_VERSION,
+        'max_subseries_depth': max_subseries_depth,
+        'fingerprints': parser.fingerprints,
+        'rows': inventory
+    }, state_file)
+    delta = parser.get_delta()
+    delta['inventory'] = inventory.drop(columns=[NODE_COLUMN])
+    delta['reused_components'] = parser.num_reused
+    delta['parsed_components'] = parser.num_parsed
+    return delta
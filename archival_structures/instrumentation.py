@@ -0,0 +1,172 @@
+import functools
+import json
+import logging
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Union
+
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+# The metrics being collected, None when instrumentation is disabled.
+metrics = None
+# Functions marked with @instrument. They are only replaced by timing wrappers in their
+# module while metrics are enabled, so a disabled parser runs the plain functions.
+instrumented_functions = []
+
+
+class ParserMetrics:
+    # Call counts and cumulative time per parse function (time is inclusive, parse_series
+    # contains the time of the subseries and files it parses), counts of the elements
+    # visited per tag and level attribute and the parse time of every top-level series.
+
+    def __init__(self, **labels):
+        self.labels = labels
+        self.calls = Counter()
+        self.seconds = defaultdict(float)
+        self.elements = Counter()
+        self.series = []
+
+    def add_call(self, name: str, seconds: float):
+        self.calls[name] += 1
+        self.seconds[name] += seconds
+
+    def add_element(self, tag: str, level: str = None):
+        self.elements[(tag, level)] += 1
+
+    def add_series(self, title: str, unitid: str, seconds: float, num_files: int):
+        self.series.append({'title': title, 'unitid': unitid, 'seconds': seconds, 'files': num_files})
+
+    def merge(self, other: 'ParserMetrics'):
+        self.calls.update(other.calls)
+        for name, seconds in other.seconds.items():
+            self.seconds[name] += seconds
+        self.elements.update(other.elements)
+        self.series.extend(other.series)
+
+    def get_functions(self) -> pd.DataFrame:
+        df = pd.DataFrame({'calls': pd.Series(self.calls, dtype=int),
+                           'seconds': pd.Series(self.seconds, dtype=float)})
+        df['seconds_per_call'] = df['seconds'] / df['calls']
+        return df.rename_axis('function').sort_values('seconds', ascending=False)
+
+    def get_elements(self) -> pd.DataFrame:
+        rows = [[tag, level, count] for (tag, level), count in self.elements.items()]
+        df = pd.DataFrame(rows, columns=['tag', 'level', 'count'])
+        return df.sort_values('count', ascending=False, ignore_index=True)
+
+    def get_series(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.series, columns=['title', 'unitid', 'seconds', 'files'])
+        return df.sort_values('seconds', ascending=False)
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'labels': self.labels,
+            'functions': {name: {'calls': self.calls[name], 'seconds': self.seconds[name]} for name in self.calls},
+            'elements': [{'tag': tag, 'level': level, 'count': count}
+                         for (tag, level), count in self.elements.items()],
+            'series': self.series
+        }
+
+    @classmethod
+    def from_dict(cls, metrics_dict: Dict[str, any]) -> 'ParserMetrics':
+        parser_metrics = cls(**metrics_dict['labels'])
+        for name, stats in metrics_dict['functions'].items():
+            parser_metrics.calls[name] = stats['calls']
+            parser_metrics.seconds[name] = stats['seconds']
+        for element in metrics_dict['elements']:
+            parser_metrics.elements[(element['tag'], element['level'])] = element['count']
+        parser_metrics.series = list(metrics_dict['series'])
+        return parser_metrics
+
+
+def time_calls(func: Callable) -> Callable:
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        parser_metrics = metrics
+        if parser_metrics is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            parser_metrics.add_call(name, time.perf_counter() - start)
+
+    return wrapper
+
+
+def set_wrappers(installed: bool):
+    # calls between functions of a module go through the module globals,
+    # so replacing the module attribute also times the internal calls
+    for func in instrumented_functions:
+        module = sys.modules[func.__module__]
+        setattr(module, func.__name__, time_calls(func) if installed else func)
+
+
+def instrument(func: Callable) -> Callable:
+    instrumented_functions.append(func)
+    return func
+
+
+def enable(parser_metrics: ParserMetrics = None) -> ParserMetrics:
+    global metrics
+    if metrics is None:
+        set_wrappers(True)
+    metrics = parser_metrics if parser_metrics is not None else ParserMetrics()
+    return metrics
+
+
+def disable() -> Union[ParserMetrics, None]:
+    global metrics
+    parser_metrics = metrics
+    if metrics is not None:
+        set_wrappers(False)
+    metrics = None
+    return parser_metrics
+
+
+class collect:
+    # with collect(sink=log_sink, archive_id='1.04.02') as parser_metrics: ...
+    # collects metrics within the block and passes them to the sink at the end
+
+    def __init__(self, sink: Callable[[ParserMetrics], None] = None, **labels):
+        self.sink = sink
+        self.parser_metrics = ParserMetrics(**labels)
+        self.previous = None
+
+    def __enter__(self) -> ParserMetrics:
+        self.previous = metrics
+        return enable(self.parser_metrics)
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self.previous is None:
+            disable()
+        else:
+            enable(self.previous)
+        if self.sink is not None:
+            self.sink(self.parser_metrics)
+        return False
+
+
+def log_sink(parser_metrics: ParserMetrics, level: int = logging.INFO):
+    logger.log(level, json.dumps(parser_metrics.to_dict()))
+
+
+class JSONLinesSink:
+
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+
+    def __call__(self, parser_metrics: ParserMetrics):
+        with open(self.output_file, 'at') as fh:
+            fh.write(json.dumps(parser_metrics.to_dict()) + '\n')
+
+
+def read_metrics(metrics_file: str) -> List[ParserMetrics]:
+    with open(metrics_file, 'rt') as fh:
+        return [ParserMetrics.from_dict(json.loads(line)) for line in fh if line.strip() != '']
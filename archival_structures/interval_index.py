@@ -0,0 +1,213 @@
+import bisect
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+
+
+# the number an inventory number starts with, e.g. 12 for '12', '12a' and '12 bis'
+INVENTORY_NUMBER_PATTERN = r'^\s*(\d+)'
+# a range of inventory numbers, e.g. '1-250', '12a-12c' or '1 - 5', a single number is a range of one
+INVENTORY_RANGE_PATTERN = r'^\s*(\d+)[^\d\-–]*(?:[\-–]\s*[^\d\s]*\s*(\d+))?'
+NODE_COLUMNS = ['kind', 'depth', 'title', 'path', 'start', 'end', 'num_files', 'inventory_range']
+
+
+def normalize_inventory_numbers(inventory_nums: pd.Series) -> np.ndarray:
+    # the numeric part of every inventory number as float, NaN if it has none
+    numbers = inventory_nums.astype(object).astype('string').str.extract(INVENTORY_NUMBER_PATTERN, expand=False)
+    return pd.to_numeric(numbers).to_numpy(dtype=float, na_value=np.nan)
+
+
+def normalize_inventory_ranges(inventory_ranges: pd.Series) -> pd.DataFrame:
+    # start and end of every range as float, NaN if it cannot be parsed
+    bounds = inventory_ranges.astype(object).astype('string').str.extract(INVENTORY_RANGE_PATTERN)
+    start = pd.to_numeric(bounds[0]).to_numpy(dtype=float, na_value=np.nan)
+    end = pd.to_numeric(bounds[1]).to_numpy(dtype=float, na_value=np.nan)
+    end = np.where(np.isnan(end), start, end)
+    # a reversed range such as '250-1' is taken as written the other way round
+    return pd.DataFrame({'start': np.fmin(start, end), 'end': np.fmax(start, end)}, index=inventory_ranges.index)
+
+
+def parse_inventory_range(inventory_range: str) -> Union[Tuple[int, int], None]:
+    bounds = normalize_inventory_ranges(pd.Series([inventory_range]))
+    if np.isnan(bounds['start'].iloc[0]):
+        return None
+    return int(bounds['start'].iloc[0]), int(bounds['end'].iloc[0])
+
+
+class IntervalIndex:
+    # Closed integer intervals split into layers in which no interval strictly contains another,
+    # so that both the starts and the ends of a layer are sorted. The intervals of a layer that
+    # overlap [a, b] are then one contiguous run, from the first that ends at or after a to the
+    # last that starts at or before b, found with two binary searches. Intervals are assigned
+    # to layers like cards to patience piles, the number of layers is the deepest nesting of
+    # intervals, which for the ranges of a hierarchy is about its depth.
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray):
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        if len(starts) != len(ends):
+            raise ValueError(f"got {len(starts)} starts but {len(ends)} ends")
+        if (ends < starts).any():
+            raise ValueError('interval ends before it starts')
+        # by start, and a containing interval before the ones it contains
+        order = np.lexsort((-ends, starts))
+        layers = np.empty(len(order), dtype=np.int64)
+        # the last end of every layer, decreasing from the first layer to the last
+        layer_ends = []
+        for position, end in zip(order.tolist(), ends[order].tolist()):
+            layer = bisect.bisect_left(layer_ends, -end)
+            if layer == len(layer_ends):
+                layer_ends.append(-end)
+            else:
+                layer_ends[layer] = -end
+            layers[position] = layer
+        self.num_layers = len(layer_ends)
+        # grouped by layer, within a layer in start order
+        self.order = order[np.argsort(layers[order], kind='stable')]
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        self.layer_bounds = np.searchsorted(layers[self.order], np.arange(self.num_layers + 1))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlap(self, start: int, end: int = None) -> np.ndarray:
+        # positions (in the order the intervals were given) of the intervals that overlap
+        # [start, end], or that contain start if no end is given
+        _, positions = self.overlap_many([start], None if end is None else [end])
+        return positions
+
+    def overlap_many(self, starts: Iterable[int], ends: Iterable[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Vectorized overlap for a batch of queries. Returns the query number and the interval
+        # position of every match, sorted by query.
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = starts if ends is None else np.asarray(ends, dtype=np.int64)
+        queries, candidates = [], []
+        for layer in range(self.num_layers):
+            first, last = self.layer_bounds[layer], self.layer_bounds[layer + 1]
+            lower = first + np.searchsorted(self.ends[first:last], starts, side='left')
+            upper = first + np.searchsorted(self.starts[first:last], ends, side='right')
+            counts = np.maximum(upper - lower, 0)
+            # every match: the lower bound of its query plus its offset in the run
+            run_starts = np.cumsum(counts) - counts
+            queries.append(np.repeat(np.arange(len(starts)), counts))
+            candidates.append(np.repeat(lower, counts) + np.arange(counts.sum()) - np.repeat(run_starts, counts))
+        if len(queries) == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        queries = np.concatenate(queries)
+        candidates = np.concatenate(candidates)
+        query_order = np.argsort(queries, kind='stable')
+        return queries[query_order], self.order[candidates[query_order]]
+
+
+def get_node_paths(inventory: pd.DataFrame, subseries_cols: List[str]) -> List[Tuple[str, int, Tuple]]:
+    # the series, subseries and filegroup nodes of every row, as (kind, depth, path)
+    paths = []
+    for row in inventory[['series'] + subseries_cols + ['filegroup']].itertuples(index=False, name=None):
+        path = (row[0],)
+        row_paths = [('series', 0, path)]
+        for depth, subseries in enumerate(row[1:-1]):
+            if subseries is None:
+                break
+            path = path + (subseries,)
+            row_paths.append(('subseries', depth + 1, path))
+        if row[-1] is not None:
+            row_paths.append(('filegroup', len(path), path + (row[-1],)))
+        paths.append(row_paths)
+    return paths
+
+
+class InventoryIntervalIndex:
+    # Inventory numbers and hierarchy nodes of an inventory frame as numeric intervals.
+    # A filegroup covers the range of its id (the inventory_range column) when it can be
+    # parsed, otherwise, like series and subseries, the lowest to highest inventory number
+    # of its files. Suffixes are ignored, so '12a' counts as inventory number 12.
+    #
+    # index = InventoryIntervalIndex.from_ead('ead.xml')
+    # index.find_nodes(1234, kind='filegroup')
+    # index.find_files(500, 800)
+
+    def __init__(self, inventory: pd.DataFrame):
+        inventory = inventory.astype(object).where(inventory.notna(), None).reset_index(drop=True)
+        self.inventory = inventory
+        subseries_cols = [column for column in inventory.columns if column.startswith('subseries_')]
+        numbers = normalize_inventory_numbers(inventory['inventory_num'])
+        numbered = np.flatnonzero(~np.isnan(numbers))
+        self.file_order = numbered[np.argsort(numbers[numbered], kind='stable')]
+        self.file_numbers = numbers[self.file_order].astype(np.int64)
+        self.nodes = self.get_nodes(inventory, numbers, subseries_cols)
+        self.node_index = IntervalIndex(self.nodes['start'].to_numpy(), self.nodes['end'].to_numpy())
+
+    @classmethod
+    def from_ead(cls, ead_file, max_subseries_depth: int = 2, streaming: bool = False) -> 'InventoryIntervalIndex':
+        inventory = ead_parser.get_inventory_info(ead_file, max_subseries_depth=max_subseries_depth,
+                                                  streaming=streaming, categorical=False)
+        return cls(inventory)
+
+    @staticmethod
+    def get_nodes(inventory: pd.DataFrame, numbers: np.ndarray, subseries_cols: List[str]) -> pd.DataFrame:
+        nodes = {}
+        node_ids, rows = [], []
+        inventory_ranges = inventory['inventory_range'].tolist()
+        for row, row_paths in enumerate(get_node_paths(inventory, subseries_cols)):
+            for kind, depth, path in row_paths:
+                if path not in nodes:
+                    inventory_range = inventory_ranges[row] if kind == 'filegroup' else None
+                    nodes[path] = (len(nodes), kind, depth, path[-1], path, inventory_range)
+                node_ids.append(nodes[path][0])
+                rows.append(row)
+        nodes = pd.DataFrame([node[1:] for node in nodes.values()],
+                             columns=['kind', 'depth', 'title', 'path', 'inventory_range'])
+        # the lowest and highest inventory number of the files of each node
+        numbers = pd.DataFrame({'node': node_ids, 'number': numbers[rows]}).groupby('node')['number']
+        nodes['start'] = numbers.min()
+        nodes['end'] = numbers.max()
+        nodes['num_files'] = numbers.size()
+        declared = normalize_inventory_ranges(nodes['inventory_range'])
+        has_range = declared['start'].notna()
+        nodes.loc[has_range, 'start'] = declared['start'][has_range]
+        nodes.loc[has_range, 'end'] = declared['end'][has_range]
+        # nodes without any numeric inventory number cannot be placed
+        nodes = nodes[nodes['start'].notna()].reset_index(drop=True)
+        return nodes[NODE_COLUMNS].astype({'start': np.int64, 'end': np.int64})
+
+    def select_nodes(self, positions: np.ndarray, kind: str = None) -> pd.DataFrame:
+        nodes = self.nodes.iloc[positions]
+        if kind is not None:
+            nodes = nodes[nodes['kind'] == kind]
+        return nodes
+
+    def find_nodes(self, inventory_num: Union[int, str], kind: str = None) -> pd.DataFrame:
+        # the nodes that cover the inventory number, from the series down
+        number = normalize_inventory_numbers(pd.Series([inventory_num]))[0]
+        if np.isnan(number):
+            raise ValueError(f"inventory number '{inventory_num}' has no numeric part")
+        nodes = self.select_nodes(self.node_index.overlap(int(number)), kind=kind)
+        return nodes.sort_values('depth', kind='stable')
+
+    def find_nodes_many(self, inventory_nums: Iterable[Union[int, str]], kind: str = None) -> pd.DataFrame:
+        # covering nodes for a batch of inventory numbers, with the number each was found for
+        inventory_nums = pd.Series(list(inventory_nums), dtype=object)
+        numbers = normalize_inventory_numbers(inventory_nums)
+        valid = np.flatnonzero(~np.isnan(numbers))
+        queries, positions = self.node_index.overlap_many(numbers[valid].astype(np.int64))
+        nodes = self.nodes.iloc[positions].reset_index(drop=True)
+        nodes.insert(0, 'inventory_num', inventory_nums.iloc[valid[queries]].to_numpy())
+        if kind is not None:
+            nodes = nodes[nodes['kind'] == kind].reset_index(drop=True)
+        return nodes
+
+    def find_overlapping_nodes(self, start: int, end: int, kind: str = None) -> pd.DataFrame:
+        return self.select_nodes(self.node_index.overlap(start, end), kind=kind).sort_values('start', kind='stable')
+
+    def find_files(self, start: Union[int, str], end: Union[int, str] = None) -> pd.DataFrame:
+        # inventory rows with a number in [start, end], in numeric order
+        bounds = normalize_inventory_numbers(pd.Series([start, start if end is None else end]))
+        if np.isnan(bounds).any():
+            raise ValueError(f"range {start}-{end} has no numeric bounds")
+        lower = np.searchsorted(self.file_numbers, bounds[0], side='left')
+        upper = np.searchsorted(self.file_numbers, bounds[1], side='right')
+        return self.inventory.iloc[self.file_order[lower:upper]]
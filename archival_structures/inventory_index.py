@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+import archival_structures.batch as batch
+
+
+INDEX_VERSION = 1
+RECORD_FIELDS = ['archive_id', 'inventory_num', 'handle', 'mets_file', 'title', 'unitdate', 'path']
+KEY_TYPES = ['inventory_num', 'handle', 'mets_file']
+PATH_SEPARATOR = ' / '
+
+
+def hash_key(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def get_index_record(file_record: ead_parser.FileRecord, archive_id: str) -> Dict[str, str]:
+    file_info = file_record.to_dict(deep=False)
+    series = file_info['series'].get('title')
+    subseries = ead_parser.extract_subseries_info(file_info)
+    filegroups, _ = ead_parser.extract_filegroup_info(file_info)
+    files, _, file_dates, mets_file = ead_parser.extract_file_info(file_info)
+    path = [title for title in [series] + subseries + filegroups if title is not None]
+    return {
+        'archive_id': archive_id,
+        'inventory_num': ead_parser.get_inv_num_unit(file_info['file'])['unitid'],
+        'handle': file_info['file'].get('handle'),
+        'mets_file': mets_file,
+        'title': files[0] if len(files) > 0 else None,
+        'unitdate': file_dates[0] if len(file_dates) > 0 else None,
+        'path': PATH_SEPARATOR.join(path)
+    }
+
+
+def write_string_column(values: List[Union[str, None]], index_dir: str, name: str):
+    # all strings of a column in one UTF-8 blob, with the start offset of every value,
+    # missing values are stored as empty strings
+    encoded = [b'' if value is None else value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    np.save(os.path.join(index_dir, f"{name}.offsets.npy"), offsets)
+    with open(os.path.join(index_dir, f"{name}.data"), 'wb') as fh:
+        for value in encoded:
+            fh.write(value)
+
+
+class StringColumn:
+
+    def __init__(self, index_dir: str, name: str):
+        self.offsets = np.load(os.path.join(index_dir, f"{name}.offsets.npy"), mmap_mode='r')
+        data_file = os.path.join(index_dir, f"{name}.data")
+        if os.path.getsize(data_file) > 0:
+            self.data = np.memmap(data_file, dtype=np.uint8, mode='r')
+        else:
+            self.data = np.array([], dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> Union[str, None]:
+        value = self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode('utf-8')
+        return value if value != '' else None
+
+
+class InventoryIndexBuilder:
+    # Collects one record per inventory number while the EAD is parsed, either as a sink for
+    # ead_parser.iter_file_components or via add_archive, and writes the index files.
+
+    def __init__(self, archive_id: str = None):
+        self.archive_id = archive_id
+        self.records = {field: [] for field in RECORD_FIELDS}
+        self.archives = []
+
+    def __len__(self):
+        return len(self.records['archive_id'])
+
+    def set_archive(self, archive_id: str):
+        self.archive_id = archive_id
+        if archive_id not in self.archives:
+            self.archives.append(archive_id)
+
+    def add_file_record(self, file_record: ead_parser.FileRecord):
+        if ead_parser.is_inventory_file_record(file_record):
+            record = get_index_record(file_record, self.archive_id)
+            for field in RECORD_FIELDS:
+                self.records[field].append(record[field])
+
+    def add_file_component(self, component, file_record: Union[ead_parser.FileRecord, None]):
+        self.add_file_record(file_record)
+
+    def add_archive(self, ead_file, archive_id: str = None):
+        self.set_archive(archive_id if archive_id is not None else batch.get_archive_id(ead_file))
+        for file_record in ead_parser.iter_file_records(ead_file):
+            self.add_file_record(file_record)
+
+    def write(self, index_dir: str):
+        os.makedirs(index_dir, exist_ok=True)
+        for field in RECORD_FIELDS:
+            write_string_column(self.records[field], index_dir, field)
+        for key_type in KEY_TYPES:
+            keys = self.records[key_type]
+            rows = np.array([row for row, key in enumerate(keys) if key is not None], dtype=np.int64)
+            hashes = np.array([hash_key(keys[row]) for row in rows], dtype=np.uint64)
+            order = np.argsort(hashes, kind='stable')
+            np.save(os.path.join(index_dir, f"{key_type}.hashes.npy"), hashes[order])
+            np.save(os.path.join(index_dir, f"{key_type}.rows.npy"), rows[order])
+        with open(os.path.join(index_dir, 'index.json'), 'wt') as fh:
+            json.dump({'version': INDEX_VERSION, 'records': len(self), 'archives': self.archives}, fh)
+
+
+class InventoryIndex:
+    # Read-only view of an index directory, every array is memory-mapped so opening
+    # the index does not read the records. Keys are found by binary search on the
+    # sorted key hashes and then checked against the stored key.
+
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, 'index.json'), 'rt') as fh:
+            self.metadata = json.load(fh)
+        if self.metadata['version'] != INDEX_VERSION:
+            raise ValueError(f"unsupported index version {self.metadata['version']}")
+        self.columns = {field: StringColumn(index_dir, field) for field in RECORD_FIELDS}
+        self.hashes = {}
+        self.rows = {}
+        for key_type in KEY_TYPES:
+            self.hashes[key_type] = np.load(os.path.join(index_dir, f"{key_type}.hashes.npy"), mmap_mode='r')
+            self.rows[key_type] = np.load(os.path.join(index_dir, f"{key_type}.rows.npy"), mmap_mode='r')
+
+    def __len__(self):
+        return self.metadata['records']
+
+    def get_record(self, row: int) -> Dict[str, str]:
+        return {field: self.columns[field][row] for field in RECORD_FIELDS}
+
+    def find_rows(self, key_type: str, keys: Iterable[str]) -> List[List[int]]:
+        if key_type not in KEY_TYPES:
+            raise ValueError(f"unknown key type '{key_type}', must be one of {KEY_TYPES}")
+        keys = list(keys)
+        hashes = np.array([hash_key(key) for key in keys], dtype=np.uint64)
+        starts = np.searchsorted(self.hashes[key_type], hashes, side='left')
+        ends = np.searchsorted(self.hashes[key_type], hashes, side='right')
+        key_column = self.columns[key_type]
+        found = []
+        for key, start, end in zip(keys, starts, ends):
+            candidates = self.rows[key_type][start:end]
+            found.append([int(row) for row in candidates if key_column[row] == key])
+        return found
+
+    def lookup(self, key_type: str, key: str, archive_id: str = None) -> List[Dict[str, str]]:
+        records = [self.get_record(row) for row in self.find_rows(key_type, [key])[0]]
+        if archive_id is not None:
+            records = [record for record in records if record['archive_id'] == archive_id]
+        return records
+
+    def lookup_many(self, key_type: str, keys: Iterable[str], archive_id: str = None) -> pd.DataFrame:
+        keys = list(keys)
+        records = []
+        for key, rows in zip(keys, self.find_rows(key_type, keys)):
+            for row in rows:
+                record = self.get_record(row)
+                if archive_id is None or record['archive_id'] == archive_id:
+                    records.append({'key': key, **record})
+        return pd.DataFrame(records, columns=['key'] + RECORD_FIELDS)
+
+
+def build_index(ead_files: Iterable[str], index_dir: str, archive_ids: Iterable[str] = None) -> InventoryIndex:
+    ead_files = list(ead_files)
+    if archive_ids is None:
+        archive_ids = [batch.get_archive_id(ead_file) for ead_file in ead_files]
+    archive_ids = list(archive_ids)
+    builder = InventoryIndexBuilder()
+    for ead_file, archive_id in zip(ead_files, archive_ids):
+        builder.add_archive(ead_file, archive_id=archive_id)
+    builder.write(index_dir)
+    return InventoryIndex(index_dir)
@@ -0,0 +1,169 @@
+import json
+import os
+import xml.etree.ElementTree as ET
+from multiprocessing import Pool
+from typing import Dict, Iterable, Union
+
+import pandas as pd
+
+import archival_structures.cache as cache
+import archival_structures.sources as sources
+
+
+# bump when a change to parse_mets changes its output, this invalidates cached counts
+METS_PARSER_VERSION = '1'
+DEFAULT_CACHE_FILE = os.path.join(cache.DEFAULT_CACHE_DIR, 'mets-counts.jsonl')
+METS_SUFFIXES = ['', '.xml', '.xml.gz', '.xml.bz2', '.xml.xz', '.xml.zst', '.gz']
+METS_COLUMNS = ['mets_file_groups', 'mets_files', 'mets_pages', 'mets_error']
+
+
+def get_local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def get_mets_path(mets_dir: str, mets_file: str) -> Union[str, None]:
+    # a METS link such as https://service.archief.nl/gaf/api/mets/v1/<uuid> is mirrored
+    # as <mets_dir>/<uuid>, optionally with an .xml and a compression suffix
+    name = mets_file.rstrip('/').rsplit('/', 1)[-1]
+    for suffix in METS_SUFFIXES:
+        path = os.path.join(mets_dir, name + suffix)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def parse_mets(mets_source: sources.Source) -> Dict[str, any]:
+    # One streaming pass that counts the file groups, the files per group (by USE) and the
+    # page divs of the structure map. Finished elements are cleared, so memory use does not
+    # grow with the number of scans. Without page divs the largest file group is taken as
+    # the number of pages, one image per page.
+    group_files = {}
+    num_pages = 0
+    num_files = 0
+    current_group = None
+    with sources.open_source(mets_source) as fh:
+        for event, elem in ET.iterparse(fh, events=('start', 'end')):
+            tag = get_local_name(elem.tag)
+            if event == 'start':
+                if tag == 'fileGrp':
+                    current_group = elem.attrib.get('USE') or elem.attrib.get('ID') or str(len(group_files))
+                    group_files.setdefault(current_group, 0)
+                continue
+            if tag == 'file':
+                num_files += 1
+                if current_group is not None:
+                    group_files[current_group] += 1
+            elif tag == 'div' and (elem.attrib.get('TYPE') or '').lower() == 'page':
+                num_pages += 1
+            elif tag == 'fileGrp':
+                current_group = None
+            if tag in {'file', 'div', 'fileGrp', 'structMap', 'fileSec'}:
+                elem.clear()
+    if num_pages == 0 and len(group_files) > 0:
+        num_pages = max(group_files.values())
+    return {'file_groups': len(group_files), 'files': num_files, 'pages': num_pages, 'group_files': group_files}
+
+
+def parse_mets_task(mets_path: str) -> Dict[str, any]:
+    try:
+        return {'path': mets_path, **parse_mets(mets_path), 'error': None}
+    # ImportError when the document is compressed with a codec whose package is not installed
+    except (ET.ParseError, OSError, EOFError, ValueError, ImportError) as err:
+        return {'path': mets_path, 'file_groups': None, 'files': None, 'pages': None, 'group_files': None,
+                'error': f"{type(err).__name__}: {err}"}
+
+
+def get_stat_key(path: str) -> str:
+    stat = os.stat(path)
+    return f"{os.path.realpath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+class METSCountsCache:
+    # Counts per METS document in an append-only JSON lines file, keyed by path, size and
+    # modification time, so a document is parsed again only when it changed. Later lines
+    # replace earlier ones for the same key.
+
+    def __init__(self, cache_file: str = DEFAULT_CACHE_FILE):
+        self.cache_file = cache_file
+        self.entries = {}
+        if os.path.exists(cache_file):
+            with open(cache_file, 'rt') as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a line cut off by an interrupted run
+                        continue
+                    if entry.get('version') == METS_PARSER_VERSION:
+                        self.entries[entry['key']] = entry['counts']
+        cache_dir = os.path.dirname(cache_file)
+        if cache_dir != '':
+            os.makedirs(cache_dir, exist_ok=True)
+        self.fh = open(cache_file, 'at')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+        return False
+
+    def close(self):
+        self.fh.close()
+
+    def get(self, key: str) -> Union[Dict[str, any], None]:
+        return self.entries.get(key)
+
+    def add(self, key: str, counts: Dict[str, any]):
+        self.entries[key] = counts
+        self.fh.write(json.dumps({'version': METS_PARSER_VERSION, 'key': key, 'counts': counts}) + '\n')
+
+
+def resolve_mets_files(mets_files: Iterable[str], mets_dir: str, cache_file: Union[str, None] = DEFAULT_CACHE_FILE,
+                       processes: int = None, chunksize: int = 16) -> pd.DataFrame:
+    # The counts of every distinct METS link, indexed by the link. Documents that are not in
+    # the cache are parsed in a pool of processes, links without a local copy get an error.
+    mets_files = pd.Series(list(mets_files), dtype=object).dropna().unique().tolist()
+    paths = {mets_file: get_mets_path(mets_dir, mets_file) for mets_file in mets_files}
+    counts = {}
+    mets_cache = METSCountsCache(cache_file) if cache_file is not None else None
+    try:
+        keys = {path: get_stat_key(path) for path in set(paths.values()) if path is not None}
+        uncached = []
+        for path, key in sorted(keys.items()):
+            cached_counts = mets_cache.get(key) if mets_cache is not None else None
+            if cached_counts is None:
+                uncached.append(path)
+            else:
+                counts[path] = cached_counts
+        if len(uncached) > 0:
+            with Pool(processes=processes) as pool:
+                for result in pool.imap_unordered(parse_mets_task, uncached, chunksize=chunksize):
+                    path = result.pop('path')
+                    counts[path] = result
+                    if mets_cache is not None and result['error'] is None:
+                        mets_cache.add(keys[path], result)
+    finally:
+        if mets_cache is not None:
+            mets_cache.close()
+    rows = []
+    for mets_file in mets_files:
+        path = paths[mets_file]
+        if path is None:
+            rows.append([mets_file, None, None, None, 'missing'])
+            continue
+        path_counts = counts[path]
+        rows.append([mets_file, path_counts['file_groups'], path_counts['files'], path_counts['pages'],
+                     path_counts['error']])
+    mets_counts = pd.DataFrame(rows, columns=['mets_file'] + METS_COLUMNS).set_index('mets_file')
+    return mets_counts.astype({column: 'Int64' for column in METS_COLUMNS[:-1]})
+
+
+def add_mets_columns(inventory: pd.DataFrame, mets_dir: str, cache_file: Union[str, None] = DEFAULT_CACHE_FILE,
+                     processes: int = None) -> pd.DataFrame:
+    # the inventory frame of get_inventory_info with the METS counts of every row added
+    mets_counts = resolve_mets_files(inventory['mets_file'], mets_dir, cache_file=cache_file, processes=processes)
+    columns = mets_counts.reindex(inventory['mets_file'].astype(object)).reset_index(drop=True)
+    columns.index = inventory.index
+    return pd.concat([inventory, columns], axis=1)
+
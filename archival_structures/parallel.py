@@ -0,0 +1,151 @@
+import os
+import re
+from multiprocessing import Pool
+from typing import Dict, Generator, List, Tuple, Union
+
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+import archival_structures.series_index as series_index
+
+
+WHITESPACE_PATTERN = re.compile(rb'\s*')
+# units are split until they are smaller than the dsc divided by this times the number of processes
+UNITS_PER_PROCESS = 4
+
+# set in every worker process by the pool initializer, so the index is read once per worker
+worker_series_index = None
+
+
+def open_worker_series_index(ead_file: str, max_split_depth: int):
+    global worker_series_index
+    worker_series_index = series_index.SeriesIndex(ead_file, max_subseries_depth=max_split_depth)
+
+
+def parse_entry_task(args) -> List[Union[ead_parser.FileRecord, Dict[str, any], list]]:
+    # with a row_depth the worker returns inventory rows, which are far cheaper to send back
+    entry_index, row_depth = args
+    file_records = worker_series_index.get_file_records(worker_series_index.entries[entry_index])
+    if row_depth is None:
+        return file_records
+    return list(ead_parser.iter_inventory_file_rows(file_records, max_subseries_depth=row_depth))
+
+
+def get_entry_children(entries: List[Dict[str, any]]) -> Dict[int, List[int]]:
+    children = {entry_index: [] for entry_index in range(len(entries))}
+    for entry_index, entry in enumerate(entries):
+        if entry['parent'] is not None:
+            children[entry['parent']].append(entry_index)
+    return children
+
+
+def get_entry_items(index: series_index.SeriesIndex, entry_index: int,
+                    children: List[int]) -> Union[List[Tuple[int, int, int]], None]:
+    # The heads and indexed child components of an entry in document order, as (start, end,
+    # child entry index or None for a head). None if anything else sits between them, e.g. a
+    # file or filegroup, which is only parsed as part of the whole entry.
+    entry = index.entries[entry_index]
+    items = [(start, end, None) for start, end in entry['heads']]
+    items += [(index.entries[child]['start'], index.entries[child]['end'], child) for child in children]
+    items.sort()
+    position = index.data.find(b'>', entry['start']) + 1
+    content_end = index.data.rfind(b'</', entry['start'], entry['end'])
+    for start, end, _ in items + [(content_end, content_end, None)]:
+        if WHITESPACE_PATTERN.fullmatch(index.data, position, start) is None:
+            return None
+        position = end
+    return items
+
+
+def get_work_units(index: series_index.SeriesIndex, max_unit_size: int) -> List[Tuple[str, int, any]]:
+    # The plan as a list of ('entry', entry index, None) units for the pool and ('head', entry
+    # index, (start, end)) items that are parsed here, in document order. An entry larger than
+    # max_unit_size is replaced by its heads and its indexed children when those are all it
+    # contains, so its output is theirs concatenated in the same order.
+    children = get_entry_children(index.entries)
+    units = []
+
+    def add_entry(entry_index: int):
+        entry = index.entries[entry_index]
+        items = None
+        if entry['end'] - entry['start'] > max_unit_size and len(children[entry_index]) > 0:
+            items = get_entry_items(index, entry_index, children[entry_index])
+        if items is None:
+            units.append(('entry', entry_index, None))
+            return
+        for start, end, child in items:
+            if child is None:
+                units.append(('head', entry_index, (start, end)))
+            else:
+                add_entry(child)
+
+    for entry_index, entry in enumerate(index.entries):
+        if entry['parent'] is None:
+            add_entry(entry_index)
+    return units
+
+
+def parse_head(index: series_index.SeriesIndex, entry_index: int, head_range: Tuple[int, int],
+               context: ead_parser.ContextNode) -> Tuple[ead_parser.ContextNode, Union[Dict[str, any], None]]:
+    kind = index.entries[entry_index]['kind']
+    head = series_index.parse_fragment(index.data, head_range[0], head_range[1], index.encoding)
+    return ead_parser.parse_component_child(kind, context, head)
+
+
+def iter_unit_results(ead_file: str, processes: int = None, max_split_depth: int = 2, max_unit_size: int = None,
+                      row_depth: int = None) -> Generator[list, None, None]:
+    # The records (or inventory rows) of every work unit, in document order. The series (and
+    # large subseries, down to max_split_depth) are parsed in a pool of processes. Workers parse
+    # their slice of the memory-mapped file, located with the series index, so only the results
+    # are sent back.
+    with series_index.SeriesIndex(ead_file, max_subseries_depth=max_split_depth) as index:
+        if max_unit_size is None:
+            series = index.get_series()
+            dsc_size = series[-1]['end'] - series[0]['start'] if len(series) > 0 else 0
+            num_processes = processes if processes is not None else os.cpu_count()
+            max_unit_size = dsc_size // (num_processes * UNITS_PER_PROCESS) + 1
+        units = get_work_units(index, max_unit_size)
+        tasks = [(entry_index, row_depth) for unit_type, entry_index, _ in units if unit_type == 'entry']
+        # contexts of the split entries, updated by their heads as parse_series and parse_subseries would
+        contexts = {}
+        with Pool(processes=processes, initializer=open_worker_series_index,
+                  initargs=(ead_file, max_split_depth)) as pool:
+            results = pool.imap(parse_entry_task, tasks)
+            for unit_type, entry_index, head_range in units:
+                if unit_type == 'entry':
+                    yield next(results)
+                    continue
+                if entry_index not in contexts:
+                    entry = index.entries[entry_index]
+                    contexts[entry_index] = ead_parser.new_component_context(entry['kind'],
+                                                                             index.get_parent_context(entry))
+                contexts[entry_index], other_info = parse_head(index, entry_index, head_range,
+                                                               contexts[entry_index])
+                # the odd or otherfindaid info of a head is not an inventory row
+                if other_info is not None and row_depth is None:
+                    yield [other_info]
+
+
+def get_file_records_parallel(ead_file: str, processes: int = None, max_split_depth: int = 2,
+                              max_unit_size: int = None) -> List[Union[ead_parser.FileRecord, Dict[str, any]]]:
+    # the same list as get_file_records(get_desc(read_ead_file(ead_file)))
+    file_records = []
+    for unit_records in iter_unit_results(ead_file, processes=processes, max_split_depth=max_split_depth,
+                                          max_unit_size=max_unit_size):
+        file_records.extend(unit_records)
+    return file_records
+
+
+def get_files_info_parallel(ead_file: str, processes: int = None, max_split_depth: int = 2) -> List[Dict[str, any]]:
+    file_records = get_file_records_parallel(ead_file, processes=processes, max_split_depth=max_split_depth)
+    return ead_parser.materialize_files_info(file_records)
+
+
+def get_inventory_info_parallel(ead_file: str, max_subseries_depth: int = 2, categorical: bool = True,
+                                processes: int = None, max_split_depth: int = 2) -> pd.DataFrame:
+    inventory_columns = ead_parser.InventoryColumns(max_subseries_depth=max_subseries_depth, categorical=categorical)
+    for rows in iter_unit_results(ead_file, processes=processes, max_split_depth=max_split_depth,
+                                  row_depth=max_subseries_depth):
+        for row in rows:
+            inventory_columns.append_row(row)
+    return inventory_columns.to_frame()
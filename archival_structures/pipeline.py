@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from multiprocessing import Pool
+from typing import Dict, Iterable, List, Tuple, Union
+
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+import archival_structures.batch as batch
+
+
+JOURNAL_FILE = 'journal.jsonl'
+
+
+def get_artifact_file(output_dir: str, task: str, archive_id: str) -> str:
+    return os.path.join(output_dir, task, f"{archive_id}.tsv")
+
+
+def get_run_key(ead_file: str, tasks: List[str], max_subseries_depth: int) -> Dict[str, any]:
+    # a finished archive is only skipped when its EAD file, the parser and the parameters are unchanged
+    stat = os.stat(ead_file)
+    return {
+        'ead_file': os.path.realpath(ead_file),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'parser_version': ead_parser.PARSER_VERSION,
+        'tasks': sorted(tasks),
+        'max_subseries_depth': max_subseries_depth
+    }
+
+
+def write_artifact(df: pd.DataFrame, artifact_file: str) -> Dict[str, any]:
+    # written to a temporary file that replaces the artifact once it is complete, so an
+    # interrupted write never leaves a truncated artifact behind
+    os.makedirs(os.path.dirname(artifact_file), exist_ok=True)
+    tmp_file = f"{artifact_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wt') as fh:
+        df.to_csv(fh, sep='\t', index=False)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_file, artifact_file)
+    return {'file': artifact_file, 'rows': len(df), 'bytes': os.path.getsize(artifact_file)}
+
+
+def is_artifact_complete(artifact: Dict[str, any]) -> bool:
+    return os.path.isfile(artifact['file']) and os.path.getsize(artifact['file']) == artifact['bytes']
+
+
+class RunJournal:
+    # Append-only JSON lines record of the archives a run has finished or failed. Every entry
+    # is synced to disk when it is added, so an interrupted run only loses the archives that
+    # were in progress. Later lines replace earlier ones for the same archive.
+
+    def __init__(self, journal_file: str):
+        self.journal_file = journal_file
+        self.entries = {}
+        if os.path.exists(journal_file):
+            with open(journal_file, 'rt') as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a line cut off by an interrupted run
+                        continue
+                    self.entries[entry['archive_id']] = entry
+        journal_dir = os.path.dirname(journal_file)
+        if journal_dir != '':
+            os.makedirs(journal_dir, exist_ok=True)
+        self.fh = open(journal_file, 'at')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+        return False
+
+    def close(self):
+        self.fh.close()
+
+    def get(self, archive_id: str) -> Union[Dict[str, any], None]:
+        return self.entries.get(archive_id)
+
+    def add(self, entry: Dict[str, any]):
+        self.entries[entry['archive_id']] = entry
+        self.fh.write(json.dumps(entry) + '\n')
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+
+    def is_done(self, archive_id: str, run_key: Dict[str, any], tolerant: bool = False) -> bool:
+        # a strict run accepts the output of a tolerant one only if it skipped nothing
+        entry = self.get(archive_id)
+        if entry is None or entry['status'] != 'done' or entry['run_key'] != run_key:
+            return False
+        if tolerant is False and len(entry['unexpected']) > 0:
+            return False
+        return all(is_artifact_complete(artifact) for artifact in entry['artifacts'].values())
+
+
+def parse_archive_task(ead_file: str, task: str, max_subseries_depth: int,
+                       tolerant: bool) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    if tolerant is False:
+        return batch.parse_ead_file(ead_file, task=task, max_subseries_depth=max_subseries_depth), {}
+    with ead_parser.tolerant() as unexpected:
+        df = batch.parse_ead_file(ead_file, task=task, max_subseries_depth=max_subseries_depth)
+    return df, {f"{parent}/{tag}": count for (parent, tag), count in unexpected.items()}
+
+
+def run_archive(ead_file: str, archive_id: str, output_dir: str, run_key: Dict[str, any],
+                tolerant: bool = False) -> Dict[str, any]:
+    # the journal entry of the archive, a failure is recorded in the entry instead of raised
+    entry = {
+        'archive_id': archive_id,
+        'ead_file': ead_file,
+        'run_key': run_key,
+        'tolerant': tolerant,
+        'status': 'done',
+        'artifacts': {},
+        'unexpected': {},
+        'error': None,
+        'error_path': None,
+    }
+    start = time.perf_counter()
+    try:
+        for task in run_key['tasks']:
+            df, unexpected = parse_archive_task(ead_file, task, run_key['max_subseries_depth'], tolerant)
+            df.insert(0, 'archive_id', archive_id)
+            # an archive without rows still gets the header of all columns
+            df = df.reindex(columns=batch.get_task_columns(task, run_key['max_subseries_depth']))
+            entry['artifacts'][task] = write_artifact(df, get_artifact_file(output_dir, task, archive_id))
+            for element, count in unexpected.items():
+                entry['unexpected'][element] = entry['unexpected'].get(element, 0) + count
+    except ead_parser.EADParseError as err:
+        entry.update({'status': 'failed', 'error': f"{type(err).__name__}: {err.message}", 'error_path': err.path})
+    except Exception:
+        entry.update({'status': 'failed', 'error': traceback.format_exc()})
+    entry['seconds'] = time.perf_counter() - start
+    entry['finished'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    return entry
+
+
+def run_archive_task(args):
+    return run_archive(*args)
+
+
+def run_pipeline(source: Union[str, List[str]], output_dir: str, tasks: Iterable[str] = ('inventory',),
+                 processes: int = None, max_subseries_depth: int = 2, tolerant: bool = False,
+                 retry_failed: bool = True, progress: bool = True) -> Dict[str, any]:
+    # Parses every archive into one artifact per task in output_dir/<task>/<archive_id>.tsv and
+    # records it in output_dir/journal.jsonl. A restarted run skips the archives the journal
+    # lists as done, so after a failure or an interruption only the rest is parsed again.
+    tasks = sorted(set(tasks))
+    for task in tasks:
+        if task not in batch.TASKS:
+            raise ValueError(f"unknown task '{task}', must be one of {batch.TASKS}")
+    ead_files = batch.find_ead_files(source) if isinstance(source, str) else list(source)
+    archive_ids = [batch.get_archive_id(ead_file) for ead_file in ead_files]
+    if len(set(archive_ids)) < len(archive_ids):
+        duplicates = sorted({archive_id for archive_id in archive_ids if archive_ids.count(archive_id) > 1})
+        raise ValueError(f"archive ids {duplicates} occur for more than one EAD file")
+    summary = {
+        'archives': len(ead_files),
+        'skipped': [],
+        'processed': [],
+        'failed': []
+    }
+    start = time.time()
+    with RunJournal(os.path.join(output_dir, JOURNAL_FILE)) as journal:
+        pending = []
+        for ead_file, archive_id in zip(ead_files, archive_ids):
+            run_key = get_run_key(ead_file, tasks, max_subseries_depth)
+            entry = journal.get(archive_id)
+            if journal.is_done(archive_id, run_key, tolerant=tolerant):
+                summary['skipped'].append(archive_id)
+            elif retry_failed is False and entry is not None and entry['status'] == 'failed' \
+                    and entry['run_key'] == run_key:
+                summary['failed'].append(entry)
+            else:
+                pending.append((ead_file, archive_id, output_dir, run_key, tolerant))
+        if progress and len(summary['skipped']) > 0:
+            print(f"skipping {len(summary['skipped'])} archives that are done", file=sys.stderr)
+        with Pool(processes=processes) as pool:
+            for done, entry in enumerate(pool.imap_unordered(run_archive_task, pending), 1):
+                journal.add(entry)
+                if entry['status'] == 'done':
+                    summary['processed'].append(entry['archive_id'])
+                    status = ', '.join(f"{task} {artifact['rows']} rows"
+                                       for task, artifact in entry['artifacts'].items())
+                else:
+                    summary['failed'].append(entry)
+                    status = f"FAILED - {entry['error'].strip().splitlines()[-1]}"
+                    if entry['error_path'] is not None:
+                        status += f" at {entry['error_path']}"
+                if progress:
+                    print(f"[{done}/{len(pending)}] {time.time() - start:.1f}s {entry['archive_id']}: {status}",
+                          file=sys.stderr)
+    return summary
+
+
+def combine_artifacts(source: Union[str, List[str]], output_dir: str, task: str, output_file: str,
+                      max_subseries_depth: int = 2) -> int:
+    # Concatenates the artifacts of the archives in source into one file with a single header,
+    # in archive order, without parsing them again. Only archives that are done for their
+    # current EAD file, parser version and parameters, and whose artifact is complete, are
+    # included, so outputs of an older parser or of archives no longer in source are left
+    # out. Returns the number of rows.
+    ead_files = batch.find_ead_files(source) if isinstance(source, str) else list(source)
+    entries = []
+    with RunJournal(os.path.join(output_dir, JOURNAL_FILE)) as journal:
+        for ead_file in ead_files:
+            entry = journal.get(batch.get_archive_id(ead_file))
+            if entry is None or task not in entry['artifacts']:
+                continue
+            run_key = get_run_key(ead_file, entry['run_key']['tasks'], max_subseries_depth)
+            if journal.is_done(entry['archive_id'], run_key, tolerant=True):
+                entries.append(entry)
+    entries.sort(key=lambda entry: entry['archive_id'])
+    num_rows = 0
+    tmp_file = f"{output_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wt') as out_fh:
+        out_fh.write('\t'.join(batch.get_task_columns(task, max_subseries_depth)) + '\n')
+        for entry in entries:
+            with open(entry['artifacts'][task]['file'], 'rt') as in_fh:
+                # every artifact of the task has the same header
+                in_fh.readline()
+                for line in in_fh:
+                    out_fh.write(line)
+            num_rows += entry['artifacts'][task]['rows']
+    os.replace(tmp_file, output_file)
+    return num_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse EAD files into per-archive outputs, resuming earlier runs')
+    parser.add_argument('source', help='directory containing EAD XML files, or a glob pattern')
+    parser.add_argument('output_dir', help='directory for the outputs and the journal of the run')
+    parser.add_argument('--task', choices=sorted(batch.TASKS), action='append', dest='tasks',
+                        help='task to run, can be repeated (default: inventory)')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes (default: number of cores)')
+    parser.add_argument('--max-subseries-depth', type=int, default=2)
+    parser.add_argument('--tolerant', action='store_true',
+                        help='count unexpected elements in the journal instead of failing the archive')
+    parser.add_argument('--no-retry', action='store_true', help='do not parse archives that failed before again')
+    parser.add_argument('--combine', action='store_true',
+                        help='write the outputs of all finished archives to <output_dir>/<task>.tsv')
+    parser.add_argument('--quiet', action='store_true', help='do not report progress')
+    args = parser.parse_args()
+
+    tasks = args.tasks if args.tasks is not None else ['inventory']
+    summary = run_pipeline(args.source, args.output_dir, tasks=tasks, processes=args.processes,
+                           max_subseries_depth=args.max_subseries_depth, tolerant=args.tolerant,
+                           retry_failed=not args.no_retry, progress=not args.quiet)
+    print(f"processed {len(summary['processed'])}, skipped {len(summary['skipped'])}, "
+          f"failed {len(summary['failed'])} of {summary['archives']} archives", file=sys.stderr)
+    for failed in summary['failed']:
+        print(f"failed: {failed['ead_file']} {failed['error_path'] or ''}\n{failed['error']}", file=sys.stderr)
+    if args.combine:
+        for task in tasks:
+            output_file = os.path.join(args.output_dir, f"{task}.tsv")
+            num_rows = combine_artifacts(args.source, args.output_dir, task, output_file,
+                                         max_subseries_depth=args.max_subseries_depth)
+            print(f"{num_rows} rows written to {output_file}", file=sys.stderr)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import glob
+import os
+from multiprocessing import Pool
+from typing import Iterable, List, Union
+
+import pandas as pd
+
+
+# scan ids look like NL-HaNA_1.01.02_3760_0001.jpg: archive, inventory number and scan number
+SCAN_DOC_ID_PATTERN = r"^(NL-HaNA_[^_]+_\w+)_\d+\.jpg"
+SCAN_COUNT_COLUMN = 'scans'
+
+# set in every worker process by the pool initializer, so the EAD keys are sent once per worker
+worker_ead_keys = None
+
+
+def add_inventory_columns(scan_stats: pd.DataFrame, doc_id_column: str = 'doc_id') -> pd.DataFrame:
+    inventory_id = scan_stats[doc_id_column].str.replace(SCAN_DOC_ID_PATTERN, r"\1", regex=True)
+    scan_stats['inventory_id'] = inventory_id
+    scan_stats['inventory_num'] = inventory_id.str.rsplit('_', n=1).str[-1]
+    return scan_stats
+
+
+def get_ead_keys(ead: pd.DataFrame, group_cols: List[str]) -> pd.DataFrame:
+    ead_keys = ead[['inventory_num'] + [col for col in group_cols if col != 'inventory_num']]
+    # plain object columns, categoricals with different categories do not concatenate cheaply
+    return ead_keys.astype(object).drop_duplicates('inventory_num')
+
+
+def compact_aggregates(aggregates: List[pd.DataFrame], group_cols: List[str]) -> pd.DataFrame:
+    combined = pd.concat(aggregates, ignore_index=True)
+    return combined.groupby(group_cols, dropna=False, sort=False).sum().reset_index()
+
+
+def aggregate_scan_stats_chunk(chunk: pd.DataFrame, ead_keys: pd.DataFrame, group_cols: List[str],
+                               value_cols: List[str] = None) -> pd.DataFrame:
+    chunk = add_inventory_columns(chunk)
+    if value_cols is None:
+        value_cols = [col for col in chunk.select_dtypes('number').columns if col not in group_cols]
+    joined = chunk[['inventory_num'] + value_cols].merge(ead_keys, on='inventory_num', how='left')
+    joined[SCAN_COUNT_COLUMN] = 1
+    return joined.groupby(group_cols, dropna=False, sort=False)[[SCAN_COUNT_COLUMN] + value_cols].sum().reset_index()
+
+
+def aggregate_scan_stats_file(scan_stats_file: str, ead_keys: pd.DataFrame, group_cols: List[str],
+                              value_cols: List[str] = None, chunksize: int = 500000,
+                              max_pending: int = 20) -> pd.DataFrame:
+    aggregates = []
+    for chunk in pd.read_csv(scan_stats_file, sep='\t', compression='infer', chunksize=chunksize):
+        aggregates.append(aggregate_scan_stats_chunk(chunk, ead_keys, group_cols, value_cols=value_cols))
+        if len(aggregates) >= max_pending:
+            aggregates = [compact_aggregates(aggregates, group_cols)]
+    if len(aggregates) == 0:
+        return pd.DataFrame(columns=group_cols + [SCAN_COUNT_COLUMN])
+    return compact_aggregates(aggregates, group_cols)
+
+
+def set_worker_ead_keys(ead_keys: pd.DataFrame):
+    global worker_ead_keys
+    worker_ead_keys = ead_keys
+
+
+def aggregate_scan_stats_file_task(args) -> pd.DataFrame:
+    scan_stats_file, group_cols, value_cols, chunksize, max_pending = args
+    return aggregate_scan_stats_file(scan_stats_file, worker_ead_keys, group_cols,
+                                     value_cols=value_cols, chunksize=chunksize, max_pending=max_pending)
+
+
+def join_scan_stats(scan_stats_files: Union[str, Iterable[str]], ead: pd.DataFrame,
+                    group_cols: List[str] = None, value_cols: List[str] = None,
+                    processes: int = None, chunksize: int = 500000, max_pending: int = 20) -> pd.DataFrame:
+    # Join scan statistics against the get_inventory_info frame on inventory_num and sum them per
+    # group. Files are read in chunks by a pool of workers and every chunk is folded into running
+    # aggregates, so at most a few chunks per worker are in memory. Scans without a matching
+    # inventory number keep null group values, like a right join would.
+    if group_cols is None:
+        group_cols = ['series']
+    if isinstance(scan_stats_files, str):
+        scan_stats_files = sorted(glob.glob(os.path.join(scan_stats_files, '*'))) \
+            if os.path.isdir(scan_stats_files) else sorted(glob.glob(scan_stats_files))
+    ead_keys = get_ead_keys(ead, group_cols)
+    tasks = [(scan_stats_file, group_cols, value_cols, chunksize, max_pending) for scan_stats_file in scan_stats_files]
+    aggregates = []
+    with Pool(processes=processes, initializer=set_worker_ead_keys, initargs=(ead_keys,)) as pool:
+        for file_aggregate in pool.imap_unordered(aggregate_scan_stats_file_task, tasks):
+            aggregates.append(file_aggregate)
+            if len(aggregates) >= max_pending:
+                aggregates = [compact_aggregates(aggregates, group_cols)]
+    if len(aggregates) == 0:
+        return pd.DataFrame(columns=group_cols + [SCAN_COUNT_COLUMN]).set_index(group_cols)
+    totals = compact_aggregates(aggregates, group_cols)
+    return totals.set_index(group_cols).sort_index()
+
+
+def get_scan_means(totals: pd.DataFrame) -> pd.DataFrame:
+    value_cols = [col for col in totals.columns if col != SCAN_COUNT_COLUMN]
+    return totals[value_cols].div(totals[SCAN_COUNT_COLUMN], axis=0)
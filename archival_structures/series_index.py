@@ -0,0 +1,224 @@
+import json
+import mmap
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Union
+from xml.parsers import expat
+
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+
+
+SERIES_INDEX_VERSION = 1
+INDEXED_KINDS = {'series', 'subseries'}
+XML_ENCODING_PATTERN = re.compile(rb"""^<\?xml[^>]*encoding=["']([A-Za-z0-9._-]+)["']""")
+
+
+def get_index_file(ead_file: str) -> str:
+    return f"{ead_file}.series-index.json"
+
+
+def get_xml_encoding(data: Union[bytes, mmap.mmap]) -> str:
+    match = XML_ENCODING_PATTERN.match(data[:200])
+    return match.group(1).decode('ascii') if match else 'utf-8'
+
+
+def get_element_end(data: Union[bytes, mmap.mmap], end_tag_index: int) -> int:
+    # expat reports the offset at which the end tag (or an empty element tag) starts
+    return data.find(b'>', end_tag_index) + 1
+
+
+def parse_fragment(data: Union[bytes, mmap.mmap], start: int, end: int, encoding: str) -> ET.Element:
+    parser = ET.XMLParser(encoding=encoding)
+    parser.feed(data[start:end])
+    return parser.close()
+
+
+class SeriesIndexBuilder:
+    # Expat handlers that record, for every top-level series (and for subseries down to
+    # max_subseries_depth), the byte range of the c element and of its non-component
+    # children (did, odd, ...). The heads are needed to rebuild the context a nested
+    # component is parsed in, without parsing its siblings.
+
+    def __init__(self, data: Union[bytes, mmap.mmap], max_subseries_depth: int = 0):
+        self.data = data
+        self.max_subseries_depth = max_subseries_depth
+        self.encoding = get_xml_encoding(data)
+        self.parser = expat.ParserCreate()
+        self.parser.StartElementHandler = self.start_element
+        self.parser.EndElementHandler = self.end_element
+        self.entries = []
+        # per open element: tag, component kind, entry index, head (entry index, head start)
+        self.stack = []
+        self.dsc_seen = False
+
+    def start_element(self, tag: str, attrib: Dict[str, str]):
+        offset = self.parser.CurrentByteIndex
+        kind, entry_index, head = None, None, None
+        if len(self.stack) > 0:
+            parent_tag, parent_kind, parent_entry, _ = self.stack[-1]
+            if parent_kind == 'dsc' or parent_entry is not None:
+                kind = ead_parser.get_component_kind(parent_kind, ET.Element(tag, attrib))
+                depth = 0 if parent_kind == 'dsc' else self.entries[parent_entry]['depth'] + 1
+                if kind in INDEXED_KINDS and (parent_kind == 'dsc' or depth <= self.max_subseries_depth):
+                    entry_index = len(self.entries)
+                    self.entries.append({
+                        'kind': kind,
+                        'depth': depth,
+                        'parent': parent_entry,
+                        'title': None,
+                        'unitid': None,
+                        'start': offset,
+                        'end': None,
+                        'heads': []
+                    })
+                elif kind is None and parent_kind != 'dsc':
+                    head = (parent_entry, offset)
+                elif kind in INDEXED_KINDS:
+                    # a component below the indexed depth
+                    kind = None
+            elif self.dsc_seen is False and len(self.stack) == 2 and parent_tag == 'archdesc' and tag == 'dsc':
+                kind = 'dsc'
+                self.dsc_seen = True
+        self.stack.append((tag, kind, entry_index, head))
+
+    def end_element(self, tag: str):
+        _, kind, entry_index, head = self.stack.pop()
+        end = get_element_end(self.data, self.parser.CurrentByteIndex)
+        if entry_index is not None:
+            self.entries[entry_index]['end'] = end
+        elif head is not None:
+            parent_entry, start = head
+            self.entries[parent_entry]['heads'].append([start, end])
+            if tag == 'did' and self.entries[parent_entry]['title'] is None:
+                did_info = ead_parser.parse_did(parse_fragment(self.data, start, end, self.encoding))
+                self.entries[parent_entry]['title'] = did_info['unittitle']
+                if len(did_info['unitid']) > 0:
+                    self.entries[parent_entry]['unitid'] = did_info['unitid'][0]['unitid']
+
+    def build(self) -> List[Dict[str, any]]:
+        self.parser.Parse(self.data, True)
+        return self.entries
+
+
+def build_series_index(ead_file: str, max_subseries_depth: int = 0, index_file: str = None) -> Dict[str, any]:
+    # One pass over the EAD that writes the byte offsets of its top-level series (and of
+    # subseries up to max_subseries_depth levels below them) to a JSON sidecar file.
+    stat = os.stat(ead_file)
+    with open(ead_file, 'rb') as fh:
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            builder = SeriesIndexBuilder(data, max_subseries_depth=max_subseries_depth)
+            entries = builder.build()
+    series_index = {
+        'version': SERIES_INDEX_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'encoding': builder.encoding,
+        'max_subseries_depth': max_subseries_depth,
+        'entries': entries
+    }
+    index_file = index_file if index_file is not None else get_index_file(ead_file)
+    tmp_file = f"{index_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wt') as fh:
+        json.dump(series_index, fh)
+    os.replace(tmp_file, index_file)
+    return series_index
+
+
+def read_series_index(ead_file: str, index_file: str = None) -> Union[Dict[str, any], None]:
+    # a sidecar of another version of the EAD is ignored
+    index_file = index_file if index_file is not None else get_index_file(ead_file)
+    if not os.path.exists(index_file):
+        return None
+    with open(index_file, 'rt') as fh:
+        series_index = json.load(fh)
+    stat = os.stat(ead_file)
+    if series_index.get('version') != SERIES_INDEX_VERSION or series_index['size'] != stat.st_size \
+            or series_index['mtime_ns'] != stat.st_mtime_ns:
+        return None
+    return series_index
+
+
+class SeriesIndex:
+    # Random access to the series of a large EAD: only the selected series (or subseries)
+    # is parsed, from a slice of the memory-mapped file.
+    #
+    # with SeriesIndex('ead.xml') as series_index:
+    #     entry = series_index.find(title='Reeks 12')[0]
+    #     df = series_index.get_inventory_info(entry)
+
+    def __init__(self, ead_file: str, max_subseries_depth: int = 0, index_file: str = None):
+        self.ead_file = ead_file
+        series_index = read_series_index(ead_file, index_file=index_file)
+        if series_index is None or series_index['max_subseries_depth'] < max_subseries_depth:
+            series_index = build_series_index(ead_file, max_subseries_depth=max_subseries_depth,
+                                              index_file=index_file)
+        self.encoding = series_index['encoding']
+        self.entries = series_index['entries']
+        self.fh = open(ead_file, 'rb')
+        self.data = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+        return False
+
+    def close(self):
+        self.data.close()
+        self.fh.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_series(self) -> List[Dict[str, any]]:
+        return [entry for entry in self.entries if entry['parent'] is None]
+
+    def find(self, title: str = None, unitid: str = None, kind: str = None) -> List[Dict[str, any]]:
+        return [entry for entry in self.entries
+                if (title is None or entry['title'] == title)
+                and (unitid is None or entry['unitid'] == unitid)
+                and (kind is None or entry['kind'] == kind)]
+
+    def get_ancestors(self, entry: Dict[str, any]) -> List[Dict[str, any]]:
+        ancestors = []
+        while entry['parent'] is not None:
+            entry = self.entries[entry['parent']]
+            ancestors.append(entry)
+        return ancestors[::-1]
+
+    def get_element(self, entry: Dict[str, any]) -> ET.Element:
+        return parse_fragment(self.data, entry['start'], entry['end'], self.encoding)
+
+    def get_parent_context(self, entry: Dict[str, any]) -> Union[ead_parser.ContextNode, None]:
+        # replays the heads of the ancestors that precede the entry, as parse_series and
+        # parse_subseries would have done when they reached it
+        context = None
+        path = self.get_ancestors(entry) + [entry]
+        for ancestor, child in zip(path[:-1], path[1:]):
+            context = ead_parser.new_component_context(ancestor['kind'], context)
+            for start, end in ancestor['heads']:
+                if start > child['start']:
+                    break
+                head = parse_fragment(self.data, start, end, self.encoding)
+                context, _ = ead_parser.parse_component_child(ancestor['kind'], context, head)
+        return context
+
+    def get_file_records(self, entry: Dict[str, any]) -> List[Union[ead_parser.FileRecord, Dict[str, any]]]:
+        element = self.get_element(entry)
+        if entry['kind'] == 'series':
+            return ead_parser.parse_series(element)
+        return ead_parser.parse_subseries(element, self.get_parent_context(entry))
+
+    def get_files_info(self, entry: Dict[str, any]) -> List[Dict[str, any]]:
+        return ead_parser.materialize_files_info(self.get_file_records(entry))
+
+    def get_inventory_info(self, entry: Dict[str, any], max_subseries_depth: int = 2,
+                           categorical: bool = True) -> pd.DataFrame:
+        inventory_columns = ead_parser.InventoryColumns(max_subseries_depth=max_subseries_depth,
+                                                        categorical=categorical)
+        inventory_columns.append_file_records(self.get_file_records(entry))
+        return inventory_columns.to_frame()
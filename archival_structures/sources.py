@@ -0,0 +1,109 @@
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+import os
+from contextlib import ExitStack, contextmanager
+from typing import BinaryIO, Generator, Union
+
+
+# an EAD source: a path, an in-memory or memory-mapped buffer, or a binary file object
+Source = Union[str, os.PathLike, bytes, bytearray, memoryview, mmap.mmap, BinaryIO]
+
+MAGIC_BYTES = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'xz': b'\xfd7zXZ\x00',
+    'zstd': b'\x28\xb5\x2f\xfd'
+}
+# suffixes of single EAD files, compressed or not
+EAD_SUFFIXES = ['.xml', '.xml.gz', '.xml.bz2', '.xml.xz', '.xml.zst']
+
+
+class BufferReader(io.RawIOBase):
+    # reads a bytes-like object or mmap in place, without copying it as io.BytesIO would
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview, mmap.mmap]):
+        self.view = memoryview(buffer).cast('B')
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        size = min(len(b), len(self.view) - self.position)
+        b[:size] = self.view[self.position:self.position + size]
+        self.position += size
+        return size
+
+    def close(self):
+        self.view.release()
+        super().close()
+
+
+class ReaderAdapter(io.RawIOBase):
+    # turns any object with a read method into a raw stream, so it can be buffered and peeked
+
+    def __init__(self, fh):
+        self.fh = fh
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self.fh.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def get_peekable(fh) -> io.BufferedIOBase:
+    if hasattr(fh, 'peek'):
+        return fh
+    return io.BufferedReader(ReaderAdapter(fh))
+
+
+def get_compression(magic: bytes) -> Union[str, None]:
+    for compression, magic_bytes in MAGIC_BYTES.items():
+        if magic.startswith(magic_bytes):
+            return compression
+    return None
+
+
+def open_decompressor(fh, compression: str):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fh, mode='rb')
+    elif compression == 'bz2':
+        return bz2.BZ2File(fh, mode='rb')
+    elif compression == 'xz':
+        return lzma.LZMAFile(fh, mode='rb')
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("reading zstd compressed EAD files requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().stream_reader(fh)
+    raise ValueError(f"unknown compression '{compression}', must be one of {list(MAGIC_BYTES)}")
+
+
+@contextmanager
+def open_source(source: Source) -> Generator[io.BufferedIOBase, None, None]:
+    # Opens an EAD source as a binary stream that can be passed to ET.parse or ET.iterparse.
+    # Compressed data (detected by its magic bytes, not by the file name) is decompressed
+    # while it is read, buffers and memory maps are read in place. A file object passed in
+    # is not closed.
+    with ExitStack() as stack:
+        if isinstance(source, (str, os.PathLike)):
+            fh = stack.enter_context(open(source, 'rb'))
+        elif isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            fh = stack.enter_context(io.BufferedReader(BufferReader(source)))
+        elif hasattr(source, 'read'):
+            fh = source
+        else:
+            raise ValueError(f"cannot read EAD from source of type {type(source)}")
+        fh = get_peekable(fh)
+        compression = get_compression(fh.peek(len(MAGIC_BYTES['xz']))[:len(MAGIC_BYTES['xz'])])
+        if compression is not None:
+            fh = get_peekable(stack.enter_context(open_decompressor(fh, compression)))
+        yield fh
+
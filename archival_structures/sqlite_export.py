@@ -0,0 +1,235 @@
+import argparse
+import sqlite3
+import sys
+from typing import Dict, Iterable, List, Union
+
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+import archival_structures.ead_tree as ead_tree
+import archival_structures.batch as batch
+
+
+BATCH_SIZE = 10000
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS archives (
+        archive_id TEXT PRIMARY KEY,
+        root_id INTEGER NOT NULL,
+        title TEXT,
+        ead_file TEXT,
+        parser_version TEXT
+    )""",
+    # every component of the dsc, files included, with the archive itself as root node
+    """CREATE TABLE IF NOT EXISTS nodes (
+        node_id INTEGER PRIMARY KEY,
+        archive_id TEXT NOT NULL,
+        parent_id INTEGER,
+        kind TEXT NOT NULL,
+        depth INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        title TEXT,
+        unitid TEXT,
+        unitdate TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS files (
+        node_id INTEGER PRIMARY KEY,
+        archive_id TEXT NOT NULL,
+        inventory_num TEXT,
+        handle TEXT,
+        mets_file TEXT
+    )""",
+    # every ancestor of every node, including the node itself at distance 0
+    """CREATE TABLE IF NOT EXISTS closure (
+        ancestor_id INTEGER NOT NULL,
+        descendant_id INTEGER NOT NULL,
+        distance INTEGER NOT NULL,
+        PRIMARY KEY (ancestor_id, descendant_id)
+    ) WITHOUT ROWID"""
+]
+# created after the bulk load, which is faster than updating them row by row
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS nodes_parent ON nodes (parent_id)",
+    "CREATE INDEX IF NOT EXISTS nodes_archive_kind ON nodes (archive_id, kind)",
+    "CREATE INDEX IF NOT EXISTS nodes_title ON nodes (title)",
+    "CREATE INDEX IF NOT EXISTS files_inventory_num ON files (inventory_num)",
+    "CREATE INDEX IF NOT EXISTS files_handle ON files (handle)",
+    "CREATE INDEX IF NOT EXISTS closure_descendant ON closure (descendant_id)"
+]
+
+
+def connect(database: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(database)
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    for statement in SCHEMA:
+        connection.execute(statement)
+    return connection
+
+
+def create_indexes(connection: sqlite3.Connection):
+    with connection:
+        for statement in INDEXES:
+            connection.execute(statement)
+        connection.execute('ANALYZE')
+
+
+def delete_archive_rows(connection: sqlite3.Connection, archive_id: str):
+    # within the transaction of the caller
+    connection.execute("""DELETE FROM closure WHERE descendant_id IN
+                          (SELECT node_id FROM nodes WHERE archive_id = ?)""", (archive_id,))
+    connection.execute('DELETE FROM files WHERE archive_id = ?', (archive_id,))
+    connection.execute('DELETE FROM nodes WHERE archive_id = ?', (archive_id,))
+    connection.execute('DELETE FROM archives WHERE archive_id = ?', (archive_id,))
+
+
+def delete_archive(connection: sqlite3.Connection, archive_id: str):
+    with connection:
+        delete_archive_rows(connection, archive_id)
+
+
+def get_next_node_id(connection: sqlite3.Connection) -> int:
+    max_node_id = connection.execute('SELECT MAX(node_id) FROM nodes').fetchone()[0]
+    return 1 if max_node_id is None else max_node_id + 1
+
+
+class ArchiveWriter:
+    # Buffers the rows of the node, file and closure tables and inserts them with executemany
+    # per batch_size nodes, so a large archive is neither inserted row by row nor held in
+    # memory as a whole. The batches are part of the transaction of the caller, which commits.
+
+    def __init__(self, connection: sqlite3.Connection, archive_id: str, batch_size: int = BATCH_SIZE):
+        self.connection = connection
+        self.archive_id = archive_id
+        self.batch_size = batch_size
+        self.next_node_id = get_next_node_id(connection)
+        self.num_nodes = 0
+        self.num_files = 0
+        self.nodes = []
+        self.files = []
+        self.closure = []
+
+    def add_node(self, node: ead_tree.EADNode, parent_id: Union[int, None], ancestor_ids: List[int],
+                 position: int) -> int:
+        node_id = self.next_node_id
+        self.next_node_id += 1
+        self.nodes.append((node_id, self.archive_id, parent_id, node.kind, len(ancestor_ids), position,
+                           node.title, node.unitid, node.unitdate))
+        for distance, ancestor_id in enumerate(reversed(ancestor_ids + [node_id])):
+            self.closure.append((ancestor_id, node_id, distance))
+        if node.kind == 'file':
+            self.files.append((node_id, self.archive_id, node.inventory_num, node.handle, node.mets_file))
+            self.num_files += 1
+        self.num_nodes += 1
+        if len(self.nodes) >= self.batch_size:
+            self.flush()
+        return node_id
+
+    def flush(self):
+        self.connection.executemany('INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', self.nodes)
+        self.connection.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?)', self.files)
+        self.connection.executemany('INSERT INTO closure VALUES (?, ?, ?)', self.closure)
+        self.nodes, self.files, self.closure = [], [], []
+
+    def add_subtree(self, node: ead_tree.EADNode, parent_id: Union[int, None], ancestor_ids: List[int],
+                    position: int = 0) -> int:
+        node_id = self.add_node(node, parent_id, ancestor_ids, position)
+        ancestor_ids = ancestor_ids + [node_id]
+        for child_position, child in enumerate(node):
+            self.add_subtree(child, node_id, ancestor_ids, position=child_position)
+        return node_id
+
+
+def export_archive(connection: sqlite3.Connection, ead_file, archive_id: str = None,
+                   batch_size: int = BATCH_SIZE) -> Dict[str, any]:
+    # Writes the hierarchy of one EAD to the database, replacing an earlier export of the
+    # same archive. Unlike the inventory frame, the hierarchy is not cut off at a fixed depth.
+    # The old rows are deleted and the new ones inserted in one transaction, so a failed
+    # export leaves the earlier one in place.
+    archive_id = archive_id if archive_id is not None else batch.get_archive_id(ead_file)
+    archive = ead_tree.open_archive(ead_file)
+    with connection:
+        delete_archive_rows(connection, archive_id)
+        writer = ArchiveWriter(connection, archive_id, batch_size=batch_size)
+        root_id = writer.add_subtree(archive, None, [])
+        writer.flush()
+        connection.execute('INSERT INTO archives VALUES (?, ?, ?, ?, ?)',
+                           (archive_id, root_id, archive.title, ead_file if isinstance(ead_file, str) else None,
+                            ead_parser.PARSER_VERSION))
+    return {'archive_id': archive_id, 'root_id': root_id, 'nodes': writer.num_nodes, 'files': writer.num_files}
+
+
+def export_archives(ead_files: Iterable[str], database: str, archive_ids: Iterable[str] = None,
+                    batch_size: int = BATCH_SIZE) -> List[Dict[str, any]]:
+    ead_files = list(ead_files)
+    if archive_ids is None:
+        archive_ids = [batch.get_archive_id(ead_file) for ead_file in ead_files]
+    archive_ids = list(archive_ids)
+    connection = connect(database)
+    try:
+        summaries = [export_archive(connection, ead_file, archive_id=archive_id, batch_size=batch_size)
+                     for ead_file, archive_id in zip(ead_files, archive_ids)]
+        create_indexes(connection)
+    finally:
+        connection.close()
+    return summaries
+
+
+def get_subtree_counts(connection: sqlite3.Connection, archive_id: str, kind: str = None) -> pd.DataFrame:
+    # the number of descendants and of files below every node of an archive, at any depth
+    query = """SELECT n.node_id, n.parent_id, n.kind, n.depth, n.title,
+                      COUNT(c.descendant_id) - 1 AS descendants, COUNT(f.node_id) AS files
+               FROM nodes n
+               JOIN closure c ON c.ancestor_id = n.node_id
+               LEFT JOIN files f ON f.node_id = c.descendant_id
+               WHERE n.archive_id = ? AND n.kind != 'file' AND (? IS NULL OR n.kind = ?)
+               GROUP BY n.node_id
+               ORDER BY n.node_id"""
+    return pd.read_sql_query(query, connection, params=(archive_id, kind, kind))
+
+
+def get_subtree_files(connection: sqlite3.Connection, node_id: int) -> pd.DataFrame:
+    query = """SELECT f.*, n.title, n.unitdate, c.distance
+               FROM closure c
+               JOIN files f ON f.node_id = c.descendant_id
+               JOIN nodes n ON n.node_id = f.node_id
+               WHERE c.ancestor_id = ?
+               ORDER BY f.node_id"""
+    return pd.read_sql_query(query, connection, params=(node_id,))
+
+
+def get_ancestors(connection: sqlite3.Connection, node_id: int) -> pd.DataFrame:
+    # from the archive root down to the parent of the node
+    query = """SELECT n.* FROM closure c JOIN nodes n ON n.node_id = c.ancestor_id
+               WHERE c.descendant_id = ? AND c.distance > 0
+               ORDER BY c.distance DESC"""
+    return pd.read_sql_query(query, connection, params=(node_id,))
+
+
+def find_files(connection: sqlite3.Connection, inventory_num: str = None, handle: str = None,
+               archive_id: str = None) -> pd.DataFrame:
+    conditions, params = [], []
+    for column, value in [('f.inventory_num', inventory_num), ('f.handle', handle), ('f.archive_id', archive_id)]:
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    where = f"WHERE {' AND '.join(conditions)}" if len(conditions) > 0 else ''
+    query = f"""SELECT f.*, n.title, n.unitdate, n.parent_id FROM files f
+                JOIN nodes n ON n.node_id = f.node_id {where} ORDER BY f.node_id"""
+    return pd.read_sql_query(query, connection, params=params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the hierarchy of EAD files to a SQLite database')
+    parser.add_argument('source', help='directory containing EAD XML files, or a glob pattern')
+    parser.add_argument('database', help='SQLite database file, created if it does not exist')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help='nodes inserted per executemany call, each archive is exported in one transaction')
+    args = parser.parse_args()
+
+    for summary in export_archives(batch.find_ead_files(args.source), args.database, batch_size=args.batch_size):
+        print(f"{summary['archive_id']}: {summary['nodes']} nodes, {summary['files']} files", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
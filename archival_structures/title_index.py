@@ -0,0 +1,254 @@
+import bisect
+import json
+import os
+import re
+import unicodedata
+from array import array
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+import archival_structures.inventory_index as inventory_index
+import archival_structures.batch as batch
+
+
+INDEX_VERSION = 1
+DOCUMENT_FIELDS = ['doc_type', 'archive_id', 'inventory_num', 'title', 'unitdate', 'path']
+TOKEN_PATTERN = re.compile(r'\w+')
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+# unitdate tokens are counted from here, so a phrase cannot run from the title into the date
+DATE_POSITION_OFFSET = 1 << 16
+# doc id and position packed into one int64 to match phrases with set operations
+POSITION_BITS = 20
+
+
+def fold_text(text: str) -> str:
+    # diacritics are removed after NFKD decomposition, so 'Bätavia' and 'batavia' match
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text: Union[str, None]) -> List[str]:
+    if text is None:
+        return []
+    return TOKEN_PATTERN.findall(fold_text(text))
+
+
+def parse_query(query: str) -> List[Tuple[str, List[str]]]:
+    # 'term', 'prefix*' and '"a phrase"' clauses, all of which a document must match
+    clauses = []
+    for phrase, word in QUERY_PATTERN.findall(query):
+        if phrase:
+            tokens = tokenize(phrase)
+            if len(tokens) > 0:
+                clauses.append(('phrase', tokens))
+        elif word.endswith('*') and len(tokenize(word)) == 1:
+            clauses.append(('prefix', tokenize(word)))
+        else:
+            tokens = tokenize(word)
+            # a word with punctuation, such as '1602-1795', is a phrase of its tokens
+            if len(tokens) > 0:
+                clauses.append(('term' if len(tokens) == 1 else 'phrase', tokens))
+    return clauses
+
+
+def get_node_documents(file_info: Dict[str, any]) -> List[Tuple[str, Tuple[str, ...]]]:
+    # the series, subseries and filegroup a file is in, as (doc type, path of titles)
+    path = (file_info['series'].get('title'),)
+    nodes = [('series', path)]
+    for subseries in ead_parser.extract_subseries_info(file_info):
+        path = path + (subseries,)
+        nodes.append(('subseries', path))
+    filegroups, _ = ead_parser.extract_filegroup_info(file_info)
+    for filegroup in filegroups:
+        path = path + (filegroup,)
+        nodes.append(('filegroup', path))
+    return [(doc_type, path) for doc_type, path in nodes if path[-1] is not None]
+
+
+class TitleIndexBuilder:
+    # Collects the titles and dates of the inventory files and of the series, subseries and
+    # filegroups they are in, while the EAD is parsed, either as a sink for
+    # ead_parser.iter_file_components or via add_archive, and writes the index files.
+
+    def __init__(self, archive_id: str = None):
+        self.archive_id = archive_id
+        self.documents = {field: [] for field in DOCUMENT_FIELDS}
+        self.archives = []
+        # per term the doc ids and positions of its occurrences, in doc order
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.node_ids = {}
+
+    def __len__(self):
+        return len(self.documents['doc_type'])
+
+    def set_archive(self, archive_id: str):
+        self.archive_id = archive_id
+        if archive_id not in self.archives:
+            self.archives.append(archive_id)
+
+    def add_tokens(self, doc_id: int, tokens: List[str], offset: int = 0):
+        for position, token in enumerate(tokens):
+            if token not in self.postings:
+                self.postings[token] = (array('q'), array('i'))
+            doc_ids, positions = self.postings[token]
+            doc_ids.append(doc_id)
+            positions.append(offset + position)
+
+    def add_document(self, doc_type: str, title: Union[str, None], unitdate: Union[str, None] = None,
+                     inventory_num: Union[str, None] = None, path: str = None) -> int:
+        doc_id = len(self)
+        document = {'doc_type': doc_type, 'archive_id': self.archive_id, 'inventory_num': inventory_num,
+                    'title': title, 'unitdate': unitdate, 'path': path}
+        for field in DOCUMENT_FIELDS:
+            self.documents[field].append(document[field])
+        self.add_tokens(doc_id, tokenize(title))
+        self.add_tokens(doc_id, tokenize(unitdate), offset=DATE_POSITION_OFFSET)
+        return doc_id
+
+    def add_file_record(self, file_record: ead_parser.FileRecord):
+        if ead_parser.is_inventory_file_record(file_record) is False:
+            return
+        for doc_type, path in get_node_documents(file_record.to_dict(deep=False)):
+            if (self.archive_id, path) not in self.node_ids:
+                self.node_ids[(self.archive_id, path)] = self.add_document(
+                    doc_type, path[-1], path=inventory_index.PATH_SEPARATOR.join(path[:-1]))
+        record = inventory_index.get_index_record(file_record, self.archive_id)
+        self.add_document('file', record['title'], unitdate=record['unitdate'],
+                          inventory_num=record['inventory_num'], path=record['path'])
+
+    def add_file_component(self, component, file_record: Union[ead_parser.FileRecord, None]):
+        self.add_file_record(file_record)
+
+    def add_archive(self, ead_file, archive_id: str = None):
+        self.set_archive(archive_id if archive_id is not None else batch.get_archive_id(ead_file))
+        for file_record in ead_parser.iter_file_records(ead_file):
+            self.add_file_record(file_record)
+
+    def write(self, index_dir: str):
+        os.makedirs(index_dir, exist_ok=True)
+        for field in DOCUMENT_FIELDS:
+            inventory_index.write_string_column(self.documents[field], index_dir, field)
+        terms = sorted(self.postings)
+        inventory_index.write_string_column(terms, index_dir, 'terms')
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum([len(self.postings[term][0]) for term in terms])
+        np.save(os.path.join(index_dir, 'term_offsets.npy'), term_offsets)
+        for name, dtype, column in [('doc_ids', np.int64, 0), ('positions', np.int32, 1)]:
+            values = np.empty(term_offsets[-1], dtype=dtype)
+            for term, start, end in zip(terms, term_offsets[:-1], term_offsets[1:]):
+                values[start:end] = np.frombuffer(self.postings[term][column], dtype=dtype)
+            np.save(os.path.join(index_dir, f"{name}.npy"), values)
+        with open(os.path.join(index_dir, 'index.json'), 'wt') as fh:
+            json.dump({'version': INDEX_VERSION, 'documents': len(self), 'terms': len(terms),
+                       'archives': self.archives}, fh)
+
+
+class TitleIndex:
+    # Read-only view of a title index directory, every array is memory-mapped. Terms are
+    # found by binary search in the sorted term list, each term points to a run of postings
+    # (doc id, position) sorted by doc id, so a query only reads the postings of its terms.
+    #
+    # index = TitleIndex('title_index')
+    # index.search('"ingekomen brieven" batavia 17*', doc_type='file')
+
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, 'index.json'), 'rt') as fh:
+            self.metadata = json.load(fh)
+        if self.metadata['version'] != INDEX_VERSION:
+            raise ValueError(f"unsupported index version {self.metadata['version']}")
+        self.columns = {field: inventory_index.StringColumn(index_dir, field) for field in DOCUMENT_FIELDS}
+        self.terms = inventory_index.StringColumn(index_dir, 'terms')
+        self.term_offsets = np.load(os.path.join(index_dir, 'term_offsets.npy'), mmap_mode='r')
+        self.doc_ids = np.load(os.path.join(index_dir, 'doc_ids.npy'), mmap_mode='r')
+        self.positions = np.load(os.path.join(index_dir, 'positions.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return self.metadata['documents']
+
+    def get_document(self, doc_id: int) -> Dict[str, str]:
+        return {field: self.columns[field][doc_id] for field in DOCUMENT_FIELDS}
+
+    def find_term(self, term: str) -> Union[int, None]:
+        term_index = bisect.bisect_left(self.terms, term)
+        if term_index < len(self.terms) and self.terms[term_index] == term:
+            return term_index
+        return None
+
+    def get_term_range(self, term_index: Union[int, None]) -> slice:
+        if term_index is None:
+            return slice(0, 0)
+        return slice(self.term_offsets[term_index], self.term_offsets[term_index + 1])
+
+    def get_prefix_terms(self, prefix: str) -> range:
+        # the terms that start with prefix are a consecutive run of the sorted terms
+        first = bisect.bisect_left(self.terms, prefix)
+        last = bisect.bisect_left(self.terms, prefix + chr(0x10FFFF), lo=first)
+        return range(first, last)
+
+    def match_term(self, term: str) -> np.ndarray:
+        return np.unique(self.doc_ids[self.get_term_range(self.find_term(term))])
+
+    def match_prefix(self, prefix: str) -> np.ndarray:
+        terms = self.get_prefix_terms(prefix)
+        if len(terms) == 0:
+            return np.array([], dtype=np.int64)
+        # the postings of consecutive terms are consecutive too
+        return np.unique(self.doc_ids[self.term_offsets[terms.start]:self.term_offsets[terms.stop]])
+
+    def match_phrase(self, tokens: List[str]) -> np.ndarray:
+        # a phrase matches where token i occurs at the position of the first token plus i
+        matches = None
+        for offset, token in enumerate(tokens):
+            postings = self.get_term_range(self.find_term(token))
+            positions = self.positions[postings].astype(np.int64) - offset
+            # an occurrence before position offset cannot be token i of a phrase
+            starts = positions >= 0
+            keys = (self.doc_ids[postings][starts].astype(np.int64) << POSITION_BITS) + positions[starts]
+            matches = keys if matches is None else np.intersect1d(matches, keys)
+            if len(matches) == 0:
+                break
+        return np.unique(matches >> POSITION_BITS)
+
+    def match(self, query: str) -> np.ndarray:
+        # ids of the documents that match every clause of the query
+        doc_ids = None
+        for clause_type, tokens in parse_query(query):
+            if clause_type == 'term':
+                clause_doc_ids = self.match_term(tokens[0])
+            elif clause_type == 'prefix':
+                clause_doc_ids = self.match_prefix(tokens[0])
+            else:
+                clause_doc_ids = self.match_phrase(tokens)
+            doc_ids = clause_doc_ids if doc_ids is None else np.intersect1d(doc_ids, clause_doc_ids,
+                                                                            assume_unique=True)
+            if len(doc_ids) == 0:
+                break
+        return doc_ids if doc_ids is not None else np.array([], dtype=np.int64)
+
+    def search(self, query: str, doc_type: str = None, archive_id: str = None, limit: int = None) -> pd.DataFrame:
+        records = []
+        for doc_id in self.match(query):
+            document = self.get_document(int(doc_id))
+            if doc_type is not None and document['doc_type'] != doc_type:
+                continue
+            if archive_id is not None and document['archive_id'] != archive_id:
+                continue
+            records.append({'doc_id': int(doc_id), **document})
+            if limit is not None and len(records) >= limit:
+                break
+        return pd.DataFrame(records, columns=['doc_id'] + DOCUMENT_FIELDS)
+
+
+def build_title_index(ead_files: Iterable[str], index_dir: str, archive_ids: Iterable[str] = None) -> TitleIndex:
+    ead_files = list(ead_files)
+    if archive_ids is None:
+        archive_ids = [batch.get_archive_id(ead_file) for ead_file in ead_files]
+    archive_ids = list(archive_ids)
+    builder = TitleIndexBuilder()
+    for ead_file, archive_id in zip(ead_files, archive_ids):
+        builder.add_archive(ead_file, archive_id=archive_id)
+    builder.write(index_dir)
+    return TitleIndex(index_dir)
@@ -0,0 +1,260 @@
+import bz2
+import gzip
+import io
+import json
+import lzma
+import queue
+import threading
+from typing import Dict, Iterable, List, Union
+
+import pandas as pd
+
+import archival_structures.ead_parser as ead_parser
+
+
+DEFAULT_BUFFER_SIZE = 10000
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+
+
+def get_compression(output_file: str) -> Union[str, None]:
+    for suffix, compression in COMPRESSION_SUFFIXES.items():
+        if output_file.endswith(suffix):
+            return compression
+    return None
+
+
+def strip_compression_suffix(output_file: str) -> str:
+    for suffix in COMPRESSION_SUFFIXES:
+        if output_file.endswith(suffix):
+            return output_file[:-len(suffix)]
+    return output_file
+
+
+def open_output(output_file: str):
+    # text output, compressed according to the file suffix
+    compression = get_compression(output_file)
+    if compression == 'gzip':
+        return gzip.open(output_file, 'wt', encoding='utf-8', newline='')
+    elif compression == 'bz2':
+        return bz2.open(output_file, 'wt', encoding='utf-8', newline='')
+    elif compression == 'xz':
+        return lzma.open(output_file, 'wt', encoding='utf-8', newline='')
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("writing zstd compressed output requires the 'zstandard' package")
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(output_file, 'wb')),
+                                encoding='utf-8', newline='')
+    return open(output_file, 'wt', encoding='utf-8', newline='')
+
+
+class RecordWriter:
+    # Base class of the streaming writers. Records (dicts) are buffered and written in batches
+    # of buffer_size, so memory use does not depend on the number of records. With background=True
+    # the batches are written by a separate thread, at most max_pending batches are queued,
+    # so writing overlaps with producing the records.
+    #
+    # with TSVWriter('dates.tsv.gz') as writer:
+    #     for record in records:
+    #         writer.write_record(record)
+
+    def __init__(self, output_file: str, columns: List[str] = None, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 background: bool = False, max_pending: int = 4):
+        self.output_file = output_file
+        self.columns = list(columns) if columns is not None else None
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.num_records = 0
+        self.closed = False
+        self.queue = None
+        self.thread = None
+        self.error = None
+        if background:
+            self.queue = queue.Queue(maxsize=max_pending)
+            self.thread = threading.Thread(target=self.run_background, daemon=True)
+            self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+        return False
+
+    def write_record(self, record: Dict[str, any]):
+        self.buffer.append(record)
+        self.num_records += 1
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_records(self, records: Iterable[Dict[str, any]]):
+        for record in records:
+            self.write_record(record)
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+        batch, self.buffer = self.buffer, []
+        if self.columns is None:
+            self.columns = list(batch[0].keys())
+        if self.queue is None:
+            self.write_batch(batch)
+            return
+        if self.error is not None:
+            raise self.error
+        self.queue.put(batch)
+
+    def run_background(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+            if self.error is None:
+                try:
+                    self.write_batch(batch)
+                except Exception as err:
+                    # raised in the producing thread at the next flush or at close
+                    self.error = err
+
+    def write_batch(self, batch: List[Dict[str, any]]):
+        raise NotImplementedError
+
+    def close_output(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+        self.close_output()
+        if self.error is not None:
+            raise self.error
+
+
+class TSVWriter(RecordWriter):
+    # the same tab-separated output as DataFrame(records).to_csv(sep='\t', index=False)
+
+    def __init__(self, output_file: str, columns: List[str] = None, **kwargs):
+        super().__init__(output_file, columns=columns, **kwargs)
+        self.fh = open_output(output_file)
+        self.write_header = True
+
+    def write_batch(self, batch: List[Dict[str, any]]):
+        df = pd.DataFrame(batch, columns=self.columns)
+        df.to_csv(self.fh, sep='\t', header=self.write_header, index=False)
+        self.write_header = False
+
+    def close_output(self):
+        if self.write_header and self.columns is not None:
+            pd.DataFrame(columns=self.columns).to_csv(self.fh, sep='\t', index=False)
+        elif self.write_header:
+            # pandas writes an empty frame without columns as an empty line
+            self.fh.write('\n')
+        self.fh.close()
+
+
+class JSONLinesWriter(RecordWriter):
+
+    def __init__(self, output_file: str, columns: List[str] = None, **kwargs):
+        super().__init__(output_file, columns=columns, **kwargs)
+        self.fh = open_output(output_file)
+
+    def write_batch(self, batch: List[Dict[str, any]]):
+        self.fh.write(''.join(json.dumps(record) + '\n' for record in batch))
+
+    def close_output(self):
+        self.fh.close()
+
+
+class JSONObjectWriter(RecordWriter):
+    # A JSON object of the records keyed by key_field, written as json.dump(records, indent=4)
+    # would. Records are streamed, so a repeated key is written twice instead of replacing the
+    # earlier value. json.load still gives the same result, as it keeps the last value.
+
+    def __init__(self, output_file: str, key_field: str, columns: List[str] = None, indent: int = 4, **kwargs):
+        super().__init__(output_file, columns=columns, **kwargs)
+        self.key_field = key_field
+        self.indent = indent
+        self.fh = open_output(output_file)
+        self.first = True
+
+    def write_batch(self, batch: List[Dict[str, any]]):
+        padding = ' ' * self.indent
+        parts = []
+        for record in batch:
+            value = json.dumps(record, indent=self.indent).replace('\n', '\n' + padding)
+            parts.append(f"{'{' if self.first else ','}\n{padding}{json.dumps(record[self.key_field])}: {value}")
+            self.first = False
+        self.fh.write(''.join(parts))
+
+    def close_output(self):
+        self.fh.write('{}' if self.first else '\n}')
+        self.fh.close()
+
+
+class ParquetWriter(RecordWriter):
+    # every batch becomes a row group, the schema is taken from the first batch unless given
+
+    def __init__(self, output_file: str, columns: List[str] = None, schema=None,
+                 compression: str = 'snappy', **kwargs):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("writing parquet output requires the 'pyarrow' package")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.schema = schema
+        self.compression = compression
+        self.writer = None
+        super().__init__(output_file, columns=columns, **kwargs)
+
+    def write_batch(self, batch: List[Dict[str, any]]):
+        arrays = {column: [record.get(column) for record in batch] for column in self.columns}
+        if self.schema is None:
+            table = self.pa.table(arrays)
+            # columns that are empty in the first batch would be typed null
+            self.schema = self.pa.schema([self.pa.field(field.name, self.pa.string())
+                                          if self.pa.types.is_null(field.type) else field
+                                          for field in table.schema])
+        table = self.pa.table(arrays, schema=self.schema)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.output_file, self.schema, compression=self.compression)
+        self.writer.write_table(table)
+
+    def close_output(self):
+        if self.writer is None and self.columns is not None:
+            self.writer = self.pq.ParquetWriter(self.output_file, self.schema or self.pa.schema(
+                [self.pa.field(column, self.pa.string()) for column in self.columns]), compression=self.compression)
+        if self.writer is not None:
+            self.writer.close()
+
+
+def get_writer(output_file: str, key_field: str = None, **kwargs) -> RecordWriter:
+    # the output format follows from the file suffix, before any compression suffix
+    base_name = strip_compression_suffix(output_file)
+    if base_name.endswith('.tsv') or base_name.endswith('.csv'):
+        return TSVWriter(output_file, **kwargs)
+    elif base_name.endswith('.jsonl') or base_name.endswith('.ndjson'):
+        return JSONLinesWriter(output_file, **kwargs)
+    elif base_name.endswith('.json'):
+        if key_field is None:
+            raise ValueError('writing a JSON object requires a key_field')
+        return JSONObjectWriter(output_file, key_field, **kwargs)
+    elif base_name.endswith('.parquet'):
+        return ParquetWriter(output_file, **kwargs)
+    raise ValueError(f"cannot determine the output format of '{output_file}'")
+
+
+def write_inventory(ead_file, output_file: str, max_subseries_depth: int = 2, **kwargs) -> int:
+    # streams the inventory rows of an EAD to output_file, without building the frame
+    columns = ead_parser.get_inventory_columns(max_subseries_depth)
+    with get_writer(output_file, key_field='inventory_num', columns=columns, **kwargs) as writer:
+        for row in ead_parser.iter_inventory_rows(ead_file, max_subseries_depth=max_subseries_depth):
+            writer.write_record(dict(zip(columns, row)))
+    return writer.num_records
@@ -0,0 +1,44 @@
+import os
+
+import pandas as pd
+import pytest
+
+import archival_structures.ead_parser as ead_parser
+
+
+EAD_FILE = os.path.join(os.path.dirname(__file__), 'data', 'inventory.xml')
+# a file directly under a series, files in nested subseries, a filegroup with an inventory
+# range, and files after a subseries that are not part of it
+EXPECTED_ROWS = [
+    ['Reeks A', None, None, None, None, 'Notulen', '1602-1610', '1', None],
+    ['Reeks A', 'Brieven', None, None, None, 'Ingekomen brieven', '1620', '2', 'https://example.org/mets/2'],
+    ['Reeks A', 'Brieven', 'Batavia', None, None, 'Brieven uit Batavia', None, '3a', None],
+    ['Reeks A', 'Brieven', 'Batavia', 'Kopieboeken', '4-5', 'Deel 1', '1630', '4', None],
+    ['Reeks A', 'Brieven', 'Batavia', 'Kopieboeken', '4-5', 'Deel 2', None, '5', None],
+    ['Reeks B', None, None, None, None, 'Register', '1700', '6', None],
+    ['Reeks C', 'Kaarten', None, None, None, 'Kaart van Batavia', None, '7', None],
+    ['Reeks C', 'Kaarten', None, None, None, 'Kaart van Ambon', None, '8', None],
+    ['Reeks C', None, None, None, None, 'Index', None, '9', None],
+]
+
+
+def get_rows(df: pd.DataFrame) -> list:
+    return df.astype(object).where(df.notna(), None).values.tolist()
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_inventory_info_rows(streaming):
+    df = ead_parser.get_inventory_info(EAD_FILE, streaming=streaming)
+    assert list(df.columns) == ead_parser.get_inventory_columns(2)
+    assert get_rows(df) == EXPECTED_ROWS
+
+
+def test_streaming_matches_tree_parse():
+    tree_df = ead_parser.get_inventory_info(EAD_FILE, streaming=False)
+    streaming_df = ead_parser.get_inventory_info(EAD_FILE, streaming=True)
+    pd.testing.assert_frame_equal(streaming_df, tree_df)
+
+
+def test_streaming_files_info_matches_tree_parse():
+    tree_files_info = ead_parser.get_files_info(ead_parser.get_desc(ead_parser.read_ead_file(EAD_FILE)))
+    assert list(ead_parser.iter_files_info(EAD_FILE)) == tree_files_info
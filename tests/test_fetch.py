@@ -0,0 +1,91 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import archival_structures.fetch as fetch
+
+
+CONTENT = b'<ead>' + b'x' * 5000 + b'</ead>'
+ETAG = '"v1"'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Serves CONTENT at /ead.xml with an ETag, answers conditional and If-Range requests, and
+    # drops the connection after server.truncate_at bytes of the next response, once.
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.path != '/ead.xml':
+            self.send_error(404)
+            return
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        if self.headers.get('Range') is not None and self.headers.get('If-Range') == ETAG:
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+        body = CONTENT[start:]
+        self.send_response(206 if start > 0 else 200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(body)))
+        if start > 0:
+            self.send_header('Content-Range', f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}")
+        self.end_headers()
+        if self.server.truncate_at is not None:
+            body = body[:self.server.truncate_at]
+            self.server.truncate_at = None
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.requests = []
+    server.truncate_at = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_url(server, path: str) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def test_fetch_resumes_an_interrupted_download(server, tmp_path):
+    output_file = str(tmp_path / 'ead.xml')
+    server.truncate_at = 1000
+    result = fetch.fetch_url(get_url(server, '/ead.xml'), output_file, backoff=0)
+    assert result['status'] == 'downloaded'
+    assert result['attempts'] == 2
+    # the bytes of the interrupted attempt count as well
+    assert result['bytes'] == len(CONTENT)
+    assert server.requests[1]['Range'] == 'bytes=1000-'
+    with open(output_file, 'rb') as fh:
+        assert fh.read() == CONTENT
+
+
+def test_fetch_skips_an_unchanged_file(server, tmp_path):
+    output_file = str(tmp_path / 'ead.xml')
+    fetch.fetch_url(get_url(server, '/ead.xml'), output_file, backoff=0)
+    result = fetch.fetch_url(get_url(server, '/ead.xml'), output_file, backoff=0)
+    assert result['status'] == 'not_modified'
+    assert result['bytes'] == 0
+    assert server.requests[1]['If-None-Match'] == ETAG
+    with open(output_file, 'rb') as fh:
+        assert fh.read() == CONTENT
+
+
+def test_fetch_does_not_retry_a_missing_file(server, tmp_path):
+    output_file = str(tmp_path / 'missing.xml')
+    result = fetch.fetch_url(get_url(server, '/missing.xml'), output_file, retries=3, backoff=0)
+    assert result['status'] == 'failed'
+    assert result['attempts'] == 1
+    assert result['error'].startswith('HTTP 404')
+    assert len(server.requests) == 1
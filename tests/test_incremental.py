@@ -0,0 +1,31 @@
+import pandas as pd
+
+import archival_structures.incremental as incremental
+
+
+COLUMNS = ['series', 'file', 'inventory_num']
+
+
+def get_frame(rows) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def test_row_delta_of_a_deleted_row():
+    old_rows = get_frame([['Reeks A', 'Notulen', '1'], ['Reeks A', 'Brieven', '2'], ['Reeks B', 'Register', '3']])
+    new_rows = get_frame([['Reeks A', 'Notulen', '1'], ['Reeks B', 'Register', '3']])
+    delta = incremental.get_row_delta(old_rows, new_rows, COLUMNS)
+    removed = delta['removed']
+    assert list(removed.columns) == COLUMNS
+    assert removed.columns.is_unique
+    assert removed.values.tolist() == [['Reeks A', 'Brieven', '2']]
+    assert len(delta['added']) == 0
+    assert len(delta['modified']) == 0
+
+
+def test_row_delta_of_added_and_modified_rows():
+    old_rows = get_frame([['Reeks A', 'Notulen', '1']])
+    new_rows = get_frame([['Reeks A', 'Notulen en bijlagen', '1'], ['Reeks B', 'Register', '2']])
+    delta = incremental.get_row_delta(old_rows, new_rows, COLUMNS)
+    assert delta['added'].values.tolist() == [['Reeks B', 'Register', '2']]
+    assert delta['modified'].values.tolist() == [['Reeks A', 'Notulen en bijlagen', '1']]
+    assert len(delta['removed']) == 0
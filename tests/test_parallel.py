@@ -0,0 +1,64 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import archival_structures.ead_parser as ead_parser
+import archival_structures.parallel as parallel
+import archival_structures.series_index as series_index
+
+
+EAD_FILE = os.path.join(os.path.dirname(__file__), 'data', 'inventory.xml')
+
+
+def get_split_ead(num_series: int = 3, num_subseries: int = 3, num_files: int = 2) -> str:
+    # series that hold only their heads and subseries, which are the ones that can be split
+    components = []
+    inventory_num = 0
+    for series_num in range(1, num_series + 1):
+        components.append(f'<c level="series"><did><unitid>{series_num}</unitid>'
+                          f'<unittitle>Reeks {series_num}</unittitle></did><odd><p>reeks</p></odd>')
+        for subseries_num in range(1, num_subseries + 1):
+            components.append(f'<c level="subseries"><did><unitid>{series_num}.{subseries_num}</unitid>'
+                              f'<unittitle>Subreeks {series_num}.{subseries_num}</unittitle></did>')
+            for _ in range(num_files):
+                inventory_num += 1
+                components.append(f'<c level="file"><did><unitid type="ABS">{inventory_num}</unitid>'
+                                  f'<unittitle>Stuk {inventory_num}</unittitle></did></c>')
+            components.append('</c>')
+        components.append('</c>')
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<ead><archdesc level="fonds"><did><unittitle>Archief'
+            '</unittitle></did><dsc>' + '\n'.join(components) + '</dsc></archdesc></ead>\n')
+
+
+@pytest.fixture
+def ead_file(tmp_path):
+    # a copy, so the sidecar index is written next to it and not into the test data
+    ead_file = str(tmp_path / 'inventory.xml')
+    shutil.copyfile(EAD_FILE, ead_file)
+    return ead_file
+
+
+@pytest.mark.parametrize('categorical', [True, False])
+def test_parallel_inventory_matches_serial(ead_file, categorical):
+    serial_df = ead_parser.get_inventory_info(ead_file, categorical=categorical)
+    parallel_df = parallel.get_inventory_info_parallel(ead_file, categorical=categorical, processes=2)
+    # same rows in the same order, with the same dtypes
+    pd.testing.assert_frame_equal(parallel_df, serial_df)
+
+
+def test_split_entries_match_serial(tmp_path):
+    # with the smallest unit size every series and subseries that can be split is split
+    # into its heads and children, which the parent merges back in document order
+    ead_file = str(tmp_path / 'split.xml')
+    with open(ead_file, 'wt') as fh:
+        fh.write(get_split_ead())
+    with series_index.SeriesIndex(ead_file, max_subseries_depth=2) as index:
+        units = parallel.get_work_units(index, max_unit_size=1)
+    assert any(unit_type == 'head' for unit_type, _, _ in units)
+    file_records = parallel.get_file_records_parallel(ead_file, processes=2, max_split_depth=2, max_unit_size=1)
+    serial_records = ead_parser.get_file_records(ead_parser.get_desc(ead_parser.read_ead_file(ead_file)))
+    assert ead_parser.materialize_files_info(file_records) == ead_parser.materialize_files_info(serial_records)
+    parallel_df = parallel.get_inventory_info_parallel(ead_file, processes=2)
+    pd.testing.assert_frame_equal(parallel_df, ead_parser.get_inventory_info(ead_file))
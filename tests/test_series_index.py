@@ -0,0 +1,55 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import archival_structures.ead_parser as ead_parser
+import archival_structures.series_index as series_index
+
+
+EAD_FILE = os.path.join(os.path.dirname(__file__), 'data', 'inventory.xml')
+
+
+@pytest.fixture
+def ead_file(tmp_path):
+    # a copy, so the sidecar index is written next to it and not into the test data
+    ead_file = str(tmp_path / 'inventory.xml')
+    shutil.copyfile(EAD_FILE, ead_file)
+    return ead_file
+
+
+def get_rows(df: pd.DataFrame) -> list:
+    # the values only, a column that is empty in a fragment is not inferred as a string column
+    return df.astype(object).where(df.notna(), None).values.tolist()
+
+
+def get_expected_rows(ead_file: str, column: str, title: str) -> list:
+    inventory = ead_parser.get_inventory_info(ead_file, categorical=False)
+    return get_rows(inventory[inventory[column] == title])
+
+
+@pytest.mark.parametrize('title', ['Reeks A', 'Reeks B', 'Reeks C'])
+def test_series_fragment_matches_full_parse(ead_file, title):
+    # Reeks C is the last series, its fragment ends where the dsc does
+    with series_index.SeriesIndex(ead_file) as index:
+        entry = index.find(title=title, kind='series')[0]
+        df = index.get_inventory_info(entry, categorical=False)
+    assert list(df.columns) == ead_parser.get_inventory_columns(2)
+    assert get_rows(df) == get_expected_rows(ead_file, 'series', title)
+
+
+def test_subseries_fragment_matches_full_parse(ead_file):
+    # the context of the series and subseries above it is replayed from their heads
+    with series_index.SeriesIndex(ead_file, max_subseries_depth=2) as index:
+        entry = index.find(title='Batavia', kind='subseries')[0]
+        df = index.get_inventory_info(entry, categorical=False)
+    assert get_rows(df) == get_expected_rows(ead_file, 'subseries_2', 'Batavia')
+
+
+def test_index_is_reused_until_the_ead_changes(ead_file):
+    with series_index.SeriesIndex(ead_file) as index:
+        assert [entry['title'] for entry in index.get_series()] == ['Reeks A', 'Reeks B', 'Reeks C']
+    assert series_index.read_series_index(ead_file) is not None
+    os.utime(ead_file, ns=(0, 0))
+    assert series_index.read_series_index(ead_file) is None